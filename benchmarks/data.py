@@ -0,0 +1,165 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+from uuid import uuid4
+
+
+def uid() -> str:
+    return uuid4().hex
+
+
+def date_modified(offset: float = 0) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=offset)).isoformat()
+
+
+def organization() -> dict:
+    return {
+        "name": "Державне підприємство",
+        "identifier": {"scheme": "UA-EDR", "id": str(random.randint(10000000, 99999999)), "legalName": "ДП"},
+        "address": {
+            "countryName": "Україна",
+            "region": "м. Київ",
+            "locality": "Київ",
+            "streetAddress": "вул. Хрещатик, 1",
+            "postalCode": "01001",
+        },
+        "contactPoint": {"name": "Іван Петренко", "telephone": "+380441234567", "email": "buyer@example.com"},
+        "kind": "general",
+    }
+
+
+def agreement(items: int = 5, contracts: int = 3, status: str = "active") -> dict:
+    item_ids = [uid() for _ in range(items)]
+    return {
+        "id": uid(),
+        "agreementID": f"UA-{datetime.now():%Y-%m-%d}-{random.randint(0, 999999):06d}-a-1",
+        "status": status,
+        "date": date_modified(),
+        "dateSigned": date_modified(),
+        "period": {"startDate": date_modified(), "endDate": date_modified(-365 * 24 * 3600)},
+        "items": [
+            {
+                "id": item_id,
+                "description": "Папір офісний А4",
+                "classification": {"scheme": "ДК021", "id": "30197630-1", "description": "Папір для друку"},
+                "quantity": random.randint(1, 1000),
+                "unit": {"code": "H87", "name": "штука"},
+                "deliveryDate": {"startDate": date_modified(), "endDate": date_modified(-30 * 24 * 3600)},
+            }
+            for item_id in item_ids
+        ],
+        "contracts": [
+            {
+                "id": uid(),
+                "status": "active" if i else "unsuccessful",
+                "awardID": uid(),
+                "suppliers": [organization()],
+                "unitPrices": [
+                    {
+                        "relatedItem": item_id,
+                        "value": {"amount": round(random.uniform(1, 10000), 2), "currency": "UAH",
+                                  "valueAddedTaxIncluded": True},
+                    }
+                    for item_id in item_ids
+                ],
+                "date": date_modified(),
+            }
+            for i in range(contracts)
+        ],
+        "documents": [
+            {"id": uid(), "title": "agreement.pdf", "url": f"https://ds.example.com/{uid()}", "format": "application/pdf"}
+        ],
+    }
+
+
+def cfaua_tender(lots: int = 3, **agreement_kwargs) -> dict:
+    return {
+        "id": uid(),
+        "dateModified": date_modified(random.uniform(0, 60)),
+        "procurementMethodType": "closeFrameworkAgreementUA",
+        "status": random.choice(("active.awarded", "complete")),
+        "procuringEntity": organization(),
+        "lots": [{"id": uid(), "status": "active"} for _ in range(lots)],
+        "agreements": [agreement(**agreement_kwargs) for _ in range(lots)],
+    }
+
+
+def document() -> dict:
+    return {
+        "id": uid(),
+        "title": "документ.pdf",
+        "url": f"https://ds.example.com/{uid()}",
+        "format": "application/pdf",
+        "hash": f"md5:{uid()}",
+        "datePublished": date_modified(),
+    }
+
+
+def heavy_fields(bids: int = 10, documents: int = 10) -> dict:
+    """Parts of a full API tender the bridge doesn't read"""
+    return {
+        "title": "Закупівля паперу",
+        "description": "Папір офісний А4 " * 50,
+        "documents": [document() for _ in range(documents)],
+        "bids": [
+            {
+                "id": uid(),
+                "status": "active",
+                "tenderers": [organization()],
+                "value": {"amount": round(random.uniform(1, 100000), 2), "currency": "UAH"},
+                "documents": [document() for _ in range(3)],
+            }
+            for _ in range(bids)
+        ],
+        "awards": [
+            {"id": uid(), "status": "active", "suppliers": [organization()], "documents": [document()]}
+            for _ in range(bids)
+        ],
+    }
+
+
+def selection_tender(agreement_ids: List[str]) -> dict:
+    return {
+        "id": uid(),
+        "dateModified": date_modified(random.uniform(0, 60)),
+        "procurementMethodType": "closeFrameworkAgreementSelectionUA",
+        "status": "draft.pending",
+        "lots": [{"id": uid(), "status": "active"}],
+        "agreements": [{"id": agreement_id} for agreement_id in agreement_ids],
+    }
+
+
+def other_tender() -> dict:
+    return {
+        "id": uid(),
+        "dateModified": date_modified(random.uniform(0, 60)),
+        "procurementMethodType": random.choice(("belowThreshold", "aboveThresholdUA", "reporting")),
+        "status": random.choice(("active.tendering", "active.qualification", "complete")),
+    }
+
+
+def feed_pages(
+    tenders: int,
+    page_size: int = 100,
+    lots: int = 3,
+    selection_share: float = 0.2,
+    cfa_share: float = 0.5,
+    existing_agreement_ids: Optional[List[str]] = None,
+) -> Iterator[List[dict]]:
+    """
+    Synthetic crawler pages: `cfa_share` of items are CFA procedures,
+    `selection_share` of those are selection tenders pointing to `existing_agreement_ids`.
+    """
+    page = []
+    for _ in range(tenders):
+        if random.random() >= cfa_share:
+            page.append(other_tender())
+        elif existing_agreement_ids and random.random() < selection_share:
+            page.append(selection_tender([random.choice(existing_agreement_ids)]))
+        else:
+            page.append(cfaua_tender(lots=lots))
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
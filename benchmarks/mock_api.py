@@ -0,0 +1,135 @@
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import asyncio
+import random
+from collections import Counter
+from typing import Dict, Optional
+
+
+class MockAPI:
+    """
+    In-process fake of the CDB endpoints used by the bridge.
+
+    latency: mean response delay in seconds, each response waits uniform(latency / 2, latency * 3 / 2)
+    error_rate: share of requests answered with 503
+    statuses: weights of 200/404/410 answers for agreements the mock doesn't know yet,
+              the answer is remembered, agreements created by POST always answer 200
+    capacity: requests the mock serves at once without degrading, above it the latency grows
+              with the load and the excess share of requests is answered with 429
+    """
+
+    def __init__(
+        self,
+        latency: float = 0,
+        error_rate: float = 0,
+        statuses: Optional[Dict[int, float]] = None,
+        seed: Optional[int] = None,
+        capacity: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.statuses = statuses or {404: 1}
+        self.capacity = capacity
+        self.random = random.Random(seed)
+        self.agreements: Dict[str, int] = {}
+        self.agreements_data: Dict[str, dict] = {}
+        self.tenders: Dict[str, dict] = {}
+        self.requests = Counter()
+        self.errors = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.transports = set()
+        self.server: Optional[TestServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server.host}:{self.server.port}"
+
+    @property
+    def connections(self) -> int:
+        """Client connections opened to the mock"""
+        return len(self.transports)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def add_agreement(self, agreement: dict, status: int = 200) -> None:
+        self.agreements[agreement["id"]] = status
+        self.agreements_data[agreement["id"]] = agreement
+
+    def add_tender(self, tender: dict) -> None:
+        self.tenders[tender["id"]] = tender
+
+    async def __aenter__(self) -> "MockAPI":
+        self.server = TestServer(self.build_app())
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.server.close()
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/tenders/{tender_id}/extract_credentials", self.extract_credentials)
+        app.router.add_get("/tenders/{tender_id}", self.get_tender)
+        app.router.add_patch("/tenders/{tender_id}", self.patch_tender)
+        app.router.add_patch("/tenders/{tender_id}/agreements/{agreement_id}", self.patch_tender_agreement)
+        app.router.add_get("/agreements/{agreement_id}", self.get_agreement)
+        app.router.add_post("/agreements", self.post_agreement)
+        return app
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        endpoint = handler.__name__
+        self.requests[endpoint] += 1
+        self.transports.add(request.transport)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            load = self.in_flight / self.capacity if self.capacity else 1
+            if self.latency:
+                await asyncio.sleep(self.random.uniform(self.latency / 2, self.latency * 3 / 2) * max(load, 1))
+            if load > 1 and self.random.random() < 1 - 1 / load:
+                self.errors[endpoint] += 1
+                return web.json_response({"errors": ["Too Many Requests"]}, status=429)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors[endpoint] += 1
+                return web.json_response({"errors": ["Service Unavailable"]}, status=503)
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    async def extract_credentials(self, request: web.Request) -> web.Response:
+        tender_id = request.match_info["tender_id"]
+        return web.json_response({"data": {"owner": "broker", "tender_token": f"{tender_id}_token"}})
+
+    async def get_tender(self, request: web.Request) -> web.Response:
+        tender = self.tenders.get(request.match_info["tender_id"])
+        if tender is None:
+            return web.json_response({"errors": ["Not Found"]}, status=404)
+        return web.json_response({"data": tender})
+
+    async def patch_tender(self, request: web.Request) -> web.Response:
+        data = (await request.json())["data"]
+        return web.json_response({"data": {"id": request.match_info["tender_id"], **data}})
+
+    async def patch_tender_agreement(self, request: web.Request) -> web.Response:
+        data = (await request.json())["data"]
+        return web.json_response({"data": {"id": request.match_info["agreement_id"], **data}})
+
+    async def get_agreement(self, request: web.Request) -> web.Response:
+        agreement_id = request.match_info["agreement_id"]
+        status = self.agreements.get(agreement_id)
+        if status is None:
+            status = self.random.choices(list(self.statuses), weights=list(self.statuses.values()))[0]
+            self.agreements[agreement_id] = status
+        if status == 200:
+            data = self.agreements_data.get(agreement_id, {"id": agreement_id, "status": "active"})
+            return web.json_response({"data": data})
+        return web.json_response({"errors": ["Not Found" if status == 404 else "Archived"]}, status=status)
+
+    async def post_agreement(self, request: web.Request) -> web.Response:
+        data = (await request.json())["data"]
+        self.add_agreement(data)
+        return web.json_response({"data": data}, status=201)
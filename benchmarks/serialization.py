@@ -0,0 +1,45 @@
+"""
+Decode/encode time of agreement payloads for every available JSON backend.
+"text+json" is the old path: response.text() followed by json.loads.
+
+    python -m benchmarks.serialization --items 50 --contracts 20
+"""
+import argparse
+import json
+import random
+from timeit import Timer
+
+from benchmarks.data import agreement
+from prozorro_bridge_frameworkagreement.serializers import SERIALIZERS
+
+
+def measure(func, number: int) -> float:
+    best = min(Timer(func).repeat(repeat=5, number=number))
+    return best / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50, help="items per agreement")
+    parser.add_argument("--contracts", type=int, default=20, help="contracts per agreement")
+    parser.add_argument("--number", type=int, default=200, help="runs per measurement")
+    args = parser.parse_args()
+
+    random.seed(0)
+    payload = {"data": agreement(items=args.items, contracts=args.contracts)}
+    body = json.dumps(payload).encode()
+    print(f"payload: {len(body) / 1024:.1f} KiB")
+
+    baseline = measure(lambda: json.loads(body.decode("utf-8")), args.number)
+    print(f"{'text+json':<10} loads {baseline * 1e6:9.1f} us")
+    for name, serializer in SERIALIZERS.items():
+        loads_time = measure(lambda: serializer.loads(body), args.number)
+        dumps_time = measure(lambda: serializer.dumps(payload), args.number)
+        print(
+            f"{name:<10} loads {loads_time * 1e6:9.1f} us ({baseline / loads_time:.1f}x)"
+            f"   dumps {dumps_time * 1e6:9.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
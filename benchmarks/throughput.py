@@ -0,0 +1,168 @@
+"""
+End-to-end throughput of data_handler against the in-process MockAPI.
+
+    python -m benchmarks.throughput --tenders 5000 --lots 3 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import os
+import random
+from time import perf_counter
+from typing import Dict, List
+
+# take effect only when the benchmark is run from the command line, before settings are imported
+os.environ.setdefault("METRICS_ENABLED", "false")
+os.environ.setdefault("SYNCED_INDEX_PERSISTENT", "false")
+os.environ.setdefault("DEFERRED_PERSISTENT", "false")
+os.environ.setdefault("ERROR_INTERVAL", "0")
+
+from aiohttp import ClientSession  # noqa: E402
+
+from benchmarks.data import agreement, feed_pages  # noqa: E402
+from benchmarks.mock_api import MockAPI  # noqa: E402
+from prozorro_bridge_frameworkagreement import bridge, main as bridge_main  # noqa: E402
+from prozorro_bridge_frameworkagreement.client import close_session  # noqa: E402
+from prozorro_bridge_frameworkagreement.limiter import limiter  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def parse_statuses(value: str) -> Dict[int, float]:
+    """'404=0.8,410=0.1,200=0.1' -> {404: 0.8, 410: 0.1, 200: 0.1}"""
+    return {int(status): float(weight) for status, weight in (pair.split("=") for pair in value.split(","))}
+
+
+async def run(
+    tenders: int = 1000,
+    page_size: int = 100,
+    lots: int = 3,
+    cfa_share: float = 0.5,
+    selection_share: float = 0.2,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    statuses: Dict[int, float] = None,
+    seed: int = 0,
+    capacity: int = None,
+) -> dict:
+    random.seed(seed)
+    existing_agreements = [agreement() for _ in range(50)]
+    pool = bridge_main.worker_pool
+    handler = pool.handler
+    enqueued = {}
+    latencies = []
+
+    async def timed_handler(session: ClientSession, tender: dict) -> None:
+        try:
+            await handler(session, tender)
+        finally:
+            latencies.append(perf_counter() - enqueued[tender["id"]])
+
+    async with MockAPI(
+        latency=latency, error_rate=error_rate, statuses=statuses, seed=seed, capacity=capacity
+    ) as api:
+        for existing_agreement in existing_agreements:
+            api.add_agreement(existing_agreement)
+        base_url = bridge.BASE_URL
+        bridge.BASE_URL = api.url
+        pool.handler = timed_handler
+        fields = ("id", "dateModified") + bridge_main.API_OPT_FIELDS
+        items = 0
+        start = perf_counter()
+        try:
+            async with ClientSession() as session:
+                for page in feed_pages(
+                    tenders,
+                    page_size=page_size,
+                    lots=lots,
+                    selection_share=selection_share,
+                    cfa_share=cfa_share,
+                    existing_agreement_ids=[a["id"] for a in existing_agreements],
+                ):
+                    now = perf_counter()
+                    for item in page:
+                        api.add_tender(item)
+                        enqueued[item["id"]] = now
+                    # the feed serves only the requested opt fields, the rest is fetched from the mock
+                    page = [{key: item[key] for key in fields if key in item} for item in page]
+                    items += len(page)
+                    await bridge_main.data_handler(session, page)
+                await pool.join()
+                elapsed = perf_counter() - start
+                deferred = pool.deferred
+                await pool.stop()
+                await close_session()
+        finally:
+            pool.handler = handler
+            bridge.BASE_URL = base_url
+
+    processed = len(latencies)
+    return {
+        "items": items,
+        "processed": processed,
+        "deferred": deferred,
+        "elapsed": elapsed,
+        "items_per_second": items / elapsed,
+        "tenders_per_second": processed / elapsed,
+        "requests": api.total_requests,
+        "requests_per_tender": api.total_requests / processed if processed else 0.0,
+        "requests_by_endpoint": dict(api.requests),
+        "injected_errors": sum(api.errors.values()),
+        "max_in_flight": api.max_in_flight,
+        "concurrency_limit": int(limiter.limit),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p99": percentile(latencies, 0.99),
+    }
+
+
+def print_report(result: dict) -> None:
+    print(f"feed items:            {result['items']}")
+    print(f"processed tenders:     {result['processed']} ({result['deferred']} deferred)")
+    print(f"elapsed:               {result['elapsed']:.2f} s")
+    print(f"items/s:               {result['items_per_second']:.1f}")
+    print(f"tenders/s:             {result['tenders_per_second']:.1f}")
+    print(f"requests per tender:   {result['requests_per_tender']:.2f}")
+    print(f"max requests in flight {result['max_in_flight']}")
+    print(f"injected errors:       {result['injected_errors']}")
+    print(f"concurrency limit:     {result['concurrency_limit']}")
+    print(f"tender latency p50:    {result['latency_p50'] * 1000:.1f} ms")
+    print(f"tender latency p99:    {result['latency_p99'] * 1000:.1f} ms")
+    for endpoint, count in sorted(result["requests_by_endpoint"].items()):
+        print(f"  {endpoint:<24} {count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=1000, help="feed items to process")
+    parser.add_argument("--page-size", type=int, default=100, help="feed items per crawler page")
+    parser.add_argument("--lots", type=int, default=3, help="lots (agreements) per CFAUA tender")
+    parser.add_argument("--cfa-share", type=float, default=0.5, help="share of CFA procedures in the feed")
+    parser.add_argument("--selection-share", type=float, default=0.2, help="share of selection tenders among CFA")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean API latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--statuses", type=parse_statuses, default={404: 0.8, 410: 0.1, 200: 0.1},
+                        help="answers for unknown agreements, e.g. 404=0.8,410=0.1,200=0.1")
+    parser.add_argument("--capacity", type=int, help="requests the mock serves at once before degrading")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    result = asyncio.run(run(
+        tenders=args.tenders,
+        page_size=args.page_size,
+        lots=args.lots,
+        cfa_share=args.cfa_share,
+        selection_share=args.selection_share,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        statuses=args.statuses,
+        seed=args.seed,
+        capacity=args.capacity,
+    ))
+    print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Runs known tenders through the bridge without rewinding the feed.
+
+    python -m prozorro_bridge_frameworkagreement.backfill tenders.txt --checkpoint done.txt
+    mongoexport ... | python -m prozorro_bridge_frameworkagreement.backfill - --dry-run
+
+Every input line is either a tender id or a tender JSON object (full tenders are processed as is,
+ids and partial objects are fetched from the API). Ids of processed tenders are appended
+to the checkpoint file and skipped when the same file is passed again.
+Writes are sent directly even with OUTBOX_ENABLED=true.
+"""
+from aiohttp import ClientSession
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from time import perf_counter
+from typing import AsyncIterator, Optional, Set, TextIO, Tuple
+
+from prozorro_bridge_frameworkagreement.bridge import process_tender, get_tender, mirror, direct_writes
+from prozorro_bridge_frameworkagreement.client import get_session, close_session
+from prozorro_bridge_frameworkagreement.logs import setup_logging, stop_logging
+from prozorro_bridge_frameworkagreement.serializers import loads
+from prozorro_bridge_frameworkagreement.settings import LOGGER, MIRROR_ENABLED
+from prozorro_bridge_frameworkagreement.utils import journal_context, check_tender, project_tender
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_EXCEPTION
+
+
+PROCESSED = "processed"
+NOT_APPLICABLE = "not_applicable"
+CHECKPOINTED = "checkpointed"
+FAILED = "failed"
+
+
+def parse_line(line: str) -> Tuple[str, Optional[dict]]:
+    line = line.strip()
+    if line.startswith("{"):
+        tender = loads(line)
+        if "data" in tender:
+            tender = tender["data"]
+        return tender["id"], project_tender(tender)
+    return line, None
+
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    if path is None:
+        return set()
+    try:
+        with open(path) as f:
+            return {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+async def read_lines(stream: TextIO) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, stream.readline)
+        if not line:
+            return
+        if line.strip():
+            yield line
+
+
+async def backfill(
+    stream: TextIO,
+    session: ClientSession,
+    concurrency: int,
+    checkpoint: Optional[str] = None,
+    dry_run: bool = False,
+) -> Counter:
+    stats = Counter()
+    # the outbox sender isn't running here, and a tender is checkpointed only after its writes are sent
+    direct_writes_token = direct_writes.set(True)
+    done = load_checkpoint(checkpoint)
+    checkpoint_file = open(checkpoint, "a") if checkpoint and not dry_run else None
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def handle(tender_id: str, tender: Optional[dict]) -> str:
+        if tender is None or "procuringEntity" not in tender:
+            tender = await get_tender(tender_id, session)
+        if not check_tender(tender):
+            return NOT_APPLICABLE
+        if dry_run:
+            LOGGER.info(f"Would process tender {tender_id} ({tender['procurementMethodType']} {tender['status']})")
+        else:
+            await process_tender(session, tender)
+        return PROCESSED
+
+    async def worker() -> None:
+        while True:
+            tender_id, tender = await queue.get()
+            try:
+                result = await handle(tender_id, tender)
+            except Exception as e:
+                LOGGER.error(
+                    f"Failed to backfill tender {tender_id}",
+                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}, params={"TENDER_ID": tender_id}),
+                )
+                LOGGER.exception(e)
+                stats[FAILED] += 1
+            else:
+                stats[result] += 1
+                if checkpoint_file is not None:
+                    checkpoint_file.write(tender_id + "\n")
+                    checkpoint_file.flush()
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        async for line in read_lines(stream):
+            try:
+                tender_id, tender = parse_line(line)
+            except (ValueError, KeyError) as e:
+                LOGGER.error(f"Can't parse backfill line {line[:100]!r}: {e}")
+                stats[FAILED] += 1
+                continue
+            if tender_id in done:
+                stats[CHECKPOINTED] += 1
+                continue
+            done.add(tender_id)
+            await queue.put((tender_id, tender))
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if checkpoint_file is not None:
+            checkpoint_file.close()
+        direct_writes.reset(direct_writes_token)
+    return stats
+
+
+def print_summary(stats: Counter, elapsed: float) -> None:
+    handled = stats[PROCESSED] + stats[NOT_APPLICABLE] + stats[FAILED]
+    print(
+        f"processed: {stats[PROCESSED]}, not applicable: {stats[NOT_APPLICABLE]}, failed: {stats[FAILED]}, "
+        f"skipped by checkpoint: {stats[CHECKPOINTED]}; "
+        f"{elapsed:.1f} s, {handled / elapsed if elapsed else 0:.1f} tenders/s"
+    )
+
+
+async def run(args: argparse.Namespace) -> Counter:
+    start = perf_counter()
+    stream = sys.stdin if args.input == "-" else open(args.input)
+    session = get_session()
+    try:
+        if MIRROR_ENABLED and not args.dry_run:
+            # most agreements of known tenders exist already, the mirror saves a probe for each of them
+            mirror.start(session)
+            LOGGER.info("Waiting for the agreements mirror to reach the end of the feed")
+            await mirror.ready.wait()
+        stats = await backfill(
+            stream,
+            session,
+            concurrency=args.concurrency,
+            checkpoint=args.checkpoint,
+            dry_run=args.dry_run,
+        )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        await mirror.stop()
+        await close_session()
+    print_summary(stats, perf_counter() - start)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="file with tender ids or JSON lines, - for stdin")
+    parser.add_argument("--concurrency", type=int, default=10, help="tenders processed at once")
+    parser.add_argument("--checkpoint", help="file with ids of processed tenders, appended while running")
+    parser.add_argument("--dry-run", action="store_true", help="only report tenders that would be processed")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        stats = asyncio.run(run(args))
+    finally:
+        stop_logging()
+    sys.exit(1 if stats[FAILED] else 0)
+
+
+if __name__ == "__main__":
+    main()
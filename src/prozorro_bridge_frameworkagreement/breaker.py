@@ -0,0 +1,156 @@
+import asyncio
+from collections import deque
+from time import monotonic
+
+from prozorro_bridge_frameworkagreement.metrics import CIRCUIT_STATE
+from prozorro_bridge_frameworkagreement.settings import (
+    LOGGER,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_WINDOW,
+    CIRCUIT_MIN_REQUESTS,
+    CIRCUIT_OPEN_INTERVAL,
+    CIRCUIT_HALF_OPEN_REQUESTS,
+)
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_CIRCUIT_OPEN, DATABRIDGE_CIRCUIT_CLOSED
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CREDENTIALS = "credentials"
+TENDER_GET = "tender_get"
+AGREEMENT_GET = "agreement_get"
+AGREEMENT_POST = "agreement_post"
+TENDER_PATCH = "tender_patch"
+
+
+class CircuitOpenError(ConnectionError):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"Circuit {name} is open, retry in {retry_in:.1f} seconds")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Opens when failures make up `threshold` of the last `window` results (counted after `min_requests`),
+    then rejects requests for `open_interval` seconds.
+    After that `half_open_requests` probes are let through:
+    a successful probe closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        threshold: float,
+        window: int,
+        min_requests: int,
+        open_interval: float,
+        half_open_requests: int,
+    ) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.open_interval = open_interval
+        self.half_open_requests = half_open_requests
+        self.results = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+
+    @property
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_interval - monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and self.retry_in > 0
+
+    def before_request(self) -> None:
+        if self.state == OPEN:
+            retry_in = self.retry_in
+            if retry_in > 0:
+                raise CircuitOpenError(self.name, retry_in)
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_requests:
+                raise CircuitOpenError(self.name, 0)
+            self.probes += 1
+
+    def release_probe(self) -> None:
+        """Frees the probe slot of a request that ended without a result, e.g. was cancelled"""
+        if self.state == HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def record_success(self) -> None:
+        if self.state == HALF_OPEN:
+            self.close()
+        elif self.state == CLOSED:
+            self.results.append(True)
+
+    def record_failure(self) -> None:
+        if self.state == HALF_OPEN:
+            self.open()
+        elif self.state == CLOSED:
+            self.results.append(False)
+            if (
+                len(self.results) >= self.min_requests
+                and self.results.count(False) / len(self.results) >= self.threshold
+            ):
+                self.open()
+
+    def open(self) -> None:
+        self.state = OPEN
+        self.opened_at = monotonic()
+        self.results.clear()
+        LOGGER.warning(
+            f"Circuit {self.name} is open for {self.open_interval} seconds",
+            extra=journal_context({"MESSAGE_ID": DATABRIDGE_CIRCUIT_OPEN}),
+        )
+
+    def close(self) -> None:
+        self.state = CLOSED
+        self.results.clear()
+        LOGGER.info(
+            f"Circuit {self.name} is closed",
+            extra=journal_context({"MESSAGE_ID": DATABRIDGE_CIRCUIT_CLOSED}),
+        )
+
+    def reset(self) -> None:
+        self.state = CLOSED
+        self.results.clear()
+        self.probes = 0
+
+
+def build_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        threshold=CIRCUIT_FAILURE_THRESHOLD,
+        window=CIRCUIT_WINDOW,
+        min_requests=CIRCUIT_MIN_REQUESTS,
+        open_interval=CIRCUIT_OPEN_INTERVAL,
+        half_open_requests=CIRCUIT_HALF_OPEN_REQUESTS,
+    )
+
+
+breakers = {
+    name: build_breaker(name)
+    for name in (CREDENTIALS, TENDER_GET, AGREEMENT_GET, AGREEMENT_POST, TENDER_PATCH)
+}
+
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE.set_function(lambda: {(name,): STATE_VALUES[b.state] for name, b in breakers.items()})
+
+
+async def wait_closed() -> None:
+    while True:
+        retry_in = max(breaker.retry_in for breaker in breakers.values())
+        if retry_in <= 0:
+            return
+        await asyncio.sleep(retry_in)
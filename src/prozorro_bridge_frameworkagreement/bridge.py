@@ -1,20 +1,64 @@
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientResponse
 import asyncio
-import json
-from typing import AsyncGenerator
+import logging
+from contextvars import ContextVar
+from functools import partial
+from typing import AsyncGenerator, Callable, List, Optional
 
+from pymongo.errors import PyMongoError
+
+from prozorro_bridge_frameworkagreement.breaker import (
+    breakers,
+    CREDENTIALS,
+    TENDER_GET,
+    AGREEMENT_GET,
+    AGREEMENT_POST,
+    TENDER_PATCH,
+)
+from prozorro_bridge_frameworkagreement.cache import TTLCache
+from prozorro_bridge_frameworkagreement.limiter import limiter
+from prozorro_bridge_frameworkagreement.metrics import STAGE_DURATION, MIRROR_LOOKUPS, JOURNAL_MESSAGES
+from prozorro_bridge_frameworkagreement.mirror import AgreementsMirror
+from prozorro_bridge_frameworkagreement.outbox import Outbox
+from prozorro_bridge_frameworkagreement.retry import retry_policy, RetryExhausted
+from prozorro_bridge_frameworkagreement.serializers import loads, dumps
+from prozorro_bridge_frameworkagreement.sla import observe_completion, AGREEMENTS_POSTED, STATUS_PATCHED
+from prozorro_bridge_frameworkagreement.tracing import tracer, inject
+from prozorro_bridge_frameworkagreement.storage import SyncedIndex, get_collection, AGREEMENT, TENDER, TENDER_VERSION
 from prozorro_bridge_frameworkagreement.settings import (
     LOGGER,
-    ERROR_INTERVAL,
-    API_TOKEN,
-    API_TOKEN_GET_CREDENTIALS,
-    API_TOKEN_POST_AGREEMENTS,
+    CREDENTIALS_CACHE_TTL,
+    CREDENTIALS_CACHE_SIZE,
+    AGREEMENTS_PROBE_CONCURRENCY,
+    AGREEMENT_PROBE_METHOD,
+    SYNCED_INDEX_PERSISTENT,
+    SYNCED_INDEX_COLLECTION,
+    SYNCED_INDEX_SIZE,
+    SYNCED_INDEX_TTL,
+    OUTBOX_ENABLED,
+    OUTBOX_COLLECTION,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_CONCURRENCY,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_LEASE_INTERVAL,
+    DEFERRED_RETRY_INTERVAL,
+    LIMITER_ENABLED,
+    MIRROR_ENABLED,
+    MIRROR_PAGE_LIMIT,
+    MIRROR_POLL_INTERVAL,
+    MIRROR_FILE,
+    MIRROR_SAVE_INTERVAL,
 )
 from prozorro_bridge_frameworkagreement.utils import (
     journal_context,
     check_tender,
+    project_tender,
     BASE_URL,
+    AGREEMENTS_FEED_URL,
     HEADERS,
+    PUBLIC_HEADERS,
+    POST_AGREEMENTS_HEADERS,
+    GET_CREDENTIALS_HEADERS,
 )
 from prozorro_bridge_frameworkagreement.journal_msg_ids import (
     DATABRIDGE_GET_CREDENTIALS,
@@ -28,12 +72,87 @@ from prozorro_bridge_frameworkagreement.journal_msg_ids import (
     DATABRIDGE_PATCH_AGREEMENT_DATA,
     DATABRIDGE_SKIP_TENDER,
     DATABRIDGE_MISSING_AGREEMENTS,
+    DATABRIDGE_AGREEMENT_UP_TO_DATE,
+)
+
+
+credentials_cache = TTLCache(CREDENTIALS_CACHE_TTL, CREDENTIALS_CACHE_SIZE)
+synced_index = SyncedIndex(
+    SYNCED_INDEX_SIZE,
+    get_collection=partial(get_collection, SYNCED_INDEX_COLLECTION) if SYNCED_INDEX_PERSISTENT else None,
+    ttl=SYNCED_INDEX_TTL,
 )
+outbox = Outbox(
+    partial(get_collection, OUTBOX_COLLECTION),
+    batch_size=OUTBOX_BATCH_SIZE,
+    concurrency=OUTBOX_CONCURRENCY,
+    poll_interval=OUTBOX_POLL_INTERVAL,
+    retry_interval=DEFERRED_RETRY_INTERVAL,
+    lease_interval=OUTBOX_LEASE_INTERVAL,
+)
+mirror = AgreementsMirror(
+    AGREEMENTS_FEED_URL,
+    PUBLIC_HEADERS,
+    page_limit=MIRROR_PAGE_LIMIT,
+    poll_interval=MIRROR_POLL_INTERVAL,
+    save_interval=MIRROR_SAVE_INTERVAL,
+    path=MIRROR_FILE or None,
+)
+
+# not copied to the tender: id is in the url, documents and dateModified belong to the agreement object,
+# the rest exist only on /agreements, fill_agreement adds them when the agreement is created
+AGREEMENT_PATCH_SKIP_FIELDS = (
+    "id",
+    "documents",
+    "dateModified",
+    "agreementType",
+    "tender_id",
+    "owner",
+    "procuringEntity",
+    "mode",
+)
+
+OUTBOX_AGREEMENT = "agreement"
+OUTBOX_TENDER_STATUS = "tender_status"
+# writes bypass the outbox where nothing runs its sender, e.g. in the backfill
+direct_writes: ContextVar = ContextVar("direct_writes", default=False)
 
 
+async def api_request(session: ClientSession, endpoint: str, method: str, url: str, **kwargs) -> ClientResponse:
+    breaker = breakers[endpoint]
+    breaker.before_request()
+    start = None
+    overloaded = None
+    try:
+        start = await limiter.acquire() if LIMITER_ENABLED else None
+        with tracer.span(endpoint, method=method.upper(), url=url) as span:
+            kwargs["headers"] = inject(kwargs.get("headers"))
+            try:
+                response = await getattr(session, method)(url, **kwargs)
+            except Exception:
+                overloaded = True
+                raise
+            span.set_attribute("status", response.status)
+            overloaded = response.status >= 500 or response.status == 429
+    finally:
+        if start is not None:
+            limiter.release(start, overloaded)
+        if overloaded is None:
+            # cancelled (CancelledError isn't an Exception) before there was a result,
+            # a half-open probe slot must not be held forever
+            breaker.release_probe()
+        elif overloaded:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    return response
+
+
+@tracer.traced("credentials", lambda tender_id, session: {"tender_id": tender_id})
+@STAGE_DURATION.timed("credentials")
 async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict:
-    HEADERS["Authorization"] = f"Bearer {API_TOKEN_GET_CREDENTIALS}"
     url = f"{BASE_URL}/tenders/{tender_id}/extract_credentials"
+    retry = retry_policy.start()
     while True:
         LOGGER.info(
             f"Getting credentials for tender {tender_id}",
@@ -42,11 +161,11 @@ async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict
                 {"TENDER_ID": tender_id}
             ),
         )
+        response = None
         try:
-            response = await session.get(url, headers=HEADERS)
-            data = await response.text()
+            response = await api_request(session, CREDENTIALS, "get", url, headers=GET_CREDENTIALS_HEADERS)
             if response.status == 200:
-                data = json.loads(data)
+                data = loads(await response.read())
                 LOGGER.info(
                     f"Got tender {tender_id} credentials",
                     extra=journal_context(
@@ -55,7 +174,7 @@ async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict
                     ),
                 )
                 return data["data"]
-            raise ConnectionError(f"Failed to get credentials {data}")
+            raise ConnectionError(f"Failed to get credentials {await response.text()}")
         except Exception as e:
             LOGGER.warning(
                 f"Can't get tender credentials {tender_id}",
@@ -65,17 +184,22 @@ async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict
                 ),
             )
             LOGGER.exception(e)
-            await asyncio.sleep(ERROR_INTERVAL)
+            await retry.wait(response)
 
 
+@tracer.traced("get_tender", lambda tender_id, session: {"tender_id": tender_id})
+@STAGE_DURATION.timed("get_tender")
 async def get_tender(tender_id: str, session: ClientSession) -> dict:
+    retry = retry_policy.start()
     while True:
+        response = None
         try:
-            response = await session.get(f"{BASE_URL}/tenders/{tender_id}", headers=HEADERS)
-            data = await response.text()
+            response = await api_request(
+                session, TENDER_GET, "get", f"{BASE_URL}/tenders/{tender_id}", headers=HEADERS
+            )
             if response.status != 200:
-                raise ConnectionError(f"Error {data}")
-            return json.loads(data)["data"]
+                raise ConnectionError(f"Error {await response.text()}")
+            return project_tender(loads(await response.read())["data"])
         except Exception as e:
             LOGGER.warning(
                 f"Fail to get tender {tender_id}",
@@ -85,22 +209,148 @@ async def get_tender(tender_id: str, session: ClientSession) -> dict:
                 )
             )
             LOGGER.exception(e)
-            await asyncio.sleep(ERROR_INTERVAL)
+            await retry.wait(response)
+
+
+@STAGE_DURATION.timed("agreement_get")
+async def get_agreement(agreement_id: str, tender_id: str, session: ClientSession) -> ClientResponse:
+    """Returns the response with the body read for an existing agreement, other responses are released"""
+    retry = retry_policy.start()
+    while True:
+        response = None
+        try:
+            response = await api_request(
+                session, AGREEMENT_GET, "get", f"{BASE_URL}/agreements/{agreement_id}", headers=HEADERS
+            )
+            if response.status == 200:
+                await response.read()
+                return response
+            if response.status in (404, 410):
+                response.release()
+                return response
+            data = await response.text()
+            raise ConnectionError(f"Unexpected status {response.status} {data}")
+        except Exception as e:
+            LOGGER.warning(
+                f"Fail to get agreement {agreement_id} of tender {tender_id}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_EXCEPTION},
+                    params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement_id}
+                )
+            )
+            LOGGER.exception(e)
+            await retry.wait(response)
+
+
+# switched to "get" for the rest of the run if the API doesn't allow HEAD requests
+probe_method = AGREEMENT_PROBE_METHOD
+
+
+@STAGE_DURATION.timed("agreement_probe")
+async def probe_agreement(agreement_id: str, tender_id: str, session: ClientSession) -> int:
+    """Returns the status of the agreement in `/agreements` (200, 404 or 410) without downloading it"""
+    global probe_method
+    if MIRROR_ENABLED:
+        # agreements don't disappear from the feed once created, but an unknown one may be
+        # just created and not in the mirror yet, or archived, so misses are asked from the API
+        if agreement_id in mirror:
+            MIRROR_LOOKUPS.inc("hit")
+            return 200
+        MIRROR_LOOKUPS.inc("miss")
+    url = f"{BASE_URL}/agreements/{agreement_id}"
+    retry = retry_policy.start()
+    while True:
+        response = None
+        try:
+            response = await api_request(session, AGREEMENT_GET, probe_method, url, headers=HEADERS)
+            if probe_method == "get":
+                # reading the body to the end keeps the connection reusable
+                await response.read()
+            response.release()
+            if response.status in (405, 501) and probe_method == "head":
+                LOGGER.warning(f"HEAD {url} is not allowed ({response.status}), probing agreements with GET")
+                probe_method = "get"
+                continue
+            if response.status in (200, 404, 410):
+                return response.status
+            raise ConnectionError(f"Unexpected status {response.status}")
+        except Exception as e:
+            LOGGER.warning(
+                f"Fail to get agreement {agreement_id} of tender {tender_id}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_EXCEPTION},
+                    params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement_id}
+                )
+            )
+            LOGGER.exception(e)
+            await retry.wait(response)
+
+
+async def gather_agreements(request: Callable, agreement_ids: list, tender_id: str, session: ClientSession) -> list:
+    semaphore = asyncio.Semaphore(AGREEMENTS_PROBE_CONCURRENCY)
+
+    async def request_with_limit(agreement_id: str):
+        async with semaphore:
+            return await request(agreement_id, tender_id, session)
+
+    # gather keeps results in the order of agreement_ids
+    return await asyncio.gather(*(request_with_limit(agreement_id) for agreement_id in agreement_ids))
+
+
+@tracer.traced(
+    "probes",
+    lambda agreement_ids, tender_id, session: {"tender_id": tender_id, "agreement_ids": list(agreement_ids)},
+)
+async def probe_agreements(agreement_ids: list, tender_id: str, session: ClientSession) -> List[int]:
+    return await gather_agreements(probe_agreement, agreement_ids, tender_id, session)
+
+
+@tracer.traced(
+    "agreements",
+    lambda agreement_ids, tender_id, session: {"tender_id": tender_id, "agreement_ids": list(agreement_ids)},
+)
+async def get_agreements(agreement_ids: list, tender_id: str, session: ClientSession) -> List[ClientResponse]:
+    return await gather_agreements(get_agreement, agreement_ids, tender_id, session)
 
 
 async def get_tender_agreements(tender_to_sync: dict, session: ClientSession) -> AsyncGenerator[dict, None]:
+    active_agreements = []
     for agreement in tender_to_sync["agreements"]:
         if agreement["status"] != "active":
             LOGGER.info(
-                f"Skipping agreement {agreement} with status {agreement['status']}",
+                "Skipping agreement %s with status %s", agreement["id"], agreement["status"],
                 extra=journal_context(
-                    params={"TENDER_ID": tender_to_sync["id"]}
+                    params={"TENDER_ID": tender_to_sync["id"], "AGREEMENT_ID": agreement["id"]}
                 ),
             )
             continue
-        response = await session.get(f"{BASE_URL}/agreements/{agreement['id']}", headers=HEADERS)
+        active_agreements.append(agreement)
+
+    synced = await synced_index.filter_synced(AGREEMENT, [a["id"] for a in active_agreements])
+    agreements_to_check = []
+    for agreement in active_agreements:
+        if agreement["id"] in synced:
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug(
+                    "Agreement %s already synced", agreement["id"],
+                    extra=journal_context(
+                        {"MESSAGE_ID": DATABRIDGE_SKIP_AGREEMENT},
+                        params=({"TENDER_ID": tender_to_sync["id"], "AGREEMENT_ID": agreement["id"]})
+                    )
+                )
+            else:
+                JOURNAL_MESSAGES.inc(DATABRIDGE_SKIP_AGREEMENT)
+            continue
+        agreements_to_check.append(agreement)
 
-        if response.status == 404:
+    statuses = await probe_agreements([a["id"] for a in agreements_to_check], tender_to_sync["id"], session)
+    await synced_index.add(
+        AGREEMENT,
+        *(a["id"] for a, status in zip(agreements_to_check, statuses) if status in (200, 410))
+    )
+
+    for agreement, status in zip(agreements_to_check, statuses):
+        if status == 404:
             LOGGER.info(
                 f"Sync agreement {agreement['id']} of tender {tender_to_sync['id']}",
                 extra=journal_context(
@@ -109,7 +359,7 @@ async def get_tender_agreements(tender_to_sync: dict, session: ClientSession) ->
                 )
             )
             yield agreement
-        elif response.status == 410:
+        elif status == 410:
             LOGGER.info(
                 f"Agreement {agreement['id']} of tender {tender_to_sync['id']} has been archived",
                 extra=journal_context(
@@ -118,7 +368,7 @@ async def get_tender_agreements(tender_to_sync: dict, session: ClientSession) ->
                 )
             )
             continue
-        elif response.status == 200:
+        elif status == 200:
             LOGGER.info(
                 f"Agreement {agreement['id']} already exist",
                 extra=journal_context(
@@ -129,22 +379,41 @@ async def get_tender_agreements(tender_to_sync: dict, session: ClientSession) ->
             continue
 
 
-async def fill_agreement(agreement: dict, tender: dict, session: ClientSession) -> None:
-    credentials_data = await get_tender_credentials(tender["id"], session)
-    assert "owner" in credentials_data
-    assert "tender_token" in credentials_data
+def fill_agreement(agreement: dict, tender: dict) -> None:
     agreement["agreementType"] = "cfaua"
     agreement["tender_id"] = tender["id"]
-    agreement["tender_token"] = credentials_data["tender_token"]
-    agreement["owner"] = credentials_data["owner"]
     agreement["procuringEntity"] = tender["procuringEntity"]
     if "mode" in tender:
         agreement["mode"] = tender["mode"]
     agreement["contracts"] = [c for c in agreement["contracts"] if c["status"] == "active"]
 
 
+@tracer.traced(
+    "fill",
+    lambda agreement, session: {"tender_id": agreement["tender_id"], "agreement_id": agreement["id"]},
+)
+async def fill_credentials(agreement: dict, session: ClientSession) -> None:
+    """
+    Adds the tender owner credentials right before the agreement is posted,
+    so they are never stored with a pending write in the outbox
+    """
+    credentials_data = await credentials_cache.get(
+        agreement["tender_id"],
+        partial(get_tender_credentials, agreement["tender_id"], session),
+    )
+    assert "owner" in credentials_data
+    assert "tender_token" in credentials_data
+    agreement["tender_token"] = credentials_data["tender_token"]
+    agreement["owner"] = credentials_data["owner"]
+
+
+@tracer.traced(
+    "post",
+    lambda agreement, session: {"tender_id": agreement["tender_id"], "agreement_id": agreement["id"]},
+)
+@STAGE_DURATION.timed("post_agreement")
 async def post_agreement(agreement: dict, session: ClientSession) -> bool:
-    HEADERS["Authorization"] = f"Bearer {API_TOKEN_POST_AGREEMENTS}"
+    retry = retry_policy.start()
     while True:
         LOGGER.info(
             f"Creating agreement {agreement['id']} of tender {agreement['tender_id']}",
@@ -154,16 +423,24 @@ async def post_agreement(agreement: dict, session: ClientSession) -> bool:
             )
         )
         try:
-            response = await session.post(f"{BASE_URL}/agreements", json={"data": agreement}, headers=HEADERS)
+            response = await api_request(
+                session,
+                AGREEMENT_POST,
+                "post",
+                f"{BASE_URL}/agreements",
+                data=dumps({"data": agreement}),
+                headers=POST_AGREEMENTS_HEADERS
+            )
         except Exception as e:
             LOGGER.warning(
                 f"Error on posting agreement {agreement['id']} of tender {agreement['tender_id']}. "
                 f"Response: {str(e)}"
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            await retry.wait()
             continue
         if response.status == 201:
             LOGGER.info(f"Agreement {agreement['id']} of tender {agreement['tender_id']} successfully created")
+            await synced_index.add(AGREEMENT, agreement["id"])
         else:
             data = await response.text()
             if response.status in (403, 422):
@@ -180,16 +457,74 @@ async def post_agreement(agreement: dict, session: ClientSession) -> bool:
                 f"Agreement {agreement['id']} was not created, retrying. "
                 f"Response: {data}"
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            await retry.wait(response)
             continue
         return True
 
 
+def diff_agreement(agreement: dict, tender_agreement: dict) -> dict:
+    # lists like contracts are compared and sent whole, the API replaces them on patch anyway
+    return {
+        key: value
+        for key, value in agreement.items()
+        if key not in AGREEMENT_PATCH_SKIP_FIELDS and tender_agreement.get(key) != value
+    }
+
+
+@tracer.traced(
+    "patch_agreement",
+    lambda tender_id, agreement_id, changes, session: {"tender_id": tender_id, "agreement_id": agreement_id},
+)
+async def patch_tender_agreement(tender_id: str, agreement_id: str, changes: dict, session: ClientSession) -> bool:
+    retry = retry_policy.start()
+    while True:
+        LOGGER.info(
+            f"Patch tender agreement {agreement_id}: {', '.join(changes)}",
+            extra=journal_context(
+                {"MESSAGE_ID": DATABRIDGE_PATCH_AGREEMENT_DATA},
+                params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement_id}
+            )
+        )
+        try:
+            response = await api_request(
+                session,
+                TENDER_PATCH,
+                "patch",
+                f"{BASE_URL}/tenders/{tender_id}/agreements/{agreement_id}",
+                data=dumps({"data": changes}),
+                headers=HEADERS
+            )
+        except Exception as e:
+            LOGGER.warning(
+                f"Error on patching agreement {agreement_id} of tender {tender_id}. "
+                f"Response: {str(e)}"
+            )
+            await retry.wait()
+            continue
+        if response.status == 200:
+            return True
+        data = await response.text()
+        if response.status in (403, 422):
+            LOGGER.error(
+                f"Stop trying patch agreement {agreement_id} of tender {tender_id}. "
+                f"Response: {data}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_EXCEPTION},
+                    params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement_id}
+                )
+            )
+            return False
+        LOGGER.warning(
+            f"Agreement {agreement_id} of tender {tender_id} was not patched, retrying. "
+            f"Response: {data}"
+        )
+        await retry.wait(response)
+
+
 async def check_and_patch_agreements(agreements: list, tender_id: str, session: ClientSession) -> bool:
-    HEADERS["Authorization"] = f"Bearer {API_TOKEN}"
-    for agreement in agreements:
-        response = await session.get(f"{BASE_URL}/agreements/{agreement['id']}", headers=HEADERS)
-        if response.status == 404:
+    responses = await get_agreements([a["id"] for a in agreements], tender_id, session)
+    for agreement, response in zip(agreements, responses):
+        if response.status != 200:
             LOGGER.warning(
                 f"Agreement {agreement['id']} doesn't exist",
                 extra=journal_context(
@@ -197,6 +532,8 @@ async def check_and_patch_agreements(agreements: list, tender_id: str, session:
                 )
             )
             return False
+    await synced_index.add(AGREEMENT, *(a["id"] for a in agreements))
+    for agreement, response in zip(agreements, responses):
         LOGGER.info(
             f"Received agreement data {agreement['id']}",
             extra=journal_context(
@@ -204,29 +541,35 @@ async def check_and_patch_agreements(agreements: list, tender_id: str, session:
                 params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement['id']}
             )
         )
-        agreement_data = await response.json()
-        agreement_data["data"].pop("id")
-        agreement_data["data"].pop("documents", None)
-        LOGGER.info(
-            f"Patch tender agreement {agreement['id']}",
-            extra=journal_context(
-                {"MESSAGE_ID": DATABRIDGE_PATCH_AGREEMENT_DATA},
-                params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement['id']}
-            )
-        )
-        await session.patch(
-            f"{BASE_URL}/tenders/{tender_id}/agreements/{agreement['id']}",
-            json=agreement_data,
-            headers=HEADERS
-        )
+        changes = diff_agreement(loads(await response.read())["data"], agreement)
+        if not changes:
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug(
+                    "Tender agreement %s is up to date", agreement["id"],
+                    extra=journal_context(
+                        {"MESSAGE_ID": DATABRIDGE_AGREEMENT_UP_TO_DATE},
+                        params={"TENDER_ID": tender_id, "AGREEMENT_ID": agreement['id']}
+                    )
+                )
+            else:
+                JOURNAL_MESSAGES.inc(DATABRIDGE_AGREEMENT_UP_TO_DATE)
+            continue
+        if not await patch_tender_agreement(tender_id, agreement["id"], changes, session):
+            # the tender mustn't change status with an unsynced agreement, it's deferred and checked again
+            raise RetryExhausted(f"Agreement {agreement['id']} of tender {tender_id} was not patched")
     return True
 
 
-async def patch_tender(tender: dict, agreements_exists: bool, session: ClientSession) -> None:
-    HEADERS["Authorization"] = f"Bearer {API_TOKEN}"
+@tracer.traced(
+    "patch",
+    lambda tender, agreements_exists, session: {"tender_id": tender["id"], "agreements_exists": agreements_exists},
+)
+@STAGE_DURATION.timed("patch_tender")
+async def patch_tender(tender: dict, agreements_exists: bool, session: ClientSession) -> bool:
     status = "active.enquiries"
     if not agreements_exists:
         status = "draft.unsuccessful"
+    retry = retry_policy.start()
     while True:
         LOGGER.info(
             f"Switch tender {tender['id']} status to {status}",
@@ -236,9 +579,12 @@ async def patch_tender(tender: dict, agreements_exists: bool, session: ClientSes
             )
         )
         try:
-            response = await session.patch(
+            response = await api_request(
+                session,
+                TENDER_PATCH,
+                "patch",
                 f"{BASE_URL}/tenders/{tender['id']}",
-                json={"data": {"status": status}},
+                data=dumps({"data": {"status": status}}),
                 headers=HEADERS
             )
         except Exception as e:
@@ -246,9 +592,8 @@ async def patch_tender(tender: dict, agreements_exists: bool, session: ClientSes
                 f"Error on patching tender {tender['id']} to status {status}. "
                 f"Response: {str(e)}"
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            await retry.wait()
             continue
-        data = await response.text()
         if response.status == 200:
             LOGGER.info(
                 f"Successfully switched tender {tender['id']} to status {status}",
@@ -257,8 +602,10 @@ async def patch_tender(tender: dict, agreements_exists: bool, session: ClientSes
                     params={"TENDER_ID": tender["id"]}
                 )
             )
-            return
-        elif response.status in (403, 422):
+            await synced_index.add(TENDER, tender["id"])
+            return True
+        data = await response.text()
+        if response.status in (403, 422):
             LOGGER.error(
                 f"Stop trying patch tender {tender['id']}. "
                 f"Response: {data}",
@@ -267,26 +614,100 @@ async def patch_tender(tender: dict, agreements_exists: bool, session: ClientSes
                     params={"TENDER_ID": tender["id"]}
                 )
             )
-            return
+            return False
         else:
             LOGGER.warning(
                 f"Tender {tender['id']} was not patched, retrying. "
                 f"Response: {data}"
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            await retry.wait(response)
 
 
-async def process_tender(session: ClientSession, tender: dict) -> None:
+async def send_outbox_item(kind: str, payload: dict, session: ClientSession) -> None:
+    # payloads carry dateModified of the tender, latency is observed only for writes that were made
+    tender = {"id": payload["tender_id"], "dateModified": payload.get("dateModified")}
+    if kind == OUTBOX_AGREEMENT:
+        agreement = payload["agreement"]
+        await fill_credentials(agreement, session)
+        if await post_agreement(agreement, session):
+            observe_completion(tender, AGREEMENTS_POSTED)
+    elif kind == OUTBOX_TENDER_STATUS:
+        if await patch_tender(tender, payload["agreements_exists"], session):
+            observe_completion(tender, STATUS_PATCHED)
+
+
+async def schedule_write(kind: str, key: str, payload: dict, session: ClientSession) -> None:
+    if OUTBOX_ENABLED and not direct_writes.get():
+        try:
+            await outbox.put(kind, key, payload)
+            return
+        except PyMongoError as e:
+            LOGGER.warning(
+                f"Can't put {kind} {key} to outbox, sending it directly: {e}",
+                extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+            )
+    await send_outbox_item(kind, payload, session)
+
+
+# fields each procedure reads that feed items don't carry (see API_OPT_FIELDS).
+# closeFrameworkAgreementUA tenders may have no agreements, that's reported, not refetched,
+# but a full tender always has procuringEntity
+PROCEDURE_FIELDS = {
+    "closeFrameworkAgreementUA": ("procuringEntity",),
+    "closeFrameworkAgreementSelectionUA": ("agreements",),
+}
+
+
+async def complete_tender(tender: dict, session: ClientSession) -> Optional[dict]:
+    """
+    Fetches the full tender when the feed item lacks fields its procedure reads,
+    returns None if the fetched tender no longer passes check_tender
+    """
+    if all(field in tender for field in PROCEDURE_FIELDS[tender["procurementMethodType"]]):
+        return tender
+    tender = await get_tender(tender["id"], session)
     if not check_tender(tender):
+        log_skip_tender(tender)
+        return None
+    return tender
+
+
+def tender_version(tender: dict) -> str:
+    return f"{tender['id']}:{tender.get('dateModified')}"
+
+
+def log_skip_tender(tender: dict, reason: str = None) -> None:
+    # the hottest log call, so neither the message nor the journal context is built when debug is off,
+    # the message is still counted in bridge_journal_messages_total
+    if LOGGER.isEnabledFor(logging.DEBUG):
         LOGGER.debug(
-            f"Skipping tender {tender['id']} in status {tender['status']}",
+            "Skipping tender %s: %s", tender["id"], reason or f"status {tender['status']}",
             extra=journal_context(
                 {"MESSAGE_ID": DATABRIDGE_SKIP_TENDER},
                 params={"TENDER_ID": tender["id"]}
             ),
         )
+    else:
+        JOURNAL_MESSAGES.inc(DATABRIDGE_SKIP_TENDER)
+
+
+@tracer.traced(
+    "process_tender",
+    lambda session, tender: {"tender_id": tender["id"], "procurementMethodType": tender.get("procurementMethodType")},
+)
+async def process_tender(session: ClientSession, tender: dict) -> None:
+    if not check_tender(tender):
+        log_skip_tender(tender)
         return None
     if tender["procurementMethodType"] == "closeFrameworkAgreementUA":
+        # checked before complete_tender, so a synced tender seen again in the feed isn't fetched
+        version = tender_version(tender)
+        if await synced_index.contains(TENDER_VERSION, version):
+            log_skip_tender(tender, "agreements already synced")
+            return None
+        tender = await complete_tender(tender, session)
+        if tender is None:
+            return None
         if "agreements" not in tender:
             LOGGER.info(
                 "No agreements found in tender {}".format(tender["id"]),
@@ -295,12 +716,36 @@ async def process_tender(session: ClientSession, tender: dict) -> None:
                     params={"TENDER_ID": tender["id"]}
                 )
             )
+            await synced_index.add(TENDER_VERSION, version)
             return None
-        post_results = []
         async for agreement in get_tender_agreements(tender, session):
-            await fill_agreement(agreement, tender, session)
-            post_result = await post_agreement(agreement, session)
-            post_results.append(post_result)
+            fill_agreement(agreement, tender)
+            await schedule_write(
+                OUTBOX_AGREEMENT,
+                agreement["id"],
+                {"tender_id": tender["id"], "dateModified": tender.get("dateModified"), "agreement": agreement},
+                session,
+            )
+        # the version is synced once every active agreement is confirmed in CDB,
+        # agreements that only became active later come with a new dateModified
+        active = [a["id"] for a in tender["agreements"] if a["status"] == "active"]
+        if len(await synced_index.filter_synced(AGREEMENT, active)) == len(set(active)):
+            await synced_index.add(TENDER_VERSION, version)
     elif tender["procurementMethodType"] == "closeFrameworkAgreementSelectionUA":
+        if await synced_index.contains(TENDER, tender["id"]):
+            log_skip_tender(tender, "status already patched")
+            return None
+        tender = await complete_tender(tender, session)
+        if tender is None:
+            return None
         posted_agreements = await check_and_patch_agreements(tender["agreements"], tender["id"], session)
-        await patch_tender(tender, posted_agreements, session)
+        await schedule_write(
+            OUTBOX_TENDER_STATUS,
+            tender["id"],
+            {
+                "tender_id": tender["id"],
+                "dateModified": tender.get("dateModified"),
+                "agreements_exists": posted_agreements,
+            },
+            session,
+        )
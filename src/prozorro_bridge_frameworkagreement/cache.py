@@ -0,0 +1,61 @@
+import asyncio
+from collections import OrderedDict
+from functools import partial
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLCache:
+    """
+    LRU cache with expiring entries.
+    Concurrent `get` calls for a missing key share one in-flight `fetch`,
+    failed fetches are not cached.
+    """
+
+    def __init__(self, ttl: float, size: int) -> None:
+        self.ttl = ttl
+        self.size = size
+        self.data = OrderedDict()
+        self.in_flight = {}
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.in_flight.clear()
+
+    def lookup(self, key: Hashable) -> Any:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires <= monotonic():
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.data[key] = (monotonic() + self.ttl, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.size:
+            self.data.popitem(last=False)
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.lookup(key)
+        if value is not None:
+            return value
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fetch())
+            self.in_flight[key] = future
+            future.add_done_callback(partial(self._on_fetched, key))
+        # shield: a cancelled waiter must not cancel the fetch shared with others
+        return await asyncio.shield(future)
+
+    def _on_fetched(self, key: Hashable, future: asyncio.Future) -> None:
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.set(key, future.result())
@@ -0,0 +1,49 @@
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from typing import Optional
+
+from prozorro_bridge_frameworkagreement.settings import (
+    HTTP_CONNECTIONS_LIMIT,
+    HTTP_CONNECTIONS_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+
+def build_session() -> ClientSession:
+    """
+    Session for bridge calls to the CDB API, separate from the crawler's feed session,
+    so slow writes can't take connections from feed reads and a hung socket fails with a timeout.
+    """
+    connector = TCPConnector(
+        limit=HTTP_CONNECTIONS_LIMIT,
+        limit_per_host=HTTP_CONNECTIONS_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+    )
+    timeout = ClientTimeout(
+        total=HTTP_TIMEOUT,
+        sock_connect=HTTP_CONNECT_TIMEOUT,
+        sock_read=HTTP_READ_TIMEOUT,
+    )
+    return ClientSession(connector=connector, timeout=timeout)
+
+
+session: Optional[ClientSession] = None
+
+
+def get_session() -> ClientSession:
+    # created lazily, a session has to be built inside the running loop
+    global session
+    if session is None or session.closed:
+        session = build_session()
+    return session
+
+
+async def close_session() -> None:
+    global session
+    if session is not None:
+        await session.close()
+        session = None
@@ -0,0 +1,188 @@
+"""
+Production debugging of the event loop, nothing here runs until it's asked for:
+task dumps with tender/agreement ids, slow callback detection (asyncio debug mode)
+and a time-boxed sampling profile of the event loop thread written as collapsed stacks.
+"""
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from time import monotonic, sleep
+from types import FrameType
+from typing import Dict, List, Optional
+
+from prozorro_bridge_frameworkagreement.settings import (
+    LOGGER,
+    DEBUG_SLOW_CALLBACK_DURATION,
+    DEBUG_PROFILE_DIR,
+    DEBUG_PROFILE_MAX_DURATION,
+)
+
+
+# local variables holding the ids of objects a coroutine works on
+ID_LOCALS = {
+    "tender_id": "tender_id",
+    "agreement_id": "agreement_id",
+    "tender": "tender_id",
+    "tender_to_sync": "tender_id",
+    "agreement": "agreement_id",
+}
+
+
+def describe_frame(frame: FrameType) -> str:
+    return f"{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_lineno})"
+
+
+def frame_ids(frames: List[FrameType]) -> Dict[str, str]:
+    ids = {}
+    for frame in frames:
+        for name, key in ID_LOCALS.items():
+            value = frame.f_locals.get(name)
+            if isinstance(value, dict):
+                value = value.get("id")
+            if isinstance(value, str):
+                # the innermost frame is the most specific
+                ids[key] = value
+    return ids
+
+
+def await_frames(task: asyncio.Task, limit: int) -> List[FrameType]:
+    """
+    Frames of the chain of coroutines the task awaits, outermost first.
+    Task.get_stack returns only the task's own coroutine frame
+    """
+    frames = []
+    coro = task.get_coro()
+    while coro is not None and len(frames) < limit:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+def dump_tasks(stack_limit: int = 20) -> dict:
+    tasks = []
+    waiting = Counter()
+    for task in asyncio.all_tasks():
+        frames = await_frames(task, stack_limit)
+        waiting_in = frames[-1].f_code.co_name if frames else None
+        waiting[waiting_in] += 1
+        tasks.append({
+            "name": task.get_name(),
+            "coro": getattr(task.get_coro(), "__qualname__", repr(task.get_coro())),
+            "waiting_in": waiting_in,
+            "ids": frame_ids(frames),
+            "stack": [describe_frame(frame) for frame in frames],
+        })
+    tasks.sort(key=lambda t: t["coro"])
+    return {"count": len(tasks), "waiting_in": dict(waiting.most_common()), "tasks": tasks}
+
+
+def log_tasks() -> None:
+    dump = dump_tasks()
+    LOGGER.warning(f"{dump['count']} tasks, waiting in {dump['waiting_in']}")
+    for task in dump["tasks"]:
+        LOGGER.warning(f"Task {task['name']} {task['coro']} {task['ids']}: " + " <- ".join(reversed(task["stack"])))
+
+
+def set_slow_callbacks(enabled: bool, duration: float = DEBUG_SLOW_CALLBACK_DURATION) -> bool:
+    """
+    asyncio debug mode logs callbacks and task steps that block the loop longer than `duration` seconds,
+    it slows the loop down noticeably, so it's meant to be on only while investigating
+    """
+    loop = asyncio.get_running_loop()
+    loop.slow_callback_duration = duration
+    loop.set_debug(enabled)
+    LOGGER.warning(f"Slow callback detection {'enabled' if enabled else 'disabled'}, threshold {duration} seconds")
+    return enabled
+
+
+def toggle_slow_callbacks() -> bool:
+    return set_slow_callbacks(not asyncio.get_running_loop().get_debug())
+
+
+# shorter intervals would keep the sampler thread spinning and holding the GIL
+MIN_PROFILE_INTERVAL = 0.001
+
+
+class Profiler:
+    """Samples the stack of the event loop thread from a separate thread, one profile at a time"""
+
+    def __init__(self, directory: str, max_duration: float) -> None:
+        self.directory = directory
+        self.max_duration = max_duration
+        self.lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.lock.locked()
+
+    @staticmethod
+    def collapse(frame: Optional[FrameType]) -> str:
+        names = []
+        while frame is not None:
+            names.append(f"{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def sample(self, thread_id: int, duration: float, interval: float) -> Counter:
+        stacks = Counter()
+        deadline = monotonic() + duration
+        while monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[self.collapse(frame)] += 1
+            del frame
+            sleep(max(interval, MIN_PROFILE_INTERVAL))
+        return stacks
+
+    def write(self, stacks: Counter) -> str:
+        path = os.path.join(self.directory, f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.txt")
+        with open(path, "w") as f:
+            # flamegraph.pl / speedscope collapsed format
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def run(self, thread_id: int, duration: float, interval: float) -> str:
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            return self.write(self.sample(thread_id, min(duration, self.max_duration), interval))
+        finally:
+            self.lock.release()
+
+    async def profile(self, duration: float, interval: float = 0.005) -> str:
+        """Profiles the calling event loop for `duration` seconds and returns the path of the profile file"""
+        if self.running:
+            raise RuntimeError("A profile is already running")
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(None, self.run, threading.get_ident(), duration, interval)
+        LOGGER.warning(f"Event loop profile is written to {path}")
+        return path
+
+
+profiler = Profiler(DEBUG_PROFILE_DIR or tempfile.gettempdir(), DEBUG_PROFILE_MAX_DURATION)
+
+signal_handlers_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def install_signal_handlers() -> None:
+    """SIGUSR1 logs all tasks, SIGUSR2 toggles slow callback detection"""
+    global signal_handlers_loop
+    loop = asyncio.get_running_loop()
+    if signal_handlers_loop is loop:
+        return
+    try:
+        loop.add_signal_handler(signal.SIGUSR1, log_tasks)
+        loop.add_signal_handler(signal.SIGUSR2, toggle_slow_callbacks)
+    except (NotImplementedError, RuntimeError, AttributeError) as e:
+        LOGGER.warning(f"Can't install debug signal handlers: {e!r}")
+        return
+    signal_handlers_loop = loop
@@ -9,3 +9,10 @@ DATABRIDGE_RECEIVED_AGREEMENT_DATA = "received_agreement_data"
 DATABRIDGE_PATCH_AGREEMENT_DATA = "patch_agreement_data"
 DATABRIDGE_MISSING_AGREEMENTS = "missing_agreements"
 DATABRIDGE_SKIP_TENDER = "skip_tender"
+DATABRIDGE_TENDER_DEFERRED = "tender_deferred"
+DATABRIDGE_CIRCUIT_OPEN = "circuit_open"
+DATABRIDGE_CIRCUIT_CLOSED = "circuit_closed"
+DATABRIDGE_OUTBOX_DEFERRED = "outbox_deferred"
+DATABRIDGE_AGREEMENT_UP_TO_DATE = "agreement_up_to_date"
+DATABRIDGE_SHARDS_CHANGED = "shards_changed"
+DATABRIDGE_SLA_BREACH = "sla_breach"
@@ -0,0 +1,91 @@
+import asyncio
+from collections import deque
+from time import monotonic
+from typing import Optional
+
+from prozorro_bridge_frameworkagreement.metrics import CONCURRENCY_LIMIT, API_REQUESTS_IN_FLIGHT
+from prozorro_bridge_frameworkagreement.settings import (
+    LIMITER_INITIAL,
+    LIMITER_MIN,
+    LIMITER_MAX,
+    LIMITER_LATENCY_THRESHOLD,
+    LIMITER_BACKOFF,
+)
+
+
+class AIMDLimiter:
+    """
+    Limits API requests in flight and adapts the limit to the API state:
+    a request that was rejected (429, 5xx, connection error) or took longer than `latency_threshold` seconds
+    multiplies the limit by `backoff`, once per congestion event, i.e. only requests started after
+    the previous decrease can cause the next one; a successful request grows the limit by 1 / limit,
+    about one per round trip, while at least half of the limit is in use.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_threshold: float,
+        backoff: float,
+    ) -> None:
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff = backoff
+        self.in_flight = 0
+        self.waiters = deque()
+        self.last_decrease = float("-inf")
+
+    async def acquire(self) -> float:
+        if self.waiters or self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # the slot was already handed over, pass it on
+                    self.in_flight -= 1
+                    self._wake()
+                elif waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                raise
+        else:
+            self.in_flight += 1
+        return monotonic()
+
+    def release(self, start: float, failed: Optional[bool]) -> None:
+        """`failed` is None when the request didn't complete (cancelled), then the limit is kept"""
+        now = monotonic()
+        if failed is None:
+            pass
+        elif failed or now - start > self.latency_threshold:
+            if start >= self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = now
+        elif self.in_flight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+limiter = AIMDLimiter(
+    LIMITER_INITIAL,
+    min_limit=LIMITER_MIN,
+    max_limit=LIMITER_MAX,
+    latency_threshold=LIMITER_LATENCY_THRESHOLD,
+    backoff=LIMITER_BACKOFF,
+)
+
+CONCURRENCY_LIMIT.set_function(lambda: {(): int(limiter.limit)})
+API_REQUESTS_IN_FLIGHT.set_function(lambda: {(): limiter.in_flight})
@@ -0,0 +1,118 @@
+import copy
+import logging
+import queue
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from prozorro_bridge_frameworkagreement.serializers import dumps
+from prozorro_bridge_frameworkagreement.settings import (
+    LOGGER,
+    JOURNAL_PREFIX,
+    LOG_FORMAT,
+    LOG_SAMPLING,
+    LOG_ASYNC,
+    LOG_QUEUE_SIZE,
+)
+
+
+def parse_sampling(value: str) -> Dict[str, int]:
+    """'skip_tender=100,skip_agreement=10' -> keep every 100th skip_tender and every 10th skip_agreement"""
+    rates = {}
+    for pair in value.split(","):
+        if pair.strip():
+            message_id, every = pair.split("=")
+            rates[message_id.strip()] = int(every)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Passes every n-th record of the configured MESSAGE_IDs, other records pass as is"""
+
+    def __init__(self, rates: Dict[str, int]) -> None:
+        super().__init__()
+        self.rates = rates
+        self.seen = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message_id = getattr(record, "MESSAGE_ID", None)
+        every = self.rates.get(message_id)
+        if not every or every <= 1:
+            return True
+        self.seen[message_id] += 1
+        return self.seen[message_id] % every == 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record with the journal fields as top level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key == "MESSAGE_ID" or key.startswith(JOURNAL_PREFIX):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return dumps(data).decode()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Never blocks the event loop: records that don't fit into the queue are counted and dropped"""
+
+    def __init__(self, records: queue.Queue) -> None:
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # unlike QueueHandler.prepare keeps the exception apart from the message, formatting is left to handlers
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+listener: Optional[QueueListener] = None
+
+
+def setup_logging(logger: logging.Logger = LOGGER) -> None:
+    global listener
+    if LOG_SAMPLING:
+        logger.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+    # the crawler may configure handlers either on its logger or on the root one
+    owner = logger if logger.handlers else logging.getLogger()
+    handlers = list(owner.handlers)
+    if LOG_FORMAT == "json":
+        for handler in handlers:
+            handler.setFormatter(JsonFormatter())
+    if LOG_ASYNC and handlers and listener is None:
+        # handlers write to stdout from a separate thread
+        for handler in handlers:
+            owner.removeHandler(handler)
+        owner.addHandler(DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE)))
+        listener = QueueListener(owner.handlers[0].queue, *handlers, respect_handler_level=True)
+        listener.start()
+
+
+def stop_logging() -> None:
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -1,26 +1,107 @@
 from aiohttp import ClientSession
-import asyncio
+from functools import partial
 from prozorro_crawler.main import main
 
-from prozorro_bridge_frameworkagreement.bridge import process_tender
+from prozorro_bridge_frameworkagreement.breaker import wait_closed
+from prozorro_bridge_frameworkagreement.bridge import process_tender, outbox, mirror, send_outbox_item
+from prozorro_bridge_frameworkagreement.client import get_session
+from prozorro_bridge_frameworkagreement.debug import install_signal_handlers
+from prozorro_bridge_frameworkagreement.logs import setup_logging
+from prozorro_bridge_frameworkagreement.metrics import (
+    QUEUE_DEPTH,
+    QUEUE_MEMORY,
+    DEFERRED_TENDERS,
+    FEED_ITEMS,
+    MIRROR_AGREEMENTS,
+    MIRROR_LAG,
+)
+from prozorro_bridge_frameworkagreement.scheduler import WorkerPool
+from prozorro_bridge_frameworkagreement.server import start_server
+from prozorro_bridge_frameworkagreement.sharding import build_shards
+from prozorro_bridge_frameworkagreement.sla import observe_feed_page
+from prozorro_bridge_frameworkagreement.storage import DeferredStore, get_collection
+from prozorro_bridge_frameworkagreement.settings import (
+    WORKERS_COUNT,
+    QUEUE_SIZE,
+    QUEUE_MEMORY_BUDGET,
+    DEFERRED_RETRY_INTERVAL,
+    DEFERRED_PERSISTENT,
+    DEFERRED_COLLECTION,
+    OUTBOX_ENABLED,
+    MIRROR_ENABLED,
+    METRICS_ENABLED,
+    FETCH_HEAVY_FIELDS_ON_DEMAND,
+)
+from prozorro_bridge_frameworkagreement.utils import check_tender, project_tender
 
 
 API_OPT_FIELDS = (
     "status",
     "procurementMethodType",
     "lots",
+)
+# needed only for tenders that pass check_tender, process_tender fetches them if missing
+HEAVY_OPT_FIELDS = (
     "agreements",
     "procuringEntity",
     "mode",
 )
+if not FETCH_HEAVY_FIELDS_ON_DEMAND:
+    API_OPT_FIELDS += HEAVY_OPT_FIELDS
+
+shards = build_shards()
+worker_pool = WorkerPool(
+    process_tender,
+    WORKERS_COUNT,
+    QUEUE_SIZE,
+    DEFERRED_RETRY_INTERVAL,
+    memory_budget=QUEUE_MEMORY_BUDGET * 1024 * 1024,
+    store=DeferredStore(partial(get_collection, DEFERRED_COLLECTION)) if DEFERRED_PERSISTENT else None,
+)
+
+QUEUE_DEPTH.set_function(lambda: {(): worker_pool.queue.qsize() if worker_pool.started else 0})
+DEFERRED_TENDERS.set_function(lambda: {(): worker_pool.deferred})
+QUEUE_MEMORY.set_function(lambda: {(): worker_pool.held_bytes})
+MIRROR_AGREEMENTS.set_function(lambda: {(): len(mirror.agreements)})
+MIRROR_LAG.set_function(lambda: {(): mirror.lag if mirror.synced_at is not None else -1})
+
 
 async def data_handler(session: ClientSession, items: list) -> None:
-    process_items_tasks = []
+    if METRICS_ENABLED:
+        await start_server()
+    install_signal_handlers()
+    # the crawler's session is left for feed reads, bridge calls use their own connection pool
+    bridge_session = get_session()
+    worker_pool.start(bridge_session)
+    if OUTBOX_ENABLED:
+        outbox.start(bridge_session, send_outbox_item)
+    if MIRROR_ENABLED:
+        mirror.start(bridge_session)
+    if shards is not None:
+        await shards.start()
+        await shards.wait_ready()
+    # don't let the crawler move on while the API is failing, these items couldn't be processed anyway
+    await wait_closed()
+    observe_feed_page(items)
+    not_owned = 0
+    queued = []
     for item in items:
-        coroutine = process_tender(session, item)
-        process_items_tasks.append(coroutine)
-    await asyncio.gather(*process_items_tasks)
+        # most of the feed are other procedures, drop them before they take a queue slot
+        if not check_tender(item):
+            continue
+        if shards is not None and not shards.owns(item["id"]):
+            not_owned += 1
+            continue
+        # the crawler page with full items is released as soon as the handler returns
+        await worker_pool.put(project_tender(item))
+        queued.append(item["id"])
+    FEED_ITEMS.inc("queued", amount=len(queued))
+    FEED_ITEMS.inc("not_owned", amount=not_owned)
+    FEED_ITEMS.inc("skipped", amount=len(items) - len(queued) - not_owned)
+    # the crawler saves the feed offset after the handler returns, queued tenders would be lost on restart
+    await worker_pool.wait_processed(queued)
 
 
 if __name__ == "__main__":
+    setup_logging()
     main(data_handler, opt_fields=API_OPT_FIELDS)
@@ -0,0 +1,219 @@
+import asyncio
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 3 * 3600, 6 * 3600, 24 * 3600)
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return self.header() + self.samples()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        if not labelnames:
+            self.values[()] = 0
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] += amount
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] -= amount
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """`function` is called on every scrape and returns values by label tuples"""
+        self.function = function
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            self.values = defaultdict(float, self.function())
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self.counts: Dict[Tuple[str, ...], List[int]] = {}
+        self.sums: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labels)
+
+    def timed(self, *labels: str) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.time(*labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(*labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {self.sums[labels]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+JOURNAL_MESSAGES = REGISTRY.register(Counter(
+    "bridge_journal_messages_total", "Journal messages by MESSAGE_ID", ("message_id",)
+))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "bridge_stage_duration_seconds", "Duration of bridge stages, including retries", ("stage",)
+))
+FEED_ITEMS = REGISTRY.register(Counter(
+    "bridge_feed_items_total", "Feed items by pre-filter result", ("result",)
+))
+FEED_LAG = REGISTRY.register(Gauge(
+    "bridge_feed_lag_seconds", "Age of the newest item of the last crawler page"
+))
+FEED_LAG_HISTOGRAM = REGISTRY.register(Histogram(
+    "bridge_feed_page_lag_seconds", "Age of the newest item of crawler pages", buckets=LAG_BUCKETS
+))
+TENDER_LATENCY = REGISTRY.register(Histogram(
+    "bridge_tender_latency_seconds", "Time from tender dateModified to its POST or PATCH", ("stage",),
+    buckets=LAG_BUCKETS,
+))
+TENDERS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bridge_tenders_in_flight", "Tenders being processed by workers"
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bridge_queue_depth", "Tenders waiting in the worker queue"
+))
+QUEUE_MEMORY = REGISTRY.register(Gauge(
+    "bridge_queue_memory_bytes", "Serialized size of tenders held by the worker pool, with QUEUE_MEMORY_BUDGET set"
+))
+COALESCED_TENDERS = REGISTRY.register(Counter(
+    "bridge_coalesced_tenders_total", "Feed items merged into a queued or running copy of the same tender"
+))
+DEFERRED_TENDERS = REGISTRY.register(Gauge(
+    "bridge_deferred_tenders", "Tenders parked after exhausting retries"
+))
+RETRIES = REGISTRY.register(Counter(
+    "bridge_retries_total", "Retries of API calls"
+))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "bridge_circuit_state", "Circuit breaker state: 0 closed, 1 half open, 2 open", ("endpoint",)
+))
+CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    "bridge_concurrency_limit", "Adaptive limit of API requests in flight"
+))
+API_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bridge_api_requests_in_flight", "API requests in flight"
+))
+MIRROR_AGREEMENTS = REGISTRY.register(Gauge(
+    "bridge_mirror_agreements", "Agreements known to the agreements feed mirror"
+))
+MIRROR_LAG = REGISTRY.register(Gauge(
+    "bridge_mirror_lag_seconds", "Seconds since the agreements feed mirror reached the end of the feed, -1 before"
+))
+MIRROR_LOOKUPS = REGISTRY.register(Counter(
+    "bridge_mirror_lookups_total", "Agreement probes by agreements feed mirror result", ("result",)
+))
@@ -0,0 +1,134 @@
+from aiohttp import ClientSession
+import asyncio
+import os
+from time import monotonic
+from typing import Dict, Mapping, Optional
+
+from prozorro_bridge_frameworkagreement.serializers import loads, dumps
+from prozorro_bridge_frameworkagreement.settings import LOGGER
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_EXCEPTION
+
+
+class AgreementsMirror:
+    """
+    Follows the agreements feed and keeps ids and dateModified of all agreements it has seen,
+    so existence probes of known agreements are answered without a request.
+    The feed is read from the start and then polled from the last offset every `poll_interval` seconds.
+    With `path` the mirror is saved to disk every `save_interval` seconds and on stop, and loaded on start.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: Mapping[str, str],
+        page_limit: int,
+        poll_interval: float,
+        save_interval: float,
+        path: Optional[str] = None,
+    ) -> None:
+        self.url = url
+        self.headers = headers
+        self.page_limit = page_limit
+        self.poll_interval = poll_interval
+        self.save_interval = save_interval
+        self.path = path
+        self.agreements: Dict[str, str] = {}
+        self.offset: Optional[str] = None
+        self.synced_at: Optional[float] = None
+        self.ready: Optional[asyncio.Event] = None
+        self.task = None
+
+    def __contains__(self, agreement_id: str) -> bool:
+        return agreement_id in self.agreements
+
+    @property
+    def lag(self) -> float:
+        """Seconds since the end of the feed was last reached"""
+        if self.synced_at is None:
+            return float("inf")
+        return monotonic() - self.synced_at
+
+    def start(self, session: ClientSession) -> None:
+        if self.task is None:
+            self.ready = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run(session))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+            if self.path:
+                await self.save()
+
+    async def run(self, session: ClientSession) -> None:
+        if self.path:
+            await self.load()
+        saved_at = monotonic()
+        while True:
+            try:
+                count = await self.fetch_page(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOGGER.warning(
+                    f"Failed to read agreements feed: {e!r}",
+                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+                )
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if self.path and monotonic() - saved_at >= self.save_interval:
+                await self.save()
+                saved_at = monotonic()
+            if count < self.page_limit:
+                self.synced_at = monotonic()
+                if not self.ready.is_set():
+                    LOGGER.info(f"Agreements mirror is up to date with {len(self.agreements)} agreements")
+                    self.ready.set()
+                await asyncio.sleep(self.poll_interval)
+
+    async def fetch_page(self, session: ClientSession) -> int:
+        params = {"feed": "changes", "limit": self.page_limit}
+        if self.offset:
+            params["offset"] = self.offset
+        async with session.get(self.url, params=params, headers=self.headers) as response:
+            if response.status != 200:
+                raise ConnectionError(f"Unexpected status {response.status} {await response.text()}")
+            page = loads(await response.read())
+        for item in page["data"]:
+            self.agreements[item["id"]] = item["dateModified"]
+        if page["data"]:
+            self.offset = page["next_page"]["offset"]
+        return len(page["data"])
+
+    async def save(self) -> None:
+        snapshot = {"offset": self.offset, "agreements": dict(self.agreements)}
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, snapshot)
+        except OSError as e:
+            LOGGER.warning(f"Can't save agreements mirror to {self.path}: {e}")
+
+    async def load(self) -> None:
+        try:
+            snapshot = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"Can't load agreements mirror from {self.path}, reading the feed from the start: {e}")
+            return
+        self.offset = snapshot["offset"]
+        self.agreements = snapshot["agreements"]
+        LOGGER.info(f"Loaded {len(self.agreements)} agreements from {self.path}")
+
+    def _write(self, snapshot: dict) -> None:
+        # written aside and renamed, so a crash never leaves a truncated file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dumps(snapshot))
+        os.replace(tmp_path, self.path)
+
+    def _read(self) -> dict:
+        with open(self.path, "rb") as f:
+            return loads(f.read())
+
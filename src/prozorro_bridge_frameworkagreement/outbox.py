@@ -0,0 +1,188 @@
+from aiohttp import ClientSession
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from prozorro_bridge_frameworkagreement.settings import LOGGER
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_EXCEPTION, DATABRIDGE_OUTBOX_DEFERRED
+
+
+Sender = Callable[[str, dict, ClientSession], Awaitable[None]]
+
+
+class Outbox:
+    """
+    Durable queue of pending CDB writes stored in MongoDB.
+    Items are keyed by kind and object id, so putting the same agreement again replaces the pending item.
+    A single sender task claims due items and keeps up to `concurrency` of them sending at a time,
+    a slot freed by one item is taken by the next due item without waiting for the others.
+    A claimed item is leased for `lease_interval` seconds, so it isn't read again while it's being sent
+    and becomes due again if the process dies before it's sent.
+    Sent items are removed, failed items are retried after `retry_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        get_collection: Callable[[], AsyncIOMotorCollection],
+        batch_size: int,
+        concurrency: int,
+        poll_interval: float,
+        retry_interval: float,
+        lease_interval: float,
+    ) -> None:
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.lease_interval = lease_interval
+        self.collection = None
+        self.task = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.sending: Dict[str, asyncio.Task] = {}
+
+    async def _get_collection(self) -> AsyncIOMotorCollection:
+        if self.collection is None:
+            collection = self.get_collection()
+            await collection.create_index([("nextTry", ASCENDING)])
+            self.collection = collection
+        return self.collection
+
+    async def put(self, kind: str, key: str, payload: dict) -> None:
+        collection = await self._get_collection()
+        now = datetime.utcnow()
+        await collection.replace_one(
+            {"_id": f"{kind}:{key}"},
+            {"kind": kind, "payload": payload, "dateCreated": now, "nextTry": now, "attempts": 0},
+            upsert=True,
+        )
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def start(self, session: ClientSession, sender: Sender) -> None:
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run(session, sender))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self, session: ClientSession, sender: Sender) -> None:
+        try:
+            while True:
+                # cleared before claiming, so a slot freed or an item put meanwhile isn't missed
+                self.wakeup.clear()
+                free = self.concurrency - len(self.sending)
+                claimed = []
+                if free > 0:
+                    try:
+                        claimed = await self.claim(min(free, self.batch_size))
+                    except PyMongoError as e:
+                        LOGGER.warning(
+                            f"Outbox storage error: {e}",
+                            extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+                        )
+                for item in claimed:
+                    self.start_sending(item, session, sender)
+                if not claimed or len(self.sending) >= self.concurrency:
+                    await self.wait_for_wakeup()
+        finally:
+            tasks = list(self.sending.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def wait_for_wakeup(self) -> None:
+        # not asyncio.wait_for: before python 3.12 it swallows the cancellation of stop()
+        # when the event is set at the same moment, e.g. by a finishing send
+        waiter = asyncio.ensure_future(self.wakeup.wait())
+        try:
+            await asyncio.wait([waiter], timeout=self.poll_interval)
+        finally:
+            waiter.cancel()
+
+    def start_sending(self, item: dict, session: ClientSession, sender: Sender) -> None:
+        task = asyncio.ensure_future(self.send(self.collection, item, session, sender))
+        self.sending[item["_id"]] = task
+
+        def done(_) -> None:
+            self.sending.pop(item["_id"], None)
+            self.wakeup.set()
+
+        task.add_done_callback(done)
+
+    async def claim(self, limit: int) -> List[dict]:
+        collection = await self._get_collection()
+        now = datetime.utcnow()
+        cursor = collection.find(
+            {"nextTry": {"$lte": now}, "_id": {"$nin": list(self.sending)}}
+        ).sort("nextTry", ASCENDING)
+        items = await cursor.limit(limit).to_list(length=limit)
+        leased_until = now + timedelta(seconds=self.lease_interval)
+        claimed = []
+        for item in items:
+            # matches only if no other sender has claimed or replaced the item since it was read
+            result = await collection.update_one(
+                {"_id": item["_id"], "dateCreated": item["dateCreated"], "nextTry": item["nextTry"]},
+                {"$set": {"nextTry": leased_until}},
+            )
+            if result.modified_count:
+                item["leasedUntil"] = leased_until
+                claimed.append(item)
+        return claimed
+
+    async def send(
+        self,
+        collection: AsyncIOMotorCollection,
+        item: dict,
+        session: ClientSession,
+        sender: Sender,
+    ) -> None:
+        try:
+            await sender(item["kind"], item["payload"], session)
+        except asyncio.CancelledError:
+            # stopped, the item is due again on start instead of after the lease
+            await self.settle(
+                collection.update_one(
+                    {"_id": item["_id"], "dateCreated": item["dateCreated"], "nextTry": item["leasedUntil"]},
+                    {"$set": {"nextTry": item["nextTry"]}},
+                ),
+                item,
+            )
+            raise
+        except Exception as e:
+            LOGGER.warning(
+                f"Failed to send outbox item {item['_id']}, retrying in {self.retry_interval} seconds: {e}",
+                extra=journal_context({"MESSAGE_ID": DATABRIDGE_OUTBOX_DEFERRED}),
+            )
+            await self.settle(
+                collection.update_one(
+                    {"_id": item["_id"], "dateCreated": item["dateCreated"]},
+                    {
+                        "$set": {"nextTry": datetime.utcnow() + timedelta(seconds=self.retry_interval)},
+                        "$inc": {"attempts": 1},
+                    },
+                ),
+                item,
+            )
+            return
+        # an item replaced while it was being sent stays in the outbox
+        await self.settle(collection.delete_one({"_id": item["_id"], "dateCreated": item["dateCreated"]}), item)
+
+    async def settle(self, operation: Awaitable, item: dict) -> None:
+        try:
+            await operation
+        except PyMongoError as e:
+            # the lease makes the item due again after lease_interval
+            LOGGER.warning(
+                f"Outbox storage error on {item['_id']}: {e}",
+                extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+            )
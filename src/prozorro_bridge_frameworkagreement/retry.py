@@ -0,0 +1,110 @@
+from aiohttp import ClientResponse
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from typing import Optional
+
+from prozorro_bridge_frameworkagreement.metrics import RETRIES
+from prozorro_bridge_frameworkagreement.tracing import add_event
+from prozorro_bridge_frameworkagreement.settings import (
+    ERROR_INTERVAL,
+    RETRY_MAX_INTERVAL,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BUDGET_RATE,
+    RETRY_BUDGET_BURST,
+)
+
+
+RETRY_AFTER_STATUSES = (429, 503)
+
+
+class RetryExhausted(Exception):
+    pass
+
+
+class RetryBudget:
+    """
+    Token bucket shared by all retry loops.
+    Each retry takes a token, so during an API incident the process as a whole
+    retries at most `rate` times per second after the `burst` is spent.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = monotonic()
+
+    def acquire(self) -> bool:
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RetryPolicy:
+    def __init__(self, base: float, cap: float, max_attempts: int, budget: RetryBudget) -> None:
+        self.base = base
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self.budget = budget
+
+    def backoff(self, attempt: int) -> float:
+        # exponential backoff with "equal jitter", so retries of concurrent calls don't line up
+        delay = min(self.cap, self.base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def start(self) -> "Retry":
+        return Retry(self)
+
+
+class Retry:
+    """Retry state of a single call"""
+
+    def __init__(self, policy: RetryPolicy) -> None:
+        self.policy = policy
+        self.attempt = 0
+
+    async def wait(self, response: Optional[ClientResponse] = None) -> None:
+        if self.policy.max_attempts and self.attempt >= self.policy.max_attempts:
+            raise RetryExhausted(f"Gave up after {self.attempt} retries")
+        if not self.policy.budget.acquire():
+            raise RetryExhausted("Global retry budget is exhausted")
+        delay = self.policy.backoff(self.attempt)
+        retry_after = get_retry_after(response)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.policy.cap))
+        self.attempt += 1
+        RETRIES.inc()
+        add_event("retry", attempt=self.attempt, delay=delay, status=response.status if response else None)
+        await asyncio.sleep(delay)
+
+
+def get_retry_after(response: Optional[ClientResponse]) -> Optional[float]:
+    if response is None or response.status not in RETRY_AFTER_STATUSES:
+        return None
+    value = response.headers.get("Retry-After")
+    if not isinstance(value, str):
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+retry_policy = RetryPolicy(
+    base=ERROR_INTERVAL,
+    cap=RETRY_MAX_INTERVAL,
+    max_attempts=RETRY_MAX_ATTEMPTS,
+    budget=RetryBudget(RETRY_BUDGET_RATE, RETRY_BUDGET_BURST),
+)
@@ -0,0 +1,299 @@
+from aiohttp import ClientSession
+import asyncio
+from datetime import datetime, timedelta
+import itertools
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from prozorro_bridge_frameworkagreement.metrics import TENDERS_IN_FLIGHT, COALESCED_TENDERS
+from prozorro_bridge_frameworkagreement.retry import RetryExhausted
+from prozorro_bridge_frameworkagreement.serializers import dumps
+from prozorro_bridge_frameworkagreement.settings import LOGGER
+from prozorro_bridge_frameworkagreement.storage import DeferredStore
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_EXCEPTION, DATABRIDGE_TENDER_DEFERRED
+
+
+SELECTION_PRIORITY = 0
+DEFAULT_PRIORITY = 1
+
+
+def get_priority(tender: dict) -> int:
+    # selection tenders wait in draft.pending until the bridge patches them, so they go first
+    if tender.get("procurementMethodType", "") == "closeFrameworkAgreementSelectionUA":
+        return SELECTION_PRIORITY
+    return DEFAULT_PRIORITY
+
+
+def is_newer(tender: dict, other: dict) -> bool:
+    return tender.get("dateModified", "") > other.get("dateModified", "")
+
+
+class WorkerPool:
+    """
+    Fixed number of workers consuming tenders from a bounded priority queue.
+    The queue is shared by the crawlers (forward and backward feeds), so one page is processed while the other
+    is fetched, and a full queue blocks the crawler instead of spawning more coroutines.
+    `wait_processed` lets the crawler wait for its page, so the feed offset never passes a queued tender.
+    Tenders that exhausted their retries are put back to the queue after `defer_interval` seconds,
+    with `store` they are also kept in MongoDB until processed and restored when the pool starts.
+
+    A tender is processed by one worker at a time: a copy arriving while the tender waits in the queue
+    replaces the waiting item if it's newer, a newer copy arriving while it's processed
+    is processed by the same worker right after.
+
+    With `memory_budget` (bytes of serialized tenders) new tenders also wait while the tenders held by the pool
+    (queued, processed or deferred) take the whole budget, so a page of big tenders can't pile up in memory.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[ClientSession, dict], Awaitable[None]],
+        workers_count: int,
+        queue_size: int,
+        defer_interval: float = 0,
+        memory_budget: int = 0,
+        store: Optional[DeferredStore] = None,
+    ) -> None:
+        self.handler = handler
+        self.workers_count = workers_count
+        self.queue_size = queue_size
+        self.defer_interval = defer_interval
+        self.memory_budget = memory_budget
+        self.store = store
+        self.held_bytes = 0
+        self.sizes: Dict[int, int] = {}
+        self.memory_freed: Optional[asyncio.Event] = None
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.workers = []
+        self.counter = itertools.count()
+        self.pending: Dict[str, dict] = {}
+        self.running: Dict[str, dict] = {}
+        self.rerun: Dict[str, dict] = {}
+        self.waiters: Dict[str, List[asyncio.Future]] = {}
+        # one copy per deferred tender, its timer requeues the newest one
+        self.deferred_tenders: Dict[str, dict] = {}
+        self.stored: Set[str] = set()
+        self.restoring: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self.queue is not None
+
+    @property
+    def deferred(self) -> int:
+        return len(self.deferred_tenders)
+
+    def start(self, session: ClientSession) -> None:
+        if self.started:
+            return
+        self.queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        self.memory_freed = asyncio.Event()
+        self.workers = [
+            asyncio.ensure_future(self.worker(session))
+            for _ in range(self.workers_count)
+        ]
+        if self.store is not None:
+            self.restoring = asyncio.ensure_future(self.restore())
+
+    async def stop(self) -> None:
+        if self.restoring is not None:
+            self.restoring.cancel()
+            await asyncio.gather(self.restoring, return_exceptions=True)
+            self.restoring = None
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        if self.deferred_tenders:
+            LOGGER.warning(
+                f"Stopping with {self.deferred} deferred tenders "
+                f"({'kept in the store' if self.store is not None else 'not stored'}): "
+                f"{', '.join(self.deferred_tenders)}",
+                extra=journal_context({"MESSAGE_ID": DATABRIDGE_TENDER_DEFERRED}),
+            )
+        for waiters in self.waiters.values():
+            for waiter in waiters:
+                waiter.cancel()
+        self.waiters.clear()
+        self.workers = []
+        self.queue = None
+        self.deferred_tenders.clear()
+        self.stored.clear()
+        self.pending.clear()
+        self.running.clear()
+        self.rerun.clear()
+        self.sizes.clear()
+        self.held_bytes = 0
+
+    def _entry(self, tender: dict) -> tuple:
+        # counter keeps FIFO order inside a priority, the tender itself is taken from pending,
+        # so a copy replaced there isn't kept alive by the queue
+        return get_priority(tender), next(self.counter), tender["id"]
+
+    def _hold(self, tender: dict) -> None:
+        if self.memory_budget:
+            size = len(dumps(tender))
+            self.sizes[id(tender)] = size
+            self.held_bytes += size
+
+    def _release(self, tender: Optional[dict]) -> None:
+        if tender is not None and id(tender) in self.sizes:
+            self.held_bytes -= self.sizes.pop(id(tender))
+            self.memory_freed.set()
+
+    async def _wait_for_memory(self) -> None:
+        while self.held_bytes >= self.memory_budget:
+            self.memory_freed.clear()
+            await self.memory_freed.wait()
+
+    def _coalesce(self, tender: dict) -> bool:
+        tender_id = tender["id"]
+        if tender_id in self.pending:
+            if not is_newer(self.pending[tender_id], tender):
+                self._release(self.pending[tender_id])
+                self._hold(tender)
+                self.pending[tender_id] = tender
+        elif tender_id in self.running:
+            if is_newer(tender, self.rerun.get(tender_id, self.running[tender_id])):
+                self._release(self.rerun.get(tender_id))
+                self._hold(tender)
+                self.rerun[tender_id] = tender
+        else:
+            return False
+        COALESCED_TENDERS.inc()
+        return True
+
+    async def put(self, tender: dict) -> None:
+        if self._coalesce(tender):
+            return
+        if self.memory_budget:
+            await self._wait_for_memory()
+            # the tender could arrive from another put while waiting
+            if self._coalesce(tender):
+                return
+        self._hold(tender)
+        self.pending[tender["id"]] = tender
+        await self.queue.put(self._entry(tender))
+
+    async def defer(self, tender: dict) -> None:
+        self._park(tender, self.defer_interval)
+        if self.store is not None:
+            next_try = datetime.utcnow() + timedelta(seconds=self.defer_interval)
+            await self.store.add(self.deferred_tenders[tender["id"]], next_try)
+            self.stored.add(tender["id"])
+
+    async def restore(self) -> None:
+        now = datetime.utcnow()
+        docs = await self.store.load()
+        for doc in docs:
+            self.stored.add(doc["_id"])
+            self._hold(doc["tender"])
+            self._park(doc["tender"], max((doc["nextTry"] - now).total_seconds(), 0))
+        if docs:
+            LOGGER.info(
+                f"Restored {len(docs)} deferred tenders",
+                extra=journal_context({"MESSAGE_ID": DATABRIDGE_TENDER_DEFERRED}),
+            )
+
+    def _park(self, tender: dict, delay: float) -> None:
+        tender_id = tender["id"]
+        parked = self.deferred_tenders.get(tender_id)
+        if parked is None:
+            self.deferred_tenders[tender_id] = tender
+            asyncio.get_running_loop().call_later(delay, self._requeue, tender_id)
+        elif is_newer(parked, tender):
+            self._release(tender)
+        else:
+            self._release(parked)
+            self.deferred_tenders[tender_id] = tender
+
+    def _requeue(self, tender_id: str) -> None:
+        tender = self.deferred_tenders.get(tender_id)
+        if self.queue is None or tender is None:
+            return
+        # held again if it's queued, a copy that replaces the queued one is held by _coalesce
+        self._release(tender)
+        if self._coalesce(tender):
+            del self.deferred_tenders[tender_id]
+            return
+        self._hold(tender)
+        try:
+            self.queue.put_nowait(self._entry(tender))
+        except asyncio.QueueFull:
+            asyncio.get_running_loop().call_later(self.defer_interval, self._requeue, tender_id)
+        else:
+            self.pending[tender_id] = tender
+            del self.deferred_tenders[tender_id]
+
+    async def _forget(self, tender_id: str) -> None:
+        # the stored copy is kept while another copy of the tender is still deferred
+        if tender_id in self.stored and tender_id not in self.deferred_tenders:
+            self.stored.discard(tender_id)
+            await self.store.remove(tender_id)
+
+    async def join(self) -> None:
+        await self.queue.join()
+
+    async def wait_processed(self, tender_ids: Iterable[str]) -> None:
+        """
+        Waits until the tenders with the given ids are neither queued nor processed,
+        copies that replaced them are waited for too, deferred tenders count as processed
+        """
+        loop = asyncio.get_running_loop()
+        waiters = []
+        for tender_id in set(tender_ids):
+            if tender_id in self.pending or tender_id in self.running:
+                waiter = loop.create_future()
+                self.waiters.setdefault(tender_id, []).append(waiter)
+                waiters.append(waiter)
+        if waiters:
+            await asyncio.gather(*waiters)
+
+    def _notify(self, tender_id: str) -> None:
+        for waiter in self.waiters.pop(tender_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def worker(self, session: ClientSession) -> None:
+        while True:
+            _, _, tender_id = await self.queue.get()
+            tender = self.pending.pop(tender_id)
+            TENDERS_IN_FLIGHT.inc()
+            try:
+                while tender is not None:
+                    self.running[tender_id] = tender
+                    await self.process(session, tender)
+                    tender = self.rerun.pop(tender_id, None)
+            finally:
+                self.running.pop(tender_id, None)
+                self.rerun.pop(tender_id, None)
+                self._notify(tender_id)
+                TENDERS_IN_FLIGHT.dec()
+                self.queue.task_done()
+
+    async def process(self, session: ClientSession, tender: dict) -> None:
+        try:
+            await self.handler(session, tender)
+        except asyncio.CancelledError:
+            raise
+        except RetryExhausted as e:
+            LOGGER.warning(
+                f"Deferring tender {tender.get('id')} for {self.defer_interval} seconds: {e}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_TENDER_DEFERRED},
+                    params={"TENDER_ID": tender.get("id")}
+                )
+            )
+            # stays held until it's back in the queue
+            await self.defer(tender)
+            return
+        except Exception as e:
+            LOGGER.error(
+                f"Failed to process tender {tender.get('id')}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_EXCEPTION},
+                    params={"TENDER_ID": tender.get("id")}
+                )
+            )
+            LOGGER.exception(e)
+        self._release(tender)
+        await self._forget(tender["id"])
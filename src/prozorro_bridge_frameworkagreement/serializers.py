@@ -0,0 +1,40 @@
+import json
+from typing import Any, Callable, Dict, NamedTuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from prozorro_bridge_frameworkagreement.settings import JSON_BACKEND
+
+
+class Serializer(NamedTuple):
+    name: str
+    loads: Callable[[Union[bytes, str]], Any]
+    dumps: Callable[[Any], bytes]
+
+
+def stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+# both decode straight from response bytes, without an intermediate str
+SERIALIZERS: Dict[str, Serializer] = {
+    "json": Serializer("json", json.loads, stdlib_dumps),
+}
+if orjson is not None:
+    SERIALIZERS["orjson"] = Serializer("orjson", orjson.loads, orjson.dumps)
+
+
+def get_serializer(name: str = "auto") -> Serializer:
+    if name == "auto":
+        return SERIALIZERS.get("orjson", SERIALIZERS["json"])
+    if name not in SERIALIZERS:
+        raise ValueError(f"JSON backend {name} is not available, choose from {', '.join(SERIALIZERS)}")
+    return SERIALIZERS[name]
+
+
+serializer = get_serializer(JSON_BACKEND)
+loads = serializer.loads
+dumps = serializer.dumps
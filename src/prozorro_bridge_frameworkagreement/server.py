@@ -0,0 +1,103 @@
+from aiohttp import web
+import asyncio
+import hmac
+from typing import Optional
+
+from prozorro_bridge_frameworkagreement.debug import dump_tasks, set_slow_callbacks, profiler, MIN_PROFILE_INTERVAL
+from prozorro_bridge_frameworkagreement.metrics import REGISTRY
+from prozorro_bridge_frameworkagreement.serializers import dumps
+from prozorro_bridge_frameworkagreement.settings import (
+    LOGGER,
+    METRICS_HOST,
+    METRICS_PORT,
+    DEBUG_ENDPOINTS_ENABLED,
+    DEBUG_TOKEN,
+    DEBUG_SLOW_CALLBACK_DURATION,
+)
+
+
+runner: Optional[web.AppRunner] = None
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(
+        body=REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+def json_response(data: dict, status: int = 200) -> web.Response:
+    return web.Response(body=dumps(data), status=status, content_type="application/json")
+
+
+def float_param(request: web.Request, name: str, default: float, minimum: float = 0) -> float:
+    try:
+        value = float(request.query.get(name, default))
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be a number")
+    if not value >= minimum:
+        raise web.HTTPBadRequest(text=f"{name} must be at least {minimum}")
+    return value
+
+
+@web.middleware
+async def debug_auth(request: web.Request, handler) -> web.StreamResponse:
+    if request.path.startswith("/debug/") and not hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {DEBUG_TOKEN}".encode()
+    ):
+        raise web.HTTPUnauthorized()
+    return await handler(request)
+
+
+async def tasks_view(request: web.Request) -> web.Response:
+    return json_response(dump_tasks())
+
+
+async def slow_callbacks_view(request: web.Request) -> web.Response:
+    """?enabled=true|false&duration=seconds, toggles the detection without enabled"""
+    duration = float_param(request, "duration", DEBUG_SLOW_CALLBACK_DURATION)
+    enabled = request.query.get("enabled")
+    if enabled is None:
+        enabled = not asyncio.get_running_loop().get_debug()
+    else:
+        enabled = enabled.lower() == "true"
+    set_slow_callbacks(enabled, duration)
+    return json_response({"enabled": enabled, "duration": duration})
+
+
+async def profile_view(request: web.Request) -> web.Response:
+    """?duration=seconds&interval=seconds, responds when the profile is written"""
+    duration = float_param(request, "duration", 10)
+    interval = float_param(request, "interval", 0.005, minimum=MIN_PROFILE_INTERVAL)
+    try:
+        path = await profiler.profile(duration, interval)
+    except RuntimeError as e:
+        return json_response({"error": str(e)}, status=409)
+    return json_response({"path": path})
+
+
+def build_app() -> web.Application:
+    debug = DEBUG_ENDPOINTS_ENABLED and bool(DEBUG_TOKEN)
+    if DEBUG_ENDPOINTS_ENABLED and not DEBUG_TOKEN:
+        LOGGER.warning("Debug endpoints are not served, they are enabled but DEBUG_TOKEN is empty")
+    app = web.Application(middlewares=[debug_auth] if debug else [])
+    app.router.add_get("/metrics", metrics_view)
+    if debug:
+        app.router.add_get("/debug/tasks", tasks_view)
+        app.router.add_post("/debug/slow-callbacks", slow_callbacks_view)
+        app.router.add_post("/debug/profile", profile_view)
+    return app
+
+
+async def start_server() -> None:
+    global runner
+    if runner is not None:
+        return
+    runner = web.AppRunner(build_app())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        LOGGER.warning(f"Can't start metrics server on {METRICS_HOST}:{METRICS_PORT}: {e}")
+    else:
+        LOGGER.info(f"Metrics server is listening on {METRICS_HOST}:{METRICS_PORT}")
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+from bisect import bisect
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from prozorro_bridge_frameworkagreement.settings import (
+    LOGGER,
+    SHARDING_MODE,
+    SHARD_COUNT,
+    SHARD_INDEX,
+    SHARD_VNODES,
+    SHARD_REPLICA_ID,
+    SHARD_COLLECTION,
+    SHARD_LEASE_TTL,
+    SHARD_HEARTBEAT_INTERVAL,
+)
+from prozorro_bridge_frameworkagreement.storage import get_collection
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_EXCEPTION, DATABRIDGE_SHARDS_CHANGED
+
+
+STATIC = "static"
+LEASE = "lease"
+
+
+def hash_key(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of tender ids to members, every member gets `vnodes` points on the ring,
+    so adding or removing a member moves only about 1/N of the ids.
+    """
+
+    def __init__(self, members: Iterable[str], vnodes: int) -> None:
+        self.members = sorted(set(members))
+        points = sorted(
+            (hash_key(f"{member}:{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        self.hashes = [h for h, _ in points]
+        self.owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self.owners:
+            return None
+        return self.owners[bisect(self.hashes, hash_key(key)) % len(self.owners)]
+
+
+class StaticShards:
+    """`count` replicas configured with their own `index` each"""
+
+    def __init__(self, count: int, index: int, vnodes: int) -> None:
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} is out of range for {count} shards")
+        self.member = str(index)
+        self.ring = HashRing((str(i) for i in range(count)), vnodes)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def wait_ready(self) -> None:
+        pass
+
+    def owns(self, tender_id: str) -> bool:
+        return self.ring.owner(tender_id) == self.member
+
+
+class LeaseShards(StaticShards):
+    """
+    Replicas register themselves in a MongoDB collection and renew their lease every `heartbeat_interval`.
+    Members with a live lease form the ring, so replicas can be added or removed without reconfiguration.
+    While the replicas see different member lists (up to `heartbeat_interval`) a tender may be owned by two
+    of them or by none; the first is handled by the synced index and API validation,
+    the second is caught on the next change of the tender.
+    """
+
+    def __init__(
+        self,
+        get_collection: Callable[[], AsyncIOMotorCollection],
+        replica_id: str,
+        lease_ttl: float,
+        heartbeat_interval: float,
+        vnodes: int,
+    ) -> None:
+        self.get_collection = get_collection
+        self.member = replica_id
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.vnodes = vnodes
+        self.ring = HashRing((), vnodes)
+        self.collection = None
+        self.task = None
+        self.ready: Optional[asyncio.Event] = None
+
+    async def _get_collection(self) -> AsyncIOMotorCollection:
+        if self.collection is None:
+            collection = self.get_collection()
+            # removes replicas that stopped without leaving, live members are filtered by date anyway
+            await collection.create_index([("heartbeat", ASCENDING)], expireAfterSeconds=int(self.lease_ttl) * 2)
+            self.collection = collection
+        return self.collection
+
+    async def heartbeat(self) -> List[str]:
+        collection = await self._get_collection()
+        now = datetime.utcnow()
+        await collection.update_one({"_id": self.member}, {"$set": {"heartbeat": now}}, upsert=True)
+        cursor = collection.find({"heartbeat": {"$gt": now - timedelta(seconds=self.lease_ttl)}}, {"_id": 1})
+        return [doc["_id"] for doc in await cursor.to_list(length=None)]
+
+    def update_members(self, members: List[str]) -> None:
+        if self.member not in members:
+            members = members + [self.member]
+        if sorted(set(members)) != self.ring.members:
+            self.ring = HashRing(members, self.vnodes)
+            LOGGER.info(
+                f"Shard members changed: {', '.join(self.ring.members)}",
+                extra=journal_context({"MESSAGE_ID": DATABRIDGE_SHARDS_CHANGED}),
+            )
+
+    async def start(self) -> None:
+        if self.task is None:
+            self.ready = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+            try:
+                collection = await self._get_collection()
+                await collection.delete_one({"_id": self.member})
+            except PyMongoError as e:
+                LOGGER.warning(
+                    f"Can't remove shard lease of {self.member}: {e}",
+                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+                )
+
+    async def run(self) -> None:
+        while True:
+            try:
+                self.update_members(await self.heartbeat())
+                self.ready.set()
+            except PyMongoError as e:
+                LOGGER.warning(
+                    f"Can't renew shard lease of {self.member}: {e}",
+                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+                )
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def wait_ready(self) -> None:
+        # items can't be dropped before the replica knows which of them it owns
+        await self.ready.wait()
+
+
+def build_shards() -> Optional[StaticShards]:
+    if SHARDING_MODE == STATIC:
+        return StaticShards(SHARD_COUNT, SHARD_INDEX, SHARD_VNODES)
+    if SHARDING_MODE == LEASE:
+        return LeaseShards(
+            partial(get_collection, SHARD_COLLECTION),
+            replica_id=SHARD_REPLICA_ID,
+            lease_ttl=SHARD_LEASE_TTL,
+            heartbeat_interval=SHARD_HEARTBEAT_INTERVAL,
+            vnodes=SHARD_VNODES,
+        )
+    if SHARDING_MODE:
+        raise ValueError(f"Unknown sharding mode {SHARDING_MODE}, use {STATIC} or {LEASE}")
+    return None
@@ -0,0 +1,58 @@
+from datetime import datetime
+from time import time
+from typing import Iterable, Optional
+
+from prozorro_bridge_frameworkagreement.metrics import FEED_LAG, FEED_LAG_HISTOGRAM, TENDER_LATENCY
+from prozorro_bridge_frameworkagreement.settings import LOGGER, SLA_THRESHOLD
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_SLA_BREACH
+
+
+AGREEMENTS_POSTED = "post_agreements"
+STATUS_PATCHED = "patch_tender"
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def observe_feed_page(items: Iterable[dict]) -> Optional[float]:
+    """Feed lag is the age of the newest item of the page, empty pages leave the last value"""
+    newest = max(
+        (ts for ts in (parse_timestamp(item.get("dateModified")) for item in items) if ts is not None),
+        default=None,
+    )
+    if newest is None:
+        return None
+    lag = max(0.0, time() - newest)
+    FEED_LAG.set(lag)
+    FEED_LAG_HISTOGRAM.observe(lag)
+    if SLA_THRESHOLD and lag > SLA_THRESHOLD:
+        LOGGER.warning(
+            f"Feed is {lag:.0f} seconds behind, SLA is {SLA_THRESHOLD} seconds",
+            extra=journal_context({"MESSAGE_ID": DATABRIDGE_SLA_BREACH}),
+        )
+    return lag
+
+
+def observe_completion(tender: dict, stage: str) -> Optional[float]:
+    """Time from the tender change to the write it caused, retries and deferrals included"""
+    date_modified = parse_timestamp(tender.get("dateModified"))
+    if date_modified is None:
+        return None
+    latency = max(0.0, time() - date_modified)
+    TENDER_LATENCY.observe(latency, stage)
+    if SLA_THRESHOLD and latency > SLA_THRESHOLD:
+        LOGGER.warning(
+            f"Tender {tender['id']} {stage} took {latency:.0f} seconds after its change, SLA is {SLA_THRESHOLD} seconds",
+            extra=journal_context(
+                {"MESSAGE_ID": DATABRIDGE_SLA_BREACH},
+                params={"TENDER_ID": tender["id"]}
+            ),
+        )
+    return latency
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from prozorro_bridge_frameworkagreement.settings import LOGGER, MONGODB_URL, MONGODB_DATABASE
+from prozorro_bridge_frameworkagreement.utils import journal_context
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_EXCEPTION
+
+
+AGREEMENT = "agreement"
+TENDER = "tender"
+TENDER_VERSION = "tender_version"
+
+_client = None
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(MONGODB_URL)
+    return _client[MONGODB_DATABASE]
+
+
+def get_collection(name: str) -> AsyncIOMotorCollection:
+    return get_database()[name]
+
+
+class SyncedIndex:
+    """
+    Agreements confirmed in CDB (created or archived), selection tenders with already patched status
+    and versions (id and dateModified) of closeFrameworkAgreementUA tenders with all agreements confirmed.
+    Recent keys live in a bounded in-memory LRU, all keys are also stored in MongoDB
+    (when `get_collection` is given) and expire there by a TTL index, so the index survives restarts.
+    Storage errors are logged and treated as a miss: the index only lets the bridge skip work.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        get_collection: Optional[Callable[[], AsyncIOMotorCollection]] = None,
+        ttl: int = None,
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.get_collection = get_collection
+        self.memory = OrderedDict()
+        self.collection = None
+
+    async def _get_collection(self) -> Optional[AsyncIOMotorCollection]:
+        if self.collection is None and self.get_collection is not None:
+            collection = self.get_collection()
+            if self.ttl:
+                await collection.create_index("dateCreated", expireAfterSeconds=self.ttl)
+            self.collection = collection
+        return self.collection
+
+    def _remember(self, key: str) -> None:
+        self.memory[key] = None
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    async def filter_synced(self, kind: str, ids: Iterable[str]) -> Set[str]:
+        keys = {f"{kind}:{i}": i for i in ids}
+        synced = set()
+        missing = []
+        for key, i in keys.items():
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                synced.add(i)
+            else:
+                missing.append(key)
+        if missing:
+            try:
+                collection = await self._get_collection()
+                if collection is not None:
+                    async for doc in collection.find({"_id": {"$in": missing}}, {"_id": 1}):
+                        self._remember(doc["_id"])
+                        synced.add(keys[doc["_id"]])
+            except PyMongoError as e:
+                self._log_error(e)
+        return synced
+
+    async def contains(self, kind: str, i: str) -> bool:
+        return i in await self.filter_synced(kind, (i,))
+
+    async def add(self, kind: str, *ids: str) -> None:
+        keys = [f"{kind}:{i}" for i in ids]
+        if not keys:
+            return
+        for key in keys:
+            self._remember(key)
+        try:
+            collection = await self._get_collection()
+            if collection is not None:
+                now = datetime.utcnow()
+                await collection.bulk_write(
+                    [UpdateOne({"_id": key}, {"$setOnInsert": {"dateCreated": now}}, upsert=True) for key in keys],
+                    ordered=False,
+                )
+        except PyMongoError as e:
+            self._log_error(e)
+
+    def clear(self) -> None:
+        self.memory.clear()
+
+    @staticmethod
+    def _log_error(e: Exception) -> None:
+        LOGGER.warning(
+            f"Synced index storage error: {e}",
+            extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+        )
+
+
+class DeferredStore:
+    """
+    Tenders deferred by the worker pool after exhausting retries, with the time of their next try.
+    A tender is stored until it's processed, so tenders deferred before a restart are restored by the next run.
+    Storage errors are logged, the tender is still retried from memory.
+    """
+
+    def __init__(self, get_collection: Callable[[], AsyncIOMotorCollection]) -> None:
+        self.get_collection = get_collection
+
+    async def add(self, tender: dict, next_try: datetime) -> None:
+        try:
+            await self.get_collection().update_one(
+                {"_id": tender["id"]},
+                {"$set": {"tender": tender, "nextTry": next_try}},
+                upsert=True,
+            )
+        except PyMongoError as e:
+            self._log_error(e)
+
+    async def remove(self, tender_id: str) -> None:
+        try:
+            await self.get_collection().delete_one({"_id": tender_id})
+        except PyMongoError as e:
+            self._log_error(e)
+
+    async def load(self) -> List[dict]:
+        try:
+            return [doc async for doc in self.get_collection().find({})]
+        except PyMongoError as e:
+            self._log_error(e)
+            return []
+
+    @staticmethod
+    def _log_error(e: Exception) -> None:
+        LOGGER.warning(
+            f"Deferred tenders storage error: {e}",
+            extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION}),
+        )
@@ -0,0 +1,166 @@
+import asyncio
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import time
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, TextIO
+
+from prozorro_bridge_frameworkagreement.serializers import dumps
+from prozorro_bridge_frameworkagreement.settings import TRACING_SAMPLE_RATE, TRACING_EXPORTER, TRACING_FILE
+
+
+class Span:
+    """OpenTelemetry-like span: W3C trace and span ids, attributes, timed events"""
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.events: List[dict] = []
+        self.status = "ok"
+        self.start = time()
+        self.end: Optional[float] = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes) -> None:
+        self.events.append({"name": name, "time": time(), "attributes": attributes})
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "duration": self.end - self.start if self.end else None,
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class NoopSpan:
+    """Stands for spans of unsampled traces, so their children are skipped with a single context lookup"""
+
+    sampled = False
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+class ConsoleExporter:
+    def __init__(self, stream: TextIO = sys.stdout) -> None:
+        self.stream = stream
+
+    def export(self, span: Span) -> None:
+        self.stream.write(dumps(span.to_dict()).decode() + "\n")
+
+
+class FileExporter(ConsoleExporter):
+    """Appends spans as JSON lines"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(open(path, "a", buffering=1))
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, exporter_factory: Callable[[], ConsoleExporter]) -> None:
+        self.sample_rate = sample_rate
+        self.exporter_factory = exporter_factory
+        self.exporter: Optional[ConsoleExporter] = None
+
+    def export(self, span: Span) -> None:
+        if self.exporter is None:
+            self.exporter = self.exporter_factory()
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator:
+        parent = current_span.get()
+        if parent is None:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                span = NOOP_SPAN
+            else:
+                span = Span(name, "%032x" % random.getrandbits(128), None, attributes)
+        elif parent.sampled:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        else:
+            span = parent
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.sampled:
+                span.status = "error"
+                span.set_attribute("error", repr(e))
+            raise
+        finally:
+            current_span.reset(token)
+            if span.sampled:
+                span.end = time()
+                self.export(span)
+
+    def traced(self, name: str, attributes: Callable[..., dict] = None) -> Callable:
+        """
+        Runs the coroutine function in a span,
+        `attributes` gets the call arguments and returns span attributes, it's called for sampled traces only
+        """
+        def decorator(func: Callable) -> Callable:
+            assert asyncio.iscoroutinefunction(func)
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                parent = current_span.get()
+                if (parent is None and not self.sample_rate) or (parent is not None and not parent.sampled):
+                    return await func(*args, **kwargs)
+                with self.span(name) as span:
+                    if span.sampled and attributes is not None:
+                        span.attributes.update(attributes(*args, **kwargs))
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def add_event(name: str, **attributes) -> None:
+    span = current_span.get()
+    if span is not None:
+        span.add_event(name, **attributes)
+
+
+def inject(headers: Optional[Mapping[str, str]]) -> Optional[Mapping[str, str]]:
+    """Adds W3C traceparent of the current sampled span to outgoing request headers"""
+    span = current_span.get()
+    if span is None or not span.sampled:
+        return headers
+    headers = dict(headers or {})
+    headers["traceparent"] = span.traceparent
+    return headers
+
+
+EXPORTERS: Dict[str, Callable[[], ConsoleExporter]] = {
+    "console": ConsoleExporter,
+    "file": lambda: FileExporter(TRACING_FILE),
+}
+
+tracer = Tracer(TRACING_SAMPLE_RATE, EXPORTERS[TRACING_EXPORTER])
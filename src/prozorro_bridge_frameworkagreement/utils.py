@@ -1,14 +1,41 @@
+from types import MappingProxyType
+from typing import Mapping, Optional
+
 from prozorro_crawler.settings import API_VERSION, CRAWLER_USER_AGENT
 
-from prozorro_bridge_frameworkagreement.settings import API_HOST, API_TOKEN, JOURNAL_PREFIX
+from prozorro_bridge_frameworkagreement.metrics import JOURNAL_MESSAGES, STAGE_DURATION
+from prozorro_bridge_frameworkagreement.settings import (
+    API_HOST,
+    PUBLIC_API_HOST,
+    API_TOKEN,
+    API_TOKEN_POST_AGREEMENTS,
+    API_TOKEN_GET_CREDENTIALS,
+    JOURNAL_PREFIX,
+)
 
 BASE_URL = f"{API_HOST}/api/{API_VERSION}"
+AGREEMENTS_FEED_URL = f"{PUBLIC_API_HOST}/api/{API_VERSION}/agreements"
+
+
+def build_headers(token: Optional[str] = None) -> Mapping[str, str]:
+    # read-only, so concurrent requests can't overwrite each other's token
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": CRAWLER_USER_AGENT,
+    }
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    return MappingProxyType(headers)
+
 
-HEADERS = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {API_TOKEN}",
-    "User-Agent": CRAWLER_USER_AGENT,
-}
+# tender fields the bridge reads, lots are reduced to their statuses
+TENDER_FIELDS = ("id", "dateModified", "status", "procurementMethodType", "mode", "procuringEntity", "agreements")
+
+HEADERS = build_headers(API_TOKEN)
+POST_AGREEMENTS_HEADERS = build_headers(API_TOKEN_POST_AGREEMENTS)
+GET_CREDENTIALS_HEADERS = build_headers(API_TOKEN_GET_CREDENTIALS)
+# for PUBLIC_API_HOST, bot tokens are sent to API_HOST only
+PUBLIC_HEADERS = build_headers()
 
 
 def journal_context(record: dict = None, params: dict = None) -> dict:
@@ -18,9 +45,23 @@ def journal_context(record: dict = None, params: dict = None) -> dict:
         params = {}
     for k, v in params.items():
         record[JOURNAL_PREFIX + k] = v
+    if "MESSAGE_ID" in record:
+        JOURNAL_MESSAGES.inc(record["MESSAGE_ID"])
     return record
 
 
+def project_tender(tender: dict) -> dict:
+    """
+    Drops the tender fields the bridge doesn't read (bids, awards, documents, items...),
+    so a queued or processed tender doesn't keep the whole API object alive
+    """
+    projection = {key: tender[key] for key in TENDER_FIELDS if key in tender}
+    if "lots" in tender:
+        projection["lots"] = [{"id": lot.get("id"), "status": lot["status"]} for lot in tender["lots"]]
+    return projection
+
+
+@STAGE_DURATION.timed("check_tender")
 def check_tender(tender: dict) -> bool:
     if (
         tender.get("procurementMethodType", "") == "closeFrameworkAgreementUA"
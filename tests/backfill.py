@@ -0,0 +1,85 @@
+import io
+import json
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from prozorro_bridge_frameworkagreement.backfill import backfill, parse_line
+
+
+def test_parse_line(tender_data):
+    assert parse_line("33\n") == ("33", None)
+    assert parse_line(json.dumps(tender_data)) == ("33", tender_data)
+    assert parse_line(json.dumps({"data": tender_data})) == ("33", tender_data)
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.backfill.LOGGER")
+@patch("prozorro_bridge_frameworkagreement.backfill.process_tender")
+@patch("prozorro_bridge_frameworkagreement.backfill.get_tender")
+async def test_backfill(get_tender_mock, process_tender_mock, mocked_logger, tender_data, tmp_path):
+    other_tender = {"id": "44", "procurementMethodType": "belowThreshold", "status": "complete"}
+    tenders = {"34": dict(tender_data, id="34"), "44": other_tender}
+    get_tender_mock.side_effect = lambda tender_id, session: tenders[tender_id]
+    process_tender_mock.side_effect = [None, None, ConnectionError("Gave up")]
+    stream = io.StringIO("\n".join([
+        json.dumps(tender_data), "34", "44", "32", "{broken", json.dumps(dict(tender_data, id="35")),
+    ]))
+    checkpoint = tmp_path / "done.txt"
+    checkpoint.write_text("32\n")
+
+    stats = await backfill(stream, MagicMock(), concurrency=1, checkpoint=str(checkpoint))
+
+    assert stats == {"processed": 2, "not_applicable": 1, "failed": 2, "checkpointed": 1}
+    assert get_tender_mock.call_count == 2
+    assert process_tender_mock.call_count == 3
+    assert checkpoint.read_text().split() == ["32", "33", "34", "44"]
+    assert mocked_logger.error.call_count == 2
+    assert mocked_logger.exception.call_count == 1
+
+    process_tender_mock.reset_mock(side_effect=True)
+    stream.seek(0)
+    stats = await backfill(stream, MagicMock(), concurrency=1, checkpoint=str(checkpoint))
+
+    assert stats == {"processed": 1, "failed": 1, "checkpointed": 4}
+    assert process_tender_mock.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.backfill.LOGGER")
+@patch("prozorro_bridge_frameworkagreement.backfill.process_tender")
+@patch("prozorro_bridge_frameworkagreement.backfill.get_tender")
+async def test_backfill_dry_run(get_tender_mock, process_tender_mock, mocked_logger, tender_data, tmp_path):
+    stream = io.StringIO(json.dumps(tender_data) + "\n")
+    checkpoint = tmp_path / "done.txt"
+
+    stats = await backfill(stream, MagicMock(), concurrency=5, checkpoint=str(checkpoint), dry_run=True)
+
+    assert stats == {"processed": 1}
+    assert process_tender_mock.call_count == 0
+    assert not checkpoint.exists()
+    assert mocked_logger.info.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.OUTBOX_ENABLED", True)
+@patch("prozorro_bridge_frameworkagreement.backfill.LOGGER")
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_backfill_sends_directly(
+    bridge_logger, mocked_logger, tender_data, agreement_data, credentials, synced_index, tmp_path
+):
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=404)])
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
+    ])
+    session_mock.post = AsyncMock(side_effect=[MagicMock(status=201)])
+    checkpoint = tmp_path / "done.txt"
+
+    with patch("prozorro_bridge_frameworkagreement.bridge.outbox.put", AsyncMock()) as mocked_put:
+        stats = await backfill(io.StringIO(json.dumps(tender_data)), session_mock, 1, checkpoint=str(checkpoint))
+
+    assert stats == {"processed": 1}
+    assert mocked_put.await_count == 0
+    assert session_mock.post.await_count == 1
+    assert checkpoint.read_text().split() == ["33"]
+
@@ -0,0 +1,35 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from benchmarks.throughput import run
+from prozorro_bridge_frameworkagreement import main as bridge_main
+from prozorro_bridge_frameworkagreement.retry import retry_policy
+
+
+@pytest.fixture
+def bridge_runtime(monkeypatch):
+    # settings are imported before the benchmark module sets its env defaults, so they are patched here:
+    # no metrics server, signal handlers, deferred store or retry delays left behind by data_handler
+    start_server = AsyncMock()
+    install_signal_handlers = MagicMock()
+    monkeypatch.setattr(bridge_main, "METRICS_ENABLED", False)
+    monkeypatch.setattr(bridge_main, "start_server", start_server)
+    monkeypatch.setattr(bridge_main, "install_signal_handlers", install_signal_handlers)
+    monkeypatch.setattr(bridge_main.worker_pool, "store", None)
+    monkeypatch.setattr(retry_policy, "base", 0)
+    return start_server, install_signal_handlers
+
+
+@pytest.mark.asyncio
+async def test_throughput_benchmark_smoke(bridge_runtime):
+    result = await run(tenders=40, page_size=10, lots=2, cfa_share=1, selection_share=0.5, seed=1)
+
+    assert result["items"] == 40
+    assert result["processed"] == 40
+    assert result["deferred"] == 0
+    assert result["requests_by_endpoint"]["get_agreement"] > 0
+    assert result["requests_by_endpoint"]["post_agreement"] > 0
+    assert result["requests_by_endpoint"]["patch_tender"] > 0
+    start_server, install_signal_handlers = bridge_runtime
+    assert start_server.await_count == 0
+    assert install_signal_handlers.call_count == 4
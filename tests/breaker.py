@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from prozorro_bridge_frameworkagreement.breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    breakers,
+    wait_closed,
+    AGREEMENT_POST,
+    CLOSED,
+    OPEN,
+    HALF_OPEN,
+)
+from prozorro_bridge_frameworkagreement.bridge import api_request
+
+
+def build_breaker(**kwargs):
+    params = dict(threshold=0.5, window=4, min_requests=4, open_interval=30, half_open_requests=1)
+    params.update(kwargs)
+    return CircuitBreaker("test", **params)
+
+
+@patch("prozorro_bridge_frameworkagreement.breaker.LOGGER")
+def test_breaker_opens_on_error_rate(mocked_logger):
+    breaker = build_breaker()
+    for success in (True, False, True):
+        breaker.before_request()
+        breaker.record_success() if success else breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert mocked_logger.warning.call_count == 1
+
+
+@patch("prozorro_bridge_frameworkagreement.breaker.LOGGER")
+def test_breaker_half_open(mocked_logger):
+    breaker = build_breaker()
+    with patch("prozorro_bridge_frameworkagreement.breaker.monotonic", return_value=100):
+        breaker.open()
+    with patch("prozorro_bridge_frameworkagreement.breaker.monotonic", return_value=130):
+        assert not breaker.is_open
+        breaker.before_request()
+        assert breaker.state == HALF_OPEN
+        # only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+    with patch("prozorro_bridge_frameworkagreement.breaker.monotonic", return_value=160):
+        breaker.before_request()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        breaker.before_request()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.breaker.LOGGER")
+async def test_api_request_fails_fast(mocked_logger):
+    session_mock = AsyncMock()
+    session_mock.post = AsyncMock(side_effect=[MagicMock(status=503), ConnectionResetError()] * 10)
+    breaker = breakers[AGREEMENT_POST]
+
+    for _ in range(breaker.min_requests):
+        try:
+            await api_request(session_mock, AGREEMENT_POST, "post", "/agreements")
+        except ConnectionResetError:
+            pass
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await api_request(session_mock, AGREEMENT_POST, "post", "/agreements")
+    assert session_mock.post.await_count == breaker.min_requests
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.breaker.LOGGER")
+async def test_wait_closed(mocked_logger):
+    await asyncio.wait_for(wait_closed(), 1)
+
+    breaker = breakers[AGREEMENT_POST]
+    open_interval = breaker.open_interval
+    breaker.open_interval = 0.05
+    try:
+        breaker.open()
+        waiter = asyncio.ensure_future(wait_closed())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await asyncio.wait_for(waiter, 1)
+    finally:
+        breaker.open_interval = open_interval
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.breaker.LOGGER")
+async def test_cancelled_probe_released(mocked_logger):
+    breaker = breakers[AGREEMENT_POST]
+    breaker.open()
+    breaker.opened_at -= breaker.open_interval
+    session_mock = AsyncMock()
+
+    async def hanging_post(url, **kwargs):
+        await asyncio.sleep(10)
+
+    session_mock.post = hanging_post
+
+    request = asyncio.ensure_future(api_request(session_mock, AGREEMENT_POST, "post", "/agreements"))
+    await asyncio.sleep(0)
+    assert breaker.state == HALF_OPEN
+    assert breaker.probes == 1
+    request.cancel()
+    await asyncio.gather(request, return_exceptions=True)
+    assert breaker.probes == 0
+
+    session_mock.post = AsyncMock(return_value=MagicMock(status=201))
+    await api_request(session_mock, AGREEMENT_POST, "post", "/agreements")
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.breaker.LOGGER")
+async def test_cancelled_limiter_wait_releases_probe(mocked_logger):
+    breaker = breakers[AGREEMENT_POST]
+    breaker.open()
+    breaker.opened_at -= breaker.open_interval
+    limiter = MagicMock(acquire=AsyncMock(side_effect=asyncio.CancelledError))
+
+    with patch("prozorro_bridge_frameworkagreement.bridge.LIMITER_ENABLED", True), \
+            patch("prozorro_bridge_frameworkagreement.bridge.limiter", limiter):
+        with pytest.raises(asyncio.CancelledError):
+            await api_request(AsyncMock(), AGREEMENT_POST, "post", "/agreements")
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.probes == 0
+    assert limiter.release.call_count == 0
+
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from prozorro_bridge_frameworkagreement.cache import TTLCache
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_expiration():
+    cache = TTLCache(ttl=10, size=5)
+    fetch = AsyncMock(side_effect=["first", "second"])
+    with patch("prozorro_bridge_frameworkagreement.cache.monotonic", return_value=100):
+        assert await cache.get("33", fetch) == "first"
+    with patch("prozorro_bridge_frameworkagreement.cache.monotonic", return_value=109):
+        assert await cache.get("33", fetch) == "first"
+    with patch("prozorro_bridge_frameworkagreement.cache.monotonic", return_value=110):
+        assert await cache.get("33", fetch) == "second"
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_eviction():
+    cache = TTLCache(ttl=10, size=2)
+    await cache.get("1", AsyncMock(return_value="a"))
+    await cache.get("2", AsyncMock(return_value="b"))
+    assert cache.lookup("1") == "a"
+    await cache.get("3", AsyncMock(return_value="c"))
+
+    assert len(cache) == 2
+    assert cache.lookup("2") is None
+    assert cache.lookup("1") == "a"
+    assert cache.lookup("3") == "c"
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_collapses_concurrent_fetches():
+    cache = TTLCache(ttl=10, size=2)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "credentials"
+
+    results = await asyncio.gather(*(cache.get("33", fetch) for _ in range(10)))
+
+    assert results == ["credentials"] * 10
+    assert calls == 1
+    assert cache.in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_does_not_store_errors():
+    cache = TTLCache(ttl=10, size=2)
+    with pytest.raises(ConnectionError):
+        await cache.get("33", AsyncMock(side_effect=ConnectionError))
+    assert cache.lookup("33") is None
+    assert cache.in_flight == {}
+    assert await cache.get("33", AsyncMock(return_value="credentials")) == "credentials"
@@ -0,0 +1,34 @@
+import pytest
+
+from prozorro_bridge_frameworkagreement import client
+from prozorro_bridge_frameworkagreement.settings import (
+    HTTP_CONNECTIONS_LIMIT,
+    HTTP_CONNECTIONS_LIMIT_PER_HOST,
+    HTTP_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+
+@pytest.mark.asyncio
+async def test_build_session():
+    session = client.build_session()
+    try:
+        assert session.connector.limit == HTTP_CONNECTIONS_LIMIT
+        assert session.connector.limit_per_host == HTTP_CONNECTIONS_LIMIT_PER_HOST
+        assert session.timeout.total == HTTP_TIMEOUT
+        assert session.timeout.sock_read == HTTP_READ_TIMEOUT
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_get_session_is_shared():
+    session = client.get_session()
+    assert client.get_session() is session
+
+    await client.close_session()
+    assert session.closed
+
+    new_session = client.get_session()
+    assert new_session is not session
+    await client.close_session()
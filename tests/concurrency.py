@@ -0,0 +1,128 @@
+from aiohttp import web, ClientSession, TCPConnector
+from aiohttp.test_utils import TestServer
+import asyncio
+import random
+import pytest
+from unittest.mock import patch
+
+from benchmarks.mock_api import MockAPI
+from prozorro_bridge_frameworkagreement.bridge import process_tender, probe_agreements
+from prozorro_bridge_frameworkagreement.settings import AGREEMENTS_PROBE_CONCURRENCY
+from prozorro_bridge_frameworkagreement.utils import (
+    HEADERS,
+    POST_AGREEMENTS_HEADERS,
+    GET_CREDENTIALS_HEADERS,
+)
+
+
+EXPECTED_AUTH = {
+    "extract_credentials": GET_CREDENTIALS_HEADERS["Authorization"],
+    "get_agreement": HEADERS["Authorization"],
+    "post_agreement": POST_AGREEMENTS_HEADERS["Authorization"],
+    "patch_tender_agreement": HEADERS["Authorization"],
+    "patch_tender": HEADERS["Authorization"],
+}
+
+
+def build_mock_api(requests_log: list) -> web.Application:
+    async def jitter():
+        await asyncio.sleep(random.random() / 100)
+
+    async def extract_credentials(request):
+        requests_log.append(("extract_credentials", request.headers["Authorization"]))
+        await jitter()
+        tender_id = request.match_info["tender_id"]
+        return web.json_response({"data": {"owner": "broker", "tender_token": f"{tender_id}_token"}})
+
+    async def get_agreement(request):
+        requests_log.append(("get_agreement", request.headers["Authorization"]))
+        await jitter()
+        agreement_id = request.match_info["agreement_id"]
+        if agreement_id.startswith("new"):
+            return web.json_response({"errors": ["Not Found"]}, status=404)
+        return web.json_response({"data": {"id": agreement_id, "status": "active", "documents": []}})
+
+    async def post_agreement(request):
+        requests_log.append(("post_agreement", request.headers["Authorization"]))
+        await jitter()
+        data = (await request.json())["data"]
+        assert data["tender_token"] == f"{data['tender_id']}_token"
+        return web.json_response({"data": data}, status=201)
+
+    async def patch_tender_agreement(request):
+        requests_log.append(("patch_tender_agreement", request.headers["Authorization"]))
+        await jitter()
+        return web.json_response({"data": {}})
+
+    async def patch_tender(request):
+        requests_log.append(("patch_tender", request.headers["Authorization"]))
+        await jitter()
+        return web.json_response({"data": {}})
+
+    app = web.Application()
+    app.router.add_get("/tenders/{tender_id}/extract_credentials", extract_credentials)
+    app.router.add_get("/agreements/{agreement_id}", get_agreement)
+    app.router.add_post("/agreements", post_agreement)
+    app.router.add_patch("/tenders/{tender_id}/agreements/{agreement_id}", patch_tender_agreement)
+    app.router.add_patch("/tenders/{tender_id}", patch_tender)
+    return app
+
+
+def cfaua_tender(n: int) -> dict:
+    return {
+        "id": f"cfaua_{n}",
+        "procurementMethodType": "closeFrameworkAgreementUA",
+        "status": "active.awarded",
+        "procuringEntity": {"name": "buyer"},
+        "agreements": [
+            {"id": f"new_{n}_{i}", "status": "active", "contracts": [{"id": "1", "status": "active"}]}
+            for i in range(3)
+        ],
+    }
+
+
+def selection_tender(n: int) -> dict:
+    return {
+        "id": f"selection_{n}",
+        "procurementMethodType": "closeFrameworkAgreementSelectionUA",
+        "status": "draft.pending",
+        "procuringEntity": {"name": "buyer"},
+        "agreements": [{"id": f"existing_{n}"}],
+    }
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_tokens_are_not_mixed_under_concurrency(mocked_logger):
+    requests_log = []
+    server = TestServer(build_mock_api(requests_log))
+    await server.start_server()
+    tenders = []
+    for n in range(50):
+        tenders.append(cfaua_tender(n))
+        tenders.append(selection_tender(n))
+    try:
+        with patch("prozorro_bridge_frameworkagreement.bridge.BASE_URL", f"http://{server.host}:{server.port}"):
+            async with ClientSession() as session:
+                await asyncio.gather(*(process_tender(session, tender) for tender in tenders))
+    finally:
+        await server.close()
+
+    assert len(requests_log) == 50 * (3 + 1 + 3) + 50 * (1 + 1 + 1)
+    for endpoint, authorization in requests_log:
+        assert authorization == EXPECTED_AUTH[endpoint], endpoint
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_agreement_probes_reuse_connections(mocked_logger):
+    async with MockAPI(statuses={200: 1, 404: 1, 410: 1}, seed=1) as api:
+        with patch("prozorro_bridge_frameworkagreement.bridge.BASE_URL", api.url):
+            # probes that keep their connections would exhaust this pool and hang
+            async with ClientSession(connector=TCPConnector(limit=AGREEMENTS_PROBE_CONCURRENCY)) as session:
+                for batch in range(10):
+                    statuses = await probe_agreements([f"{batch}_{i}" for i in range(300)], "tender", session)
+                    assert set(statuses) == {200, 404, 410}
+                    assert api.connections <= AGREEMENTS_PROBE_CONCURRENCY
+
+    assert api.requests["get_agreement"] == 3000
@@ -0,0 +1,70 @@
+from copy import deepcopy
+from datetime import datetime
+import pytest
+
+from prozorro_bridge_frameworkagreement.breaker import breakers
+from prozorro_bridge_frameworkagreement.bridge import credentials_cache
+from prozorro_bridge_frameworkagreement.storage import SyncedIndex
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    credentials_cache.clear()
+    yield
+    credentials_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def synced_index(monkeypatch):
+    index = SyncedIndex(size=1000)
+    monkeypatch.setattr("prozorro_bridge_frameworkagreement.bridge.synced_index", index)
+    return index
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    for breaker in breakers.values():
+        breaker.reset()
+    yield
+    for breaker in breakers.values():
+        breaker.reset()
+
+
+@pytest.fixture
+def credentials():
+    return {"data": {"owner": "user1", "tender_token": "000000"}}
+
+
+@pytest.fixture
+def error_data():
+    return {"error": "No permission"}
+
+
+@pytest.fixture
+def agreement_data():
+    return {
+        "id": "11111111111111111111111111111111",
+        "status": "active",
+        "contracts": [
+            {"id": "44", "status": "active", "suppliers": [], "unitPrices": []},
+            {"id": "44", "status": "cancelled", "suppliers": [], "unitPrices": []},
+        ]
+    }
+
+
+@pytest.fixture
+def tender_data(agreement_data):
+    draft_agreement = deepcopy(agreement_data)
+    draft_agreement["status"] = "draft"
+    return {
+        "id": "33",
+        "dateModified": str(datetime.now()),
+        "procurementMethodType": "closeFrameworkAgreementUA",
+        "status": "active.awarded",
+        "mode": "test",
+        "procuringEntity": {"contactPoint": {}, "additionalContactPoints": []},
+        "agreements": [draft_agreement, deepcopy(agreement_data)],
+        "lots": [
+            {"id": "lot_1", "status": "active"}
+        ],
+    }
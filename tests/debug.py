@@ -0,0 +1,160 @@
+import asyncio
+import os
+import signal
+import pytest
+from aiohttp.test_utils import TestServer, TestClient
+from time import monotonic
+from unittest.mock import patch
+
+from prozorro_bridge_frameworkagreement.debug import (
+    dump_tasks,
+    set_slow_callbacks,
+    toggle_slow_callbacks,
+    install_signal_handlers,
+    Profiler,
+)
+
+
+async def wait_for_agreement(tender_id: str) -> None:
+    await asyncio.sleep(10)
+
+
+def busy_loop(seconds: float) -> None:
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        pass
+
+
+async def start_client() -> TestClient:
+    from prozorro_bridge_frameworkagreement.server import build_app
+
+    client = TestClient(TestServer(build_app()))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_dump_tasks():
+    task = asyncio.ensure_future(wait_for_agreement("33"))
+    await asyncio.sleep(0)
+    try:
+        dump = dump_tasks()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    task_dump = next(t for t in dump["tasks"] if t["coro"] == "wait_for_agreement")
+    assert task_dump["ids"] == {"tender_id": "33"}
+    assert task_dump["waiting_in"] == "sleep"
+    assert "wait_for_agreement" in task_dump["stack"][0]
+    assert dump["waiting_in"]["sleep"] >= 1
+    assert dump["count"] == len(dump["tasks"])
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.debug.LOGGER")
+async def test_slow_callbacks(mocked_logger):
+    loop = asyncio.get_running_loop()
+    try:
+        assert set_slow_callbacks(True, 0.05) is True
+        assert loop.get_debug()
+        assert loop.slow_callback_duration == 0.05
+        assert toggle_slow_callbacks() is False
+        assert not loop.get_debug()
+    finally:
+        loop.set_debug(False)
+    assert mocked_logger.warning.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.debug.LOGGER")
+async def test_profile(mocked_logger, tmp_path):
+    profiler = Profiler(str(tmp_path), max_duration=1)
+    profile = asyncio.ensure_future(profiler.profile(0.2, interval=0.001))
+    await asyncio.sleep(0.01)
+    with pytest.raises(RuntimeError):
+        await profiler.profile(0.1)
+    busy_loop(0.15)
+    path = await profile
+
+    assert os.path.dirname(path) == str(tmp_path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    busy_samples = sum(int(line.rsplit(" ", 1)[1]) for line in lines if "busy_loop" in line)
+    assert busy_samples > 10
+    assert not profiler.running
+
+
+@pytest.mark.asyncio
+async def test_debug_endpoints_disabled():
+    client = await start_client()
+    try:
+        response = await client.get("/debug/tasks")
+    finally:
+        await client.close()
+    assert response.status == 404
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.server.DEBUG_ENDPOINTS_ENABLED", True)
+@patch("prozorro_bridge_frameworkagreement.server.DEBUG_TOKEN", "")
+@patch("prozorro_bridge_frameworkagreement.server.LOGGER")
+async def test_debug_endpoints_without_token(mocked_logger):
+    client = await start_client()
+    try:
+        response = await client.get("/debug/tasks")
+        metrics_response = await client.get("/metrics")
+    finally:
+        await client.close()
+    assert response.status == 404
+    assert metrics_response.status == 200
+    assert mocked_logger.warning.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.server.DEBUG_ENDPOINTS_ENABLED", True)
+@patch("prozorro_bridge_frameworkagreement.server.DEBUG_TOKEN", "secret")
+@patch("prozorro_bridge_frameworkagreement.debug.LOGGER")
+async def test_debug_endpoints(mocked_logger, tmp_path):
+    headers = {"Authorization": "Bearer secret"}
+    client = await start_client()
+    try:
+        response = await client.get("/debug/tasks")
+        assert response.status == 401
+        response = await client.get("/debug/tasks", headers={"Authorization": "Bearer secreT"})
+        assert response.status == 401
+
+        response = await client.get("/debug/tasks", headers=headers)
+        assert response.status == 200
+        assert (await response.json())["count"] >= 1
+
+        response = await client.post("/debug/slow-callbacks?enabled=true&duration=0.5", headers=headers)
+        assert await response.json() == {"enabled": True, "duration": 0.5}
+        response = await client.post("/debug/slow-callbacks", headers=headers)
+        assert (await response.json())["enabled"] is False
+
+        response = await client.post("/debug/profile?duration=soon", headers=headers)
+        assert response.status == 400
+        for interval in ("0", "-1", "0.0001", "nan"):
+            response = await client.post(f"/debug/profile?duration=0.05&interval={interval}", headers=headers)
+            assert response.status == 400
+
+        with patch("prozorro_bridge_frameworkagreement.server.profiler", Profiler(str(tmp_path), 1)):
+            response = await client.post("/debug/profile?duration=0.05", headers=headers)
+        assert response.status == 200
+        assert os.path.exists((await response.json())["path"])
+    finally:
+        asyncio.get_running_loop().set_debug(False)
+        await client.close()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.debug.LOGGER")
+async def test_signal_dumps_tasks(mocked_logger):
+    install_signal_handlers()
+    os.kill(os.getpid(), signal.SIGUSR1)
+    for _ in range(100):
+        if mocked_logger.warning.called:
+            break
+        await asyncio.sleep(0.01)
+    assert "tasks, waiting in" in mocked_logger.warning.call_args_list[0].args[0]
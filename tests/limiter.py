@@ -0,0 +1,152 @@
+from aiohttp import ClientSession
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+
+from benchmarks.mock_api import MockAPI
+from prozorro_bridge_frameworkagreement import bridge
+from prozorro_bridge_frameworkagreement.breaker import AGREEMENT_GET
+from prozorro_bridge_frameworkagreement.limiter import AIMDLimiter
+
+
+def build_limiter(initial=10, min_limit=1, max_limit=100, latency_threshold=1, backoff=0.5):
+    return AIMDLimiter(
+        initial, min_limit=min_limit, max_limit=max_limit, latency_threshold=latency_threshold, backoff=backoff
+    )
+
+
+@pytest.mark.asyncio
+async def test_limit_waits_for_slot():
+    limiter = build_limiter(initial=2)
+    starts = [await limiter.acquire(), await limiter.acquire()]
+    third = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not third.done()
+    assert limiter.in_flight == 2
+
+    limiter.release(starts[0], failed=None)
+    await asyncio.sleep(0)
+    assert third.done()
+    assert limiter.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_frees_queue():
+    limiter = build_limiter(initial=1)
+    start = await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    assert not limiter.waiters
+
+    limiter.release(start, failed=None)
+    assert limiter.in_flight == 0
+    await limiter.acquire()
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_decrease_once_per_congestion():
+    limiter = build_limiter(initial=16)
+    starts = [await limiter.acquire() for _ in range(8)]
+    for start in starts:
+        limiter.release(start, failed=True)
+    # the requests were sent before the first decrease, so only one of them counts
+    assert limiter.limit == 8
+
+    start = await limiter.acquire()
+    limiter.release(start, failed=True)
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_response_decreases():
+    limiter = build_limiter(initial=10, latency_threshold=0.01)
+    start = await limiter.acquire()
+    await asyncio.sleep(0.02)
+    limiter.release(start, failed=False)
+    assert limiter.limit == 5
+
+
+@pytest.mark.asyncio
+async def test_increase_only_when_used():
+    limiter = build_limiter(initial=4)
+    start = await limiter.acquire()
+    limiter.release(start, failed=False)
+    assert limiter.limit == 4
+
+    starts = [await limiter.acquire() for _ in range(4)]
+    for start in starts:
+        limiter.release(start, failed=False)
+    assert limiter.limit > 4
+
+
+@pytest.mark.asyncio
+async def test_limit_bounds():
+    limiter = build_limiter(initial=2, min_limit=2, max_limit=3)
+    start = await limiter.acquire()
+    limiter.release(start, failed=True)
+    assert limiter.limit == 2
+
+    for _ in range(20):
+        starts = [await limiter.acquire() for _ in range(int(limiter.limit))]
+        for start in starts:
+            limiter.release(start, failed=False)
+    assert limiter.limit == 3
+
+
+@pytest.mark.asyncio
+async def test_api_request_releases_limiter():
+    limiter = build_limiter(initial=10)
+    session = MagicMock()
+
+    async def get(url, **kwargs):
+        assert limiter.in_flight == 1
+        return MagicMock(status=503)
+
+    session.get = get
+    with patch("prozorro_bridge_frameworkagreement.bridge.limiter", limiter):
+        response = await bridge.api_request(session, AGREEMENT_GET, "get", "http://localhost/agreements/1")
+
+    assert response.status == 503
+    assert limiter.in_flight == 0
+    assert limiter.limit == 5
+    bridge.breakers[AGREEMENT_GET].results.clear()
+
+
+async def load(api: MockAPI, limiter: AIMDLimiter = None, clients: int = 60, requests: int = 10) -> int:
+    rejected = 0
+
+    async def client(session: ClientSession) -> None:
+        nonlocal rejected
+        for i in range(requests):
+            start = await limiter.acquire() if limiter else None
+            status = None
+            try:
+                async with session.get(f"{api.url}/agreements/{i}") as response:
+                    status = response.status
+            finally:
+                if limiter:
+                    limiter.release(start, status == 429 or status >= 500)
+            if status == 429:
+                rejected += 1
+
+    async with ClientSession() as session:
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+    return rejected
+
+
+@pytest.mark.asyncio
+async def test_limiter_adapts_to_degrading_api():
+    async with MockAPI(latency=0.01, capacity=10, seed=1) as api:
+        unlimited_rejected = await load(api)
+
+    limiter = build_limiter(initial=40, max_limit=100)
+    async with MockAPI(latency=0.01, capacity=10, seed=1) as api:
+        limited_rejected = await load(api, limiter)
+        max_in_flight = api.max_in_flight
+
+    assert limited_rejected < unlimited_rejected / 2
+    assert limiter.limit < 20
+    assert max_in_flight <= 40
@@ -0,0 +1,86 @@
+import io
+import json
+import logging
+import queue
+import sys
+from unittest.mock import patch
+
+from prozorro_bridge_frameworkagreement import logs
+from prozorro_bridge_frameworkagreement.logs import (
+    SamplingFilter,
+    JsonFormatter,
+    DroppingQueueHandler,
+    parse_sampling,
+    setup_logging,
+    stop_logging,
+)
+
+
+def build_record(msg="Skipping tender %s", args=("33",), exc_info=None, **extra):
+    record = logging.LogRecord("bridge", logging.INFO, __file__, 1, msg, args, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_parse_sampling():
+    assert parse_sampling("skip_tender=100, skip_agreement=10") == {"skip_tender": 100, "skip_agreement": 10}
+    assert parse_sampling("") == {}
+
+
+def test_sampling_filter():
+    sampling = SamplingFilter({"skip_tender": 3})
+
+    passed = [sampling.filter(build_record(MESSAGE_ID="skip_tender")) for _ in range(7)]
+
+    assert passed == [True, False, False, True, False, False, True]
+    assert sampling.filter(build_record(MESSAGE_ID="exception"))
+    assert sampling.filter(build_record())
+
+
+def test_json_formatter():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = build_record(exc_info=sys.exc_info(), MESSAGE_ID="skip_tender", JOURNAL_TENDER_ID="33")
+
+    data = json.loads(JsonFormatter().format(record))
+
+    assert data["message"] == "Skipping tender 33"
+    assert data["level"] == "INFO"
+    assert data["MESSAGE_ID"] == "skip_tender"
+    assert data["JOURNAL_TENDER_ID"] == "33"
+    assert "ValueError: boom" in data["exception"]
+    assert "\n" not in JsonFormatter().format(record)
+
+
+def test_dropping_queue_handler():
+    handler = DroppingQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(build_record())
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    record = handler.queue.get_nowait()
+    assert record.msg == "Skipping tender 33"
+    assert record.args is None
+
+
+def test_setup_logging():
+    logger = logging.getLogger("test_setup_logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    stream = io.StringIO()
+    logger.addHandler(logging.StreamHandler(stream))
+
+    with patch.object(logs, "LOG_FORMAT", "json"), patch.object(logs, "LOG_SAMPLING", "skip_tender=2"), \
+            patch.object(logs, "LOG_ASYNC", True):
+        setup_logging(logger)
+    try:
+        assert isinstance(logger.handlers[0], DroppingQueueHandler)
+        for i in range(4):
+            logger.info("Skipping tender %s", i, extra={"MESSAGE_ID": "skip_tender"})
+    finally:
+        stop_logging()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [r["message"] for r in records] == ["Skipping tender 0", "Skipping tender 2"]
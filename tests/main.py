@@ -1,15 +1,23 @@
+import asyncio
 from copy import deepcopy
+from datetime import datetime
 import json
 import pytest
+import tracemalloc
 from unittest.mock import patch, MagicMock, AsyncMock
-from datetime import datetime
 
-from prozorro_bridge_frameworkagreement.utils import check_tender
+from prozorro_bridge_frameworkagreement.utils import check_tender, project_tender
+from prozorro_bridge_frameworkagreement.storage import AGREEMENT, TENDER, TENDER_VERSION, SyncedIndex
+from prozorro_bridge_frameworkagreement.retry import RetryExhausted
+from prozorro_bridge_frameworkagreement.metrics import JOURNAL_MESSAGES
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_SKIP_TENDER, DATABRIDGE_SKIP_AGREEMENT
+from benchmarks.data import cfaua_tender, heavy_fields
 from prozorro_bridge_frameworkagreement.bridge import (
     get_tender_credentials,
     get_tender,
     get_tender_agreements,
     fill_agreement,
+    fill_credentials,
     post_agreement,
     check_and_patch_agreements,
     patch_tender,
@@ -17,46 +25,6 @@ from prozorro_bridge_frameworkagreement.bridge import (
 )
 
 
-@pytest.fixture
-def credentials():
-    return {"data": {"owner": "user1", "tender_token": "000000"}}
-
-
-@pytest.fixture
-def error_data():
-    return {"error": "No permission"}
-
-
-@pytest.fixture
-def agreement_data():
-    return {
-        "id": "11111111111111111111111111111111",
-        "status": "active",
-        "contracts": [
-            {"id": "44", "status": "active", "suppliers": [], "unitPrices": []},
-            {"id": "44", "status": "cancelled", "suppliers": [], "unitPrices": []},
-        ]
-    }
-
-
-@pytest.fixture
-def tender_data(agreement_data):
-    draft_agreement = deepcopy(agreement_data)
-    draft_agreement["status"] = "draft"
-    return {
-        "id": "33",
-        "dateModified": str(datetime.now()),
-        "procurementMethodType": "closeFrameworkAgreementUA",
-        "status": "active.awarded",
-        "mode": "test",
-        "procuringEntity": {"contactPoint": {}, "additionalContactPoints": []},
-        "agreements": [draft_agreement, deepcopy(agreement_data)],
-        "lots": [
-            {"id": "lot_1", "status": "active"}
-        ],
-    }
-
-
 @pytest.mark.asyncio
 async def test_check_tender(tender_data, agreement_data):
     value = check_tender(tender_data)
@@ -82,13 +50,41 @@ async def test_check_tender(tender_data, agreement_data):
     assert value is False
 
 
+def test_project_tender(tender_data):
+    assert project_tender(tender_data) == tender_data
+
+    tender = dict(tender_data, **heavy_fields(bids=1, documents=1))
+    tender["lots"] = [{"id": "lot_1", "status": "active", "title": "Лот 1", "value": {"amount": 1}}]
+    projection = project_tender(tender)
+    assert projection == tender_data
+    assert projection["agreements"] is tender["agreements"]
+    assert check_tender(projection)
+
+
+def test_project_tender_releases_page():
+    tracemalloc.start()
+    try:
+        page = json.dumps([dict(cfaua_tender(lots=2), **heavy_fields(bids=40)) for _ in range(50)]).encode()
+        start, _ = tracemalloc.get_traced_memory()
+        items = json.loads(page)
+        full, _ = tracemalloc.get_traced_memory()
+        projections = [project_tender(item) for item in items]
+        del items
+        projected, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(projections) == 50
+    assert projected - start < (full - start) / 3
+
+
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_get_tender_credentials(mocked_logger, credentials, error_data):
     session_mock = AsyncMock()
     session_mock.get = AsyncMock(side_effect=[
         MagicMock(status=403, text=AsyncMock(return_value=error_data)),
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps(credentials))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
     ])
 
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
@@ -101,13 +97,28 @@ async def test_get_tender_credentials(mocked_logger, credentials, error_data):
     assert mocked_sleep.await_count == 1
 
 
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_get_tender_credentials_exhausted(mocked_logger, error_data):
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(return_value=MagicMock(status=502, text=AsyncMock(return_value=error_data)))
+
+    with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep, \
+            patch("prozorro_bridge_frameworkagreement.bridge.retry_policy.max_attempts", 3):
+        with pytest.raises(RetryExhausted):
+            await get_tender_credentials("34", session_mock)
+
+    assert session_mock.get.await_count == 4
+    assert mocked_sleep.await_count == 3
+
+
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_get_tender(mocked_logger, tender_data, error_data):
     session_mock = AsyncMock()
     session_mock.get = AsyncMock(side_effect=[
         MagicMock(status=403, text=AsyncMock(return_value=error_data)),
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": tender_data}))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
     ])
 
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
@@ -124,7 +135,7 @@ async def test_get_tender(mocked_logger, tender_data, error_data):
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_get_tender_agreements_not_found(mocked_logger, agreement_data, tender_data):
     session_mock = AsyncMock()
-    session_mock.get = AsyncMock(side_effect=[
+    session_mock.head = AsyncMock(side_effect=[
         MagicMock(status=404, text=AsyncMock(return_value=json.dumps({"error": "Not found"}))),
     ])
 
@@ -132,52 +143,163 @@ async def test_get_tender_agreements_not_found(mocked_logger, agreement_data, te
     async for i in get_tender_agreements(tender_data, session_mock):
         data.append(i)
 
-    assert session_mock.get.await_count == 1
+    assert session_mock.head.await_count == 1
     assert mocked_logger.info.call_count == 2
     assert data == [agreement_data]
 
 
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
-async def test_get_tender_agreements_found(mocked_logger, agreement_data, tender_data):
+async def test_get_tender_agreements_found(mocked_logger, agreement_data, tender_data, synced_index, monkeypatch):
     session_mock = AsyncMock()
-    session_mock.get = AsyncMock(side_effect=[
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": agreement_data}))),
+    session_mock.head = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
     ])
     data = []
     async for i in get_tender_agreements(tender_data, session_mock):
         data.append(i)
-    assert session_mock.get.await_count == 1
+    assert session_mock.head.await_count == 1
     assert mocked_logger.info.call_count == 2
     assert data == []
+    assert await synced_index.contains(AGREEMENT, agreement_data["id"])
 
-    session_mock.get = AsyncMock(side_effect=[
+    # the found agreement is remembered, so it isn't probed again
+    session_mock.head = AsyncMock()
+    data = [i async for i in get_tender_agreements(tender_data, session_mock)]
+    assert session_mock.head.await_count == 0
+    assert data == []
+
+    monkeypatch.setattr("prozorro_bridge_frameworkagreement.bridge.synced_index", SyncedIndex(size=1000))
+    mocked_logger.reset_mock()
+    session_mock.head = AsyncMock(side_effect=[
         MagicMock(status=410, text=AsyncMock(return_value=json.dumps({"data": agreement_data}))),
     ])
     data = []
     async for i in get_tender_agreements(tender_data, session_mock):
         data.append(i)
-    assert session_mock.get.await_count == 1
-    assert mocked_logger.info.call_count == 4
+    assert session_mock.head.await_count == 1
+    assert mocked_logger.info.call_count == 2
     assert data == []
 
 
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
-async def test_fill_agreement(mocked_logger, agreement_data, credentials, tender_data):
+async def test_get_tender_agreements_retry(mocked_logger, agreement_data, tender_data, error_data):
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[
+        MagicMock(status=502, text=AsyncMock(return_value=json.dumps(error_data))),
+        ConnectionResetError(),
+        MagicMock(status=404, text=AsyncMock(return_value=json.dumps({"error": "Not found"}))),
+    ])
+
+    with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        data = [i async for i in get_tender_agreements(tender_data, session_mock)]
+
+    assert session_mock.head.await_count == 3
+    assert mocked_logger.warning.call_count == 2
+    assert mocked_logger.exception.call_count == 2
+    assert mocked_sleep.await_count == 2
+    assert data == [agreement_data]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.AGREEMENTS_PROBE_CONCURRENCY", 2)
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_get_tender_agreements_concurrent_order(mocked_logger, agreement_data, tender_data):
+    tender_data["agreements"] = []
+    for i in range(6):
+        agreement = deepcopy(agreement_data)
+        agreement["id"] = str(i)
+        tender_data["agreements"].append(agreement)
+    running = 0
+    max_running = 0
+
+    async def head(url, headers):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        agreement_id = url.rsplit("/", 1)[1]
+        # later agreements answer first
+        await asyncio.sleep(0.01 * (6 - int(agreement_id)))
+        running -= 1
+        return MagicMock(status=200 if agreement_id == "3" else 404)
+
+    session_mock = AsyncMock()
+    session_mock.head = head
+    data = [i["id"] async for i in get_tender_agreements(tender_data, session_mock)]
+
+    assert data == ["0", "1", "2", "4", "5"]
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_get_tender_agreements_releases_probes(mocked_logger, agreement_data, tender_data):
+    response = MagicMock(status=404)
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[response])
+
+    data = [i async for i in get_tender_agreements(tender_data, session_mock)]
+
+    assert data == [agreement_data]
+    assert session_mock.get.await_count == 0
+    response.release.assert_called_once()
+    response.read.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.probe_method", "head")
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_get_tender_agreements_head_not_allowed(mocked_logger, agreement_data, tender_data):
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=405)])
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=404, read=AsyncMock(return_value=b"")),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
+    ])
+
+    data = [i async for i in get_tender_agreements(tender_data, session_mock)]
+    assert data == [agreement_data]
+    data = [i async for i in get_tender_agreements(tender_data, session_mock)]
+    assert data == []
+
+    assert session_mock.head.await_count == 1
+    assert session_mock.get.await_count == 2
+    assert mocked_logger.warning.call_count == 1
+
+
+def test_fill_agreement(agreement_data, tender_data):
     assert len(agreement_data["contracts"]) == 2
+
+    fill_agreement(agreement_data, tender_data)
+
+    assert agreement_data["tender_id"] == tender_data["id"]
+    assert agreement_data["procuringEntity"] == tender_data["procuringEntity"]
+    assert len(agreement_data["contracts"]) == 1
+    assert "tender_token" not in agreement_data
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_fill_credentials_cached(mocked_logger, agreement_data, credentials, tender_data):
     session_mock = AsyncMock()
     session_mock.get = AsyncMock(side_effect=[
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps(credentials))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
     ])
+    agreement_data["tender_id"] = tender_data["id"]
+    first_agreement, second_agreement = deepcopy(agreement_data), deepcopy(agreement_data)
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
-        await fill_agreement(agreement_data, tender_data, session_mock)
+        await asyncio.gather(
+            fill_credentials(first_agreement, session_mock),
+            fill_credentials(second_agreement, session_mock),
+        )
+        await fill_credentials(deepcopy(agreement_data), session_mock)
 
     assert session_mock.get.await_count == 1
     assert mocked_logger.info.call_count == 2
     assert mocked_sleep.await_count == 0
-    assert agreement_data["procuringEntity"] == tender_data["procuringEntity"]
-    assert len(agreement_data["contracts"]) == 1
+    assert first_agreement["tender_token"] == credentials["data"]["tender_token"]
+    assert second_agreement["tender_token"] == credentials["data"]["tender_token"]
 
 
 @pytest.mark.asyncio
@@ -187,7 +309,7 @@ async def test_post_agreement_positive(mocked_logger, agreement_data, error_data
     session_mock = AsyncMock()
     session_mock.post = AsyncMock(side_effect=[
         MagicMock(status=500, text=AsyncMock(return_value=json.dumps(error_data))),
-        MagicMock(status=201, text=AsyncMock(return_value=json.dumps({"data": agreement_data}))),
+        MagicMock(status=201, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
     ])
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         data = await post_agreement(agreement_data, session_mock)
@@ -220,32 +342,90 @@ async def test_post_agreement_negative(mocked_logger, agreement_data, error_data
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_check_and_patch_agreements(mocked_logger, tender_data, agreement_data, error_data):
+    # /agreements body as the bridge created it from the CFAUA tender
+    agreement = deepcopy(agreement_data)
+    fill_agreement(agreement, tender_data)
+    agreement["owner"] = "user1"
+    # the selection tender has the agreement without the fields that exist only on /agreements
+    tender_agreement = {k: v for k, v in agreement.items() if k in agreement_data}
+    draft_agreement = dict(tender_agreement, status="draft")
+    tender_data["agreements"] = [draft_agreement, tender_agreement]
     session_mock = AsyncMock()
     session_mock.get = AsyncMock(side_effect=[
-        MagicMock(status=200, json=AsyncMock(return_value={"data": deepcopy(agreement_data)})),
-        MagicMock(status=200, json=AsyncMock(return_value={"data": agreement_data})),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement}).encode())),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement}).encode())),
     ])
-    session_mock.patch = AsyncMock(side_effect=[MagicMock(), MagicMock()])
+    session_mock.patch = AsyncMock(side_effect=[MagicMock(status=200)])
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         data = await check_and_patch_agreements(tender_data["agreements"], tender_data["id"], session_mock)
     assert session_mock.get.await_count == 2
-    assert session_mock.patch.await_count == 2
-    assert mocked_logger.info.call_count == 4
+    # the second agreement in tender is the same as in /agreements
+    assert session_mock.patch.await_count == 1
+    assert session_mock.patch.await_args.args[0].endswith(f"/tenders/33/agreements/{agreement_data['id']}")
+    assert json.loads(session_mock.patch.await_args.kwargs["data"]) == {"data": {"status": "active"}}
+    assert mocked_logger.info.call_count == 3
+    assert mocked_logger.debug.call_count == 1
     assert mocked_logger.warning.call_count == 0
     assert mocked_sleep.await_count == 0
     assert data is True
 
 
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_check_and_patch_agreements_patch_retry(mocked_logger, tender_data, agreement_data, error_data):
+    agreement_data["documents"] = [{"id": "doc"}]
+    agreement_data["dateModified"] = str(datetime.now())
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
+    ])
+    session_mock.patch = AsyncMock(side_effect=[
+        MagicMock(status=502, text=AsyncMock(return_value=json.dumps(error_data))),
+        MagicMock(status=422, text=AsyncMock(return_value=json.dumps(error_data))),
+    ])
+    with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        with pytest.raises(RetryExhausted):
+            await check_and_patch_agreements(tender_data["agreements"][:1], tender_data["id"], session_mock)
+    assert session_mock.patch.await_count == 2
+    assert json.loads(session_mock.patch.await_args.kwargs["data"]) == {"data": {"status": "active"}}
+    assert mocked_logger.warning.call_count == 1
+    assert mocked_logger.error.call_count == 1
+    assert mocked_sleep.await_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_agreement_not_patched(mocked_logger, tender_data, agreement_data, error_data):
+    tender_data["procurementMethodType"] = "closeFrameworkAgreementSelectionUA"
+    tender_data["status"] = "draft.pending"
+    tender_data["agreements"] = tender_data["agreements"][:1]
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
+    ])
+    session_mock.patch = AsyncMock(side_effect=[
+        MagicMock(status=403, text=AsyncMock(return_value=json.dumps(error_data))),
+    ])
+
+    with pytest.raises(RetryExhausted):
+        await process_tender(session_mock, tender_data)
+
+    # only the agreement PATCH, the tender status isn't changed
+    assert session_mock.patch.await_count == 1
+    assert "/agreements/" in session_mock.patch.await_args.args[0]
+
+
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_check_and_patch_agreements_not_found(mocked_logger, tender_data, error_data):
     session_mock = AsyncMock()
     session_mock.get = AsyncMock(side_effect=[
         MagicMock(status=404, text=AsyncMock(return_value=json.dumps(error_data))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": {"id": "1"}}).encode())),
     ])
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         data = await check_and_patch_agreements(tender_data["agreements"], tender_data["id"], session_mock)
-    assert session_mock.get.await_count == 1
+    assert session_mock.get.await_count == 2
     assert session_mock.patch.await_count == 0
     assert mocked_logger.info.call_count == 0
     assert mocked_logger.warning.call_count == 1
@@ -265,7 +445,7 @@ async def test_patch_tender_unsuccessful_negative(mocked_logger, tender_data, er
         await patch_tender(tender_data, False, session_mock)
 
     assert session_mock.patch.await_count == 2
-    assert session_mock.patch.await_args.kwargs["json"]["data"]["status"] == "draft.unsuccessful"
+    assert json.loads(session_mock.patch.await_args.kwargs["data"])["data"]["status"] == "draft.unsuccessful"
     assert mocked_logger.info.call_count == 2
     assert mocked_logger.error.call_count == 1
     assert mocked_logger.warning.call_count == 1
@@ -278,13 +458,13 @@ async def test_patch_tender_unsuccessful_positive(mocked_logger, tender_data, er
     session_mock = AsyncMock()
     session_mock.patch = AsyncMock(side_effect=[
         MagicMock(status=500, text=AsyncMock(return_value=json.dumps(error_data))),
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps({}))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({}).encode())),
     ])
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         await patch_tender(tender_data, False, session_mock)
 
     assert session_mock.patch.await_count == 2
-    assert session_mock.patch.await_args.kwargs["json"]["data"]["status"] == "draft.unsuccessful"
+    assert json.loads(session_mock.patch.await_args.kwargs["data"])["data"]["status"] == "draft.unsuccessful"
     assert mocked_logger.info.call_count == 3
     assert mocked_logger.error.call_count == 0
     assert mocked_logger.warning.call_count == 1
@@ -297,13 +477,13 @@ async def test_patch_tender_active_positive(mocked_logger, tender_data, error_da
     session_mock = AsyncMock()
     session_mock.patch = AsyncMock(side_effect=[
         MagicMock(status=500, text=AsyncMock(return_value=json.dumps(error_data))),
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps({}))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({}).encode())),
     ])
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         await patch_tender(tender_data, True, session_mock)
 
     assert session_mock.patch.await_count == 2
-    assert session_mock.patch.await_args.kwargs["json"]["data"]["status"] == "active.enquiries"
+    assert json.loads(session_mock.patch.await_args.kwargs["data"])["data"]["status"] == "active.enquiries"
     assert mocked_logger.info.call_count == 3
     assert mocked_logger.error.call_count == 0
     assert mocked_logger.warning.call_count == 1
@@ -314,19 +494,20 @@ async def test_patch_tender_active_positive(mocked_logger, tender_data, error_da
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_process_tender_positive(mocked_logger, tender_data, agreement_data, credentials, error_data):
     session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=404)])
     session_mock.get = AsyncMock(side_effect=[
-        MagicMock(status=404, text=AsyncMock(return_value=json.dumps(error_data))),
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps(credentials))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
     ])
     session_mock.post = AsyncMock(side_effect=[
-        MagicMock(status=201, text=AsyncMock(return_value=json.dumps({"data": agreement_data}))),
+        MagicMock(status=201, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
     ])
 
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         await process_tender(session_mock, tender_data)
 
     assert session_mock.post.await_count == 1
-    assert session_mock.get.await_count == 2
+    assert session_mock.head.await_count == 1
+    assert session_mock.get.await_count == 1
     assert session_mock.patch.await_count == 0
     assert mocked_logger.info.call_count == 6
     assert mocked_logger.error.call_count == 0
@@ -334,6 +515,38 @@ async def test_process_tender_positive(mocked_logger, tender_data, agreement_dat
     assert mocked_sleep.await_count == 0
 
 
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_synced(mocked_logger, tender_data, agreement_data, synced_index):
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": agreement_data}).encode())),
+    ])
+
+    await process_tender(session_mock, tender_data)
+    assert session_mock.head.await_count == 1
+    assert await synced_index.contains(AGREEMENT, agreement_data["id"])
+
+    await process_tender(session_mock, tender_data)
+    assert session_mock.head.await_count == 1
+    assert session_mock.post.await_count == 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_selective_synced(mocked_logger, tender_data, synced_index):
+    tender_data["procurementMethodType"] = "closeFrameworkAgreementSelectionUA"
+    tender_data["status"] = "draft.pending"
+    await synced_index.add(TENDER, tender_data["id"])
+    session_mock = AsyncMock()
+
+    await process_tender(session_mock, tender_data)
+
+    assert session_mock.get.await_count == 0
+    assert session_mock.patch.await_count == 0
+    assert mocked_logger.debug.call_count == 1
+
+
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_process_tender_skip(mocked_logger, tender_data):
@@ -351,6 +564,123 @@ async def test_process_tender_skip(mocked_logger, tender_data):
     assert mocked_logger.warning.call_count == 0
 
 
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_skip_messages_counted_without_debug(mocked_logger, tender_data, agreement_data, synced_index):
+    mocked_logger.isEnabledFor.return_value = False
+    skipped_tenders = JOURNAL_MESSAGES.get(DATABRIDGE_SKIP_TENDER)
+    skipped_agreements = JOURNAL_MESSAGES.get(DATABRIDGE_SKIP_AGREEMENT)
+
+    await process_tender(AsyncMock(), dict(tender_data, status="active.tendering"))
+    await synced_index.add(AGREEMENT, agreement_data["id"])
+    data = [i async for i in get_tender_agreements(tender_data, AsyncMock())]
+
+    assert data == []
+    assert mocked_logger.debug.call_count == 0
+    assert JOURNAL_MESSAGES.get(DATABRIDGE_SKIP_TENDER) == skipped_tenders + 1
+    assert JOURNAL_MESSAGES.get(DATABRIDGE_SKIP_AGREEMENT) == skipped_agreements + 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_fetches_heavy_fields(mocked_logger, tender_data, agreement_data, credentials):
+    feed_item = {key: tender_data[key] for key in ("id", "dateModified", "status", "procurementMethodType", "lots")}
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=200)])
+
+    await process_tender(session_mock, feed_item)
+
+    assert session_mock.get.await_count == 1
+    assert session_mock.head.await_count == 1
+    assert session_mock.get.await_args_list[0].args[0].endswith(f"/tenders/{tender_data['id']}")
+    assert session_mock.post.await_count == 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_synced_not_fetched(mocked_logger, tender_data, agreement_data, synced_index):
+    feed_item = {key: tender_data[key] for key in ("id", "dateModified", "status", "procurementMethodType", "lots")}
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=200)])
+
+    for _ in range(3):
+        await process_tender(session_mock, dict(feed_item))
+
+    # only the first run fetches the tender, its version is synced once the agreement is confirmed
+    assert session_mock.get.await_count == 1
+    assert session_mock.head.await_count == 1
+    assert await synced_index.contains(TENDER_VERSION, f"{tender_data['id']}:{tender_data['dateModified']}")
+
+    # a new version is fetched again, its agreement is already confirmed
+    await process_tender(session_mock, dict(feed_item, dateModified="2030-01-01T00:00:00+02:00"))
+    assert session_mock.get.await_count == 2
+    assert session_mock.head.await_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_selective_synced_not_fetched(mocked_logger, tender_data, synced_index):
+    tender_data["procurementMethodType"] = "closeFrameworkAgreementSelectionUA"
+    tender_data["status"] = "draft.pending"
+    feed_item = {key: tender_data[key] for key in ("id", "dateModified", "status", "procurementMethodType", "lots")}
+    await synced_index.add(TENDER, tender_data["id"])
+    session_mock = AsyncMock()
+
+    await process_tender(session_mock, feed_item)
+
+    assert session_mock.get.await_count == 0
+    assert session_mock.patch.await_count == 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_selective_fetches_agreements(mocked_logger, tender_data, error_data):
+    tender_data["procurementMethodType"] = "closeFrameworkAgreementSelectionUA"
+    tender_data["status"] = "draft.pending"
+    # procuringEntity alone doesn't make the item complete, the selection path reads agreements
+    fields = ("id", "dateModified", "status", "procurementMethodType", "procuringEntity")
+    feed_item = {key: tender_data[key] for key in fields}
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+        MagicMock(status=404, text=AsyncMock(return_value=json.dumps(error_data))),
+        MagicMock(status=404, text=AsyncMock(return_value=json.dumps(error_data))),
+    ])
+    session_mock.patch = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+
+    await process_tender(session_mock, feed_item)
+
+    assert session_mock.get.await_args_list[0].args[0].endswith(f"/tenders/{tender_data['id']}")
+    assert session_mock.get.await_count == 3
+    assert session_mock.patch.await_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_fetched_tender_skip(mocked_logger, tender_data):
+    feed_item = {key: tender_data[key] for key in ("id", "dateModified", "status", "procurementMethodType", "lots")}
+    tender_data["status"] = "cancelled"
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+
+    await process_tender(session_mock, feed_item)
+
+    assert session_mock.get.await_count == 1
+    assert session_mock.post.await_count == 0
+    assert mocked_logger.debug.call_count == 1
+
+
 @pytest.mark.asyncio
 @patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
 async def test_process_tender_selective_positive(mocked_logger, tender_data, agreement_data, credentials, error_data):
@@ -359,15 +689,16 @@ async def test_process_tender_selective_positive(mocked_logger, tender_data, agr
     session_mock = AsyncMock()
     session_mock.get = AsyncMock(side_effect=[
         MagicMock(status=404, text=AsyncMock(return_value=json.dumps(error_data))),
+        MagicMock(status=404, text=AsyncMock(return_value=json.dumps(error_data))),
     ])
     session_mock.patch = AsyncMock(side_effect=[
-        MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": tender_data}))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
     ])
 
     with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         await process_tender(session_mock, tender_data)
 
-    assert session_mock.get.await_count == 1
+    assert session_mock.get.await_count == 2
     assert session_mock.patch.await_count == 1
     assert mocked_logger.info.call_count == 2
     assert mocked_logger.error.call_count == 0
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestServer, TestClient
+
+from prozorro_bridge_frameworkagreement.metrics import Counter, Gauge, Histogram, Registry, JOURNAL_MESSAGES
+
+
+def test_counter_and_gauge_render():
+    counter = Counter("requests_total", "Requests", ("endpoint",))
+    counter.inc("agreements")
+    counter.inc("agreements", amount=2)
+    counter.inc('te"nders')
+    gauge = Gauge("in_flight", "In flight")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    registry = Registry()
+    registry.register(counter)
+    registry.register(gauge)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{endpoint="agreements"} 3.0\n'
+        'requests_total{endpoint="te\\"nders"} 1.0\n'
+        "# HELP in_flight In flight\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 1\n"
+    )
+
+
+def test_gauge_function():
+    gauge = Gauge("circuit_state", "State", ("endpoint",))
+    state = {"value": 0}
+    gauge.set_function(lambda: {("credentials",): state["value"]})
+    state["value"] = 2
+    assert gauge.samples() == ['circuit_state{endpoint="credentials"} 2']
+
+
+@pytest.mark.asyncio
+async def test_histogram_timed():
+    histogram = Histogram("duration_seconds", "Duration", ("stage",), buckets=(0.01, 1))
+
+    @histogram.timed("post")
+    async def post():
+        await asyncio.sleep(0.02)
+
+    @histogram.timed("check")
+    def check():
+        return True
+
+    await post()
+    assert check() is True
+    histogram.observe(5, "post")
+
+    samples = histogram.samples()
+    assert 'duration_seconds_bucket{stage="check",le="0.01"} 1' in samples
+    assert 'duration_seconds_bucket{stage="post",le="0.01"} 0' in samples
+    assert 'duration_seconds_bucket{stage="post",le="1.0"} 1' in samples
+    assert 'duration_seconds_bucket{stage="post",le="+Inf"} 2' in samples
+    assert 'duration_seconds_count{stage="post"} 2' in samples
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    from prozorro_bridge_frameworkagreement.server import build_app
+    from prozorro_bridge_frameworkagreement.utils import journal_context
+
+    journal_context({"MESSAGE_ID": "test_message"}, {"TENDER_ID": "33"})
+    assert JOURNAL_MESSAGES.get("test_message") >= 1
+
+    client = TestClient(TestServer(build_app()))
+    await client.start_server()
+    try:
+        response = await client.get("/metrics")
+        text = await response.text()
+    finally:
+        await client.close()
+
+    assert response.status == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert 'bridge_journal_messages_total{message_id="test_message"}' in text
+    assert 'bridge_circuit_state{endpoint="agreement_post"} 0' in text
@@ -0,0 +1,139 @@
+from aiohttp import web, ClientSession
+from aiohttp.test_utils import TestServer
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_frameworkagreement.bridge import get_tender_agreements, mirror as bridge_mirror
+from prozorro_bridge_frameworkagreement.mirror import AgreementsMirror
+
+
+class Feed:
+    def __init__(self, count: int) -> None:
+        self.items = [{"id": f"agreement_{i}", "dateModified": f"2021-01-01T00:00:{i % 60:02}"} for i in range(count)]
+        self.requests = []
+        self.errors = 0
+
+    async def handler(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.query))
+        if self.errors:
+            self.errors -= 1
+            return web.json_response({"errors": ["Service Unavailable"]}, status=503)
+        offset = int(request.query.get("offset", 0))
+        page = self.items[offset:offset + int(request.query["limit"])]
+        return web.json_response({"data": page, "next_page": {"offset": str(offset + len(page))}})
+
+
+async def start_feed(feed: Feed) -> TestServer:
+    app = web.Application()
+    app.router.add_get("/agreements", feed.handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def build_mirror(server: TestServer, path: str = None) -> AgreementsMirror:
+    return AgreementsMirror(
+        f"http://{server.host}:{server.port}/agreements",
+        {},
+        page_limit=100,
+        poll_interval=0.01,
+        save_interval=0,
+        path=path,
+    )
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.mirror.LOGGER")
+async def test_mirror_follows_feed(mocked_logger):
+    feed = Feed(250)
+    server = await start_feed(feed)
+    mirror = build_mirror(server)
+    try:
+        async with ClientSession() as session:
+            mirror.start(session)
+            await asyncio.wait_for(mirror.ready.wait(), 5)
+            assert len(mirror.agreements) == 250
+            assert "agreement_249" in mirror
+            assert mirror.lag < 1
+
+            feed.items.append({"id": "new", "dateModified": "2021-02-01T00:00:00"})
+            for _ in range(100):
+                if "new" in mirror:
+                    break
+                await asyncio.sleep(0.01)
+            assert mirror.agreements["new"] == "2021-02-01T00:00:00"
+            await mirror.stop()
+    finally:
+        await server.close()
+
+    assert feed.requests[0] == {"feed": "changes", "limit": "100"}
+    assert feed.requests[1]["offset"] == "100"
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.mirror.LOGGER")
+async def test_mirror_retries_feed_errors(mocked_logger):
+    feed = Feed(10)
+    feed.errors = 2
+    server = await start_feed(feed)
+    mirror = build_mirror(server)
+    try:
+        async with ClientSession() as session:
+            mirror.start(session)
+            await asyncio.wait_for(mirror.ready.wait(), 5)
+            await mirror.stop()
+    finally:
+        await server.close()
+
+    assert len(mirror.agreements) == 10
+    assert mocked_logger.warning.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.mirror.LOGGER")
+async def test_mirror_saved_and_loaded(mocked_logger, tmp_path):
+    path = str(tmp_path / "mirror.json")
+    feed = Feed(150)
+    server = await start_feed(feed)
+    try:
+        async with ClientSession() as session:
+            mirror = build_mirror(server, path)
+            mirror.start(session)
+            await asyncio.wait_for(mirror.ready.wait(), 5)
+            await mirror.stop()
+
+            feed.requests.clear()
+            restarted = build_mirror(server, path)
+            restarted.start(session)
+            await asyncio.wait_for(restarted.ready.wait(), 5)
+            await restarted.stop()
+    finally:
+        await server.close()
+
+    assert restarted.agreements == mirror.agreements
+    # continues from the saved offset instead of the start of the feed
+    assert feed.requests[0]["offset"] == "150"
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.MIRROR_ENABLED", True)
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_get_tender_agreements_mirror(mocked_logger, agreement_data, tender_data):
+    unknown_agreement = dict(agreement_data, id="unknown")
+    tender_data["agreements"].append(unknown_agreement)
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=404)])
+
+    with patch.dict("prozorro_bridge_frameworkagreement.bridge.mirror.agreements", {agreement_data["id"]: ""}):
+        data = [i async for i in get_tender_agreements(tender_data, session_mock)]
+
+    assert data == [unknown_agreement]
+    assert session_mock.head.await_count == 1
+    assert session_mock.head.await_args.args[0].endswith("/agreements/unknown")
+
+
+def test_bridge_mirror_sends_no_token():
+    # the feed is read from PUBLIC_API_HOST, the bot token is sent to API_HOST only
+    assert "Authorization" not in bridge_mirror.headers
+    assert "User-Agent" in bridge_mirror.headers
@@ -0,0 +1,300 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import patch, AsyncMock, MagicMock
+from pymongo.errors import AutoReconnect
+
+from prozorro_bridge_frameworkagreement.outbox import Outbox
+from prozorro_bridge_frameworkagreement.retry import RetryExhausted
+from prozorro_bridge_frameworkagreement.bridge import (
+    process_tender,
+    send_outbox_item,
+    OUTBOX_AGREEMENT,
+    OUTBOX_TENDER_STATUS,
+)
+
+
+class MemoryCollection:
+    """The part of a motor collection the outbox uses"""
+
+    def __init__(self) -> None:
+        self.documents = {}
+        self.fail_deletes = 0
+
+    @staticmethod
+    def matches(document: dict, query: dict) -> bool:
+        for key, condition in query.items():
+            value = document.get(key)
+            if isinstance(condition, dict):
+                if "$lte" in condition and not value <= condition["$lte"]:
+                    return False
+                if "$nin" in condition and value in condition["$nin"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def find(self, query: dict) -> MagicMock:
+        documents = sorted(
+            (dict(d) for d in self.documents.values() if self.matches(d, query)),
+            key=lambda d: d["nextTry"],
+        )
+        cursor = MagicMock()
+        cursor.sort.return_value = cursor
+        cursor.limit.side_effect = lambda limit: MagicMock(to_list=AsyncMock(return_value=documents[:limit]))
+        return cursor
+
+    async def create_index(self, keys: list) -> None:
+        pass
+
+    async def replace_one(self, query: dict, document: dict, upsert: bool = False) -> None:
+        self.documents[query["_id"]] = dict(document, _id=query["_id"])
+
+    async def update_one(self, query: dict, update: dict) -> MagicMock:
+        document = self.documents.get(query["_id"])
+        if document is None or not self.matches(document, query):
+            return MagicMock(modified_count=0)
+        document.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + amount
+        return MagicMock(modified_count=1)
+
+    async def delete_one(self, query: dict) -> None:
+        if self.fail_deletes:
+            self.fail_deletes -= 1
+            raise AutoReconnect()
+        document = self.documents.get(query["_id"])
+        if document is not None and self.matches(document, query):
+            del self.documents[query["_id"]]
+
+
+def build_outbox(collection, concurrency=2):
+    return Outbox(
+        lambda: collection,
+        batch_size=10,
+        concurrency=concurrency,
+        poll_interval=1,
+        retry_interval=60,
+        lease_interval=600,
+    )
+
+
+async def wait_until(condition, timeout: float = 1) -> None:
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Condition is not met")
+
+
+@pytest.mark.asyncio
+async def test_outbox_put():
+    collection = MemoryCollection()
+    outbox = build_outbox(collection)
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1"})
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1", "tender_id": "33"})
+
+    assert list(collection.documents) == ["agreement:1"]
+    assert collection.documents["agreement:1"]["payload"] == {"id": "1", "tender_id": "33"}
+    assert collection.documents["agreement:1"]["attempts"] == 0
+
+
+@pytest.mark.asyncio
+async def test_outbox_claim():
+    collection = MemoryCollection()
+    outbox = build_outbox(collection)
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1"})
+    await outbox.put(OUTBOX_AGREEMENT, "2", {"id": "2"})
+
+    claimed = await outbox.claim(10)
+
+    assert [item["_id"] for item in claimed] == ["agreement:1", "agreement:2"]
+    assert collection.documents["agreement:1"]["nextTry"] > datetime.utcnow()
+    # leased items aren't claimed again, by this or another sender
+    assert await outbox.claim(10) == []
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.outbox.LOGGER")
+async def test_outbox_sends_items(mocked_logger):
+    collection = MemoryCollection()
+    outbox = build_outbox(collection)
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1"})
+    await outbox.put(OUTBOX_TENDER_STATUS, "2", {"tender_id": "2"})
+    sender = AsyncMock(side_effect=[None, RetryExhausted("Gave up after 10 retries")])
+
+    outbox.start(MagicMock(), sender)
+    await wait_until(lambda: sender.await_count == 2 and not outbox.sending)
+    await outbox.stop()
+
+    assert list(collection.documents) == ["tender_status:2"]
+    assert collection.documents["tender_status:2"]["attempts"] == 1
+    assert collection.documents["tender_status:2"]["nextTry"] > datetime.utcnow()
+    assert mocked_logger.warning.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.outbox.LOGGER")
+async def test_outbox_slow_item_doesnt_block(mocked_logger):
+    collection = MemoryCollection()
+    outbox = build_outbox(collection)
+    release = asyncio.Event()
+    sent = []
+
+    async def sender(kind, payload, session):
+        if payload["id"] == "slow":
+            await release.wait()
+        sent.append(payload["id"])
+
+    await outbox.put(OUTBOX_AGREEMENT, "slow", {"id": "slow"})
+    outbox.start(MagicMock(), sender)
+    for i in range(5):
+        await outbox.put(OUTBOX_AGREEMENT, str(i), {"id": str(i)})
+    await wait_until(lambda: len(sent) == 5)
+
+    assert list(outbox.sending) == ["agreement:slow"]
+    release.set()
+    await wait_until(lambda: not collection.documents)
+    await outbox.stop()
+    assert sorted(sent) == ["0", "1", "2", "3", "4", "slow"]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.outbox.LOGGER")
+async def test_outbox_storage_error_isnt_resent(mocked_logger):
+    collection = MemoryCollection()
+    collection.fail_deletes = 1
+    outbox = build_outbox(collection)
+    outbox.poll_interval = 0.01
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1"})
+    await outbox.put(OUTBOX_AGREEMENT, "2", {"id": "2"})
+    sender = AsyncMock()
+
+    outbox.start(MagicMock(), sender)
+    await wait_until(lambda: len(collection.documents) == 1 and not outbox.sending)
+    await asyncio.sleep(0.05)
+    await outbox.stop()
+
+    # the item that couldn't be removed is leased, so it isn't sent again right away
+    assert sender.await_count == 2
+    assert collection.documents["agreement:1"]["nextTry"] > datetime.utcnow()
+    assert mocked_logger.warning.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.outbox.LOGGER")
+async def test_outbox_stop_releases_lease(mocked_logger):
+    collection = MemoryCollection()
+    outbox = build_outbox(collection)
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1"})
+    next_try = collection.documents["agreement:1"]["nextTry"]
+
+    async def sender(kind, payload, session):
+        await asyncio.sleep(10)
+
+    outbox.start(MagicMock(), sender)
+    await wait_until(lambda: "agreement:1" in outbox.sending)
+    await outbox.stop()
+
+    assert collection.documents["agreement:1"]["nextTry"] == next_try
+    assert not outbox.sending
+
+
+@pytest.mark.asyncio
+async def test_outbox_stops_when_woken_up():
+    outbox = build_outbox(MemoryCollection())
+    outbox.poll_interval = 60
+    outbox.start(MagicMock(), AsyncMock())
+    await asyncio.sleep(0.01)
+
+    # a finishing send wakes the sender up in the same loop iteration it's cancelled
+    outbox.wakeup.set()
+    await asyncio.wait_for(outbox.stop(), 1)
+
+
+@pytest.mark.asyncio
+async def test_outbox_run_wakes_up_on_put():
+    collection = MemoryCollection()
+    outbox = build_outbox(collection)
+    outbox.poll_interval = 60
+    sender = AsyncMock()
+    outbox.start(MagicMock(), sender)
+    await asyncio.sleep(0.01)
+
+    await outbox.put(OUTBOX_AGREEMENT, "1", {"id": "1"})
+    await wait_until(lambda: sender.await_count == 1)
+    await outbox.stop()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.OUTBOX_ENABLED", True)
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_outbox(mocked_logger, tender_data, agreement_data):
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=404)])
+    with patch("prozorro_bridge_frameworkagreement.bridge.outbox.put", AsyncMock()) as mocked_put:
+        await process_tender(session_mock, tender_data)
+
+    assert session_mock.post.await_count == 0
+    # owner credentials are requested at send time and never stored in the outbox
+    assert session_mock.get.await_count == 0
+    assert mocked_put.await_count == 1
+    kind, key, payload = mocked_put.await_args.args
+    assert (kind, key) == (OUTBOX_AGREEMENT, agreement_data["id"])
+    assert payload["tender_id"] == tender_data["id"]
+    assert payload["dateModified"] == tender_data["dateModified"]
+    assert "tender_token" not in payload["agreement"]
+    assert "owner" not in payload["agreement"]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.OUTBOX_ENABLED", True)
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_outbox_unavailable(mocked_logger, tender_data):
+    tender_data["procurementMethodType"] = "closeFrameworkAgreementSelectionUA"
+    tender_data["status"] = "draft.pending"
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=404, text=AsyncMock(return_value=json.dumps({"error": "Not found"}))),
+        MagicMock(status=404, text=AsyncMock(return_value=json.dumps({"error": "Not found"}))),
+    ])
+    session_mock.patch = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+    with patch("prozorro_bridge_frameworkagreement.bridge.outbox.put", AsyncMock(side_effect=AutoReconnect())):
+        await process_tender(session_mock, tender_data)
+
+    assert session_mock.patch.await_count == 1
+    assert json.loads(session_mock.patch.await_args.kwargs["data"])["data"]["status"] == "draft.unsuccessful"
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_send_outbox_agreement_fills_credentials(mocked_logger, agreement_data, credentials):
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
+    ])
+    session_mock.post = AsyncMock(side_effect=[MagicMock(status=201)])
+
+    payload = {"tender_id": "33", "agreement": dict(agreement_data, tender_id="33")}
+    await send_outbox_item(OUTBOX_AGREEMENT, payload, session_mock)
+
+    assert session_mock.get.await_args.args[0].endswith("/tenders/33/extract_credentials")
+    posted = json.loads(session_mock.post.await_args.kwargs["data"])["data"]
+    assert posted["tender_token"] == credentials["data"]["tender_token"]
+    assert posted["owner"] == credentials["data"]["owner"]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_send_outbox_item(mocked_logger):
+    session_mock = AsyncMock()
+    session_mock.patch = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({}).encode())),
+    ])
+    await send_outbox_item(OUTBOX_TENDER_STATUS, {"tender_id": "33", "agreements_exists": True}, session_mock)
+
+    assert session_mock.patch.await_args.args[0].endswith("/tenders/33")
+    assert json.loads(session_mock.patch.await_args.kwargs["data"])["data"]["status"] == "active.enquiries"
@@ -0,0 +1,68 @@
+import pytest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from prozorro_bridge_frameworkagreement.retry import (
+    RetryPolicy,
+    RetryBudget,
+    RetryExhausted,
+    get_retry_after,
+)
+
+
+def test_backoff_growth_and_cap():
+    policy = RetryPolicy(base=10, cap=100, max_attempts=0, budget=RetryBudget(1, 1))
+    for attempt, expected in enumerate([10, 20, 40, 80, 100, 100]):
+        for _ in range(20):
+            assert expected / 2 <= policy.backoff(attempt) <= expected
+
+
+def test_get_retry_after():
+    assert get_retry_after(None) is None
+    assert get_retry_after(MagicMock(status=500, headers={"Retry-After": "5"})) is None
+    assert get_retry_after(MagicMock(status=429, headers={})) is None
+    assert get_retry_after(MagicMock(status=429, headers={"Retry-After": "5"})) == 5
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 < get_retry_after(MagicMock(status=503, headers={"Retry-After": date})) <= 60
+    assert get_retry_after(MagicMock(status=503, headers={"Retry-After": "soon"})) is None
+
+
+@pytest.mark.asyncio
+async def test_retry_uses_retry_after():
+    policy = RetryPolicy(base=1, cap=100, max_attempts=0, budget=RetryBudget(1, 10))
+    retry = policy.start()
+    with patch("prozorro_bridge_frameworkagreement.retry.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        await retry.wait(MagicMock(status=429, headers={"Retry-After": "30"}))
+        await retry.wait(MagicMock(status=429, headers={"Retry-After": "3000"}))
+    assert mocked_sleep.await_args_list[0].args[0] == 30
+    assert mocked_sleep.await_args_list[1].args[0] == 100
+
+
+@pytest.mark.asyncio
+async def test_retry_max_attempts():
+    policy = RetryPolicy(base=1, cap=10, max_attempts=2, budget=RetryBudget(1, 10))
+    retry = policy.start()
+    with patch("prozorro_bridge_frameworkagreement.retry.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        await retry.wait()
+        await retry.wait()
+        with pytest.raises(RetryExhausted):
+            await retry.wait()
+    assert mocked_sleep.await_count == 2
+    # every call has its own attempts counter
+    with patch("prozorro_bridge_frameworkagreement.retry.asyncio.sleep", AsyncMock()):
+        await policy.start().wait()
+
+
+@pytest.mark.asyncio
+async def test_retry_global_budget():
+    policy = RetryPolicy(base=1, cap=10, max_attempts=0, budget=RetryBudget(rate=1, burst=3))
+    with patch("prozorro_bridge_frameworkagreement.retry.monotonic", return_value=policy.budget.updated), \
+            patch("prozorro_bridge_frameworkagreement.retry.asyncio.sleep", AsyncMock()):
+        for _ in range(3):
+            await policy.start().wait()
+        with pytest.raises(RetryExhausted):
+            await policy.start().wait()
+    with patch("prozorro_bridge_frameworkagreement.retry.monotonic", return_value=policy.budget.updated + 1), \
+            patch("prozorro_bridge_frameworkagreement.retry.asyncio.sleep", AsyncMock()):
+        await policy.start().wait()
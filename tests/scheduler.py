@@ -0,0 +1,344 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+import tracemalloc
+from unittest.mock import patch, MagicMock
+
+from prozorro_bridge_frameworkagreement.retry import RetryExhausted
+from prozorro_bridge_frameworkagreement.scheduler import WorkerPool, get_priority
+from prozorro_bridge_frameworkagreement.serializers import dumps
+from benchmarks.data import cfaua_tender
+
+
+def test_get_priority():
+    assert get_priority({"procurementMethodType": "closeFrameworkAgreementSelectionUA"}) == 0
+    assert get_priority({"procurementMethodType": "closeFrameworkAgreementUA"}) == 1
+    assert get_priority({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_concurrency_limit():
+    running = 0
+    max_running = 0
+
+    async def handler(session, tender):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    pool = WorkerPool(handler, workers_count=3, queue_size=2)
+    pool.start(MagicMock())
+    for i in range(20):
+        await pool.put({"id": str(i), "procurementMethodType": "closeFrameworkAgreementUA"})
+        assert pool.queue.qsize() <= 2
+    await pool.join()
+    await pool.stop()
+
+    assert max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_selection_priority():
+    processed = []
+    release = asyncio.Event()
+
+    async def handler(session, tender):
+        await release.wait()
+        processed.append(tender["id"])
+
+    pool = WorkerPool(handler, workers_count=1, queue_size=10)
+    pool.start(MagicMock())
+    await pool.put({"id": "busy", "procurementMethodType": "closeFrameworkAgreementUA"})
+    await asyncio.sleep(0)
+    await pool.put({"id": "cfaua_1", "procurementMethodType": "closeFrameworkAgreementUA"})
+    await pool.put({"id": "selection_1", "procurementMethodType": "closeFrameworkAgreementSelectionUA"})
+    await pool.put({"id": "cfaua_2", "procurementMethodType": "closeFrameworkAgreementUA"})
+    await pool.put({"id": "selection_2", "procurementMethodType": "closeFrameworkAgreementSelectionUA"})
+    release.set()
+    await pool.join()
+    await pool.stop()
+
+    assert processed == ["busy", "selection_1", "selection_2", "cfaua_1", "cfaua_2"]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.scheduler.LOGGER")
+async def test_worker_pool_survives_handler_error(mocked_logger):
+    processed = []
+
+    async def handler(session, tender):
+        if tender["id"] == "broken":
+            raise KeyError("agreements")
+        processed.append(tender["id"])
+
+    pool = WorkerPool(handler, workers_count=1, queue_size=10)
+    pool.start(MagicMock())
+    await pool.put({"id": "broken"})
+    await pool.put({"id": "ok"})
+    await pool.join()
+    await pool.stop()
+
+    assert processed == ["ok"]
+    assert mocked_logger.error.call_count == 1
+    assert mocked_logger.exception.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.scheduler.LOGGER")
+async def test_worker_pool_defers_exhausted_tender(mocked_logger):
+    calls = []
+
+    async def handler(session, tender):
+        calls.append(tender["id"])
+        if len(calls) == 1:
+            raise RetryExhausted("Gave up after 10 retries")
+
+    pool = WorkerPool(handler, workers_count=1, queue_size=10, defer_interval=0.05)
+    pool.start(MagicMock())
+    await pool.put({"id": "33"})
+    await pool.join()
+    assert calls == ["33"]
+    assert pool.deferred == 1
+
+    await asyncio.sleep(0.1)
+    await pool.join()
+    await pool.stop()
+
+    assert calls == ["33", "33"]
+    assert mocked_logger.warning.call_count == 1
+    assert mocked_logger.exception.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_wait_processed():
+    processed = []
+    release = asyncio.Event()
+
+    async def handler(session, tender):
+        await release.wait()
+        processed.append((tender["id"], tender["dateModified"]))
+
+    pool = WorkerPool(handler, workers_count=1, queue_size=10)
+    pool.start(MagicMock())
+    await pool.put({"id": "33", "dateModified": "2021-01-01"})
+    await asyncio.sleep(0)
+    await pool.put({"id": "33", "dateModified": "2021-01-02"})
+    await pool.put({"id": "44", "dateModified": "2021-01-01"})
+    waiter = asyncio.ensure_future(pool.wait_processed(["33", "44", "55"]))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    release.set()
+    await asyncio.wait_for(waiter, 1)
+    # the newer copy processed right after the running one is waited for too
+    assert processed == [("33", "2021-01-01"), ("33", "2021-01-02"), ("44", "2021-01-01")]
+    await pool.wait_processed(["33"])
+    await pool.stop()
+
+
+class MemoryStore:
+    """DeferredStore keeping the documents in a dict"""
+
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    async def add(self, tender, next_try):
+        self.docs[tender["id"]] = {"_id": tender["id"], "tender": tender, "nextTry": next_try}
+
+    async def remove(self, tender_id):
+        self.docs.pop(tender_id, None)
+
+    async def load(self):
+        return list(self.docs.values())
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.scheduler.LOGGER")
+async def test_worker_pool_stores_deferred_tender(mocked_logger):
+    calls = []
+
+    async def handler(session, tender):
+        calls.append(tender["id"])
+        if len(calls) == 1:
+            raise RetryExhausted("Gave up after 10 retries")
+
+    store = MemoryStore()
+    pool = WorkerPool(handler, workers_count=1, queue_size=10, defer_interval=0.05, store=store)
+    pool.start(MagicMock())
+    await pool.put({"id": "33", "dateModified": "2021-01-01"})
+    await pool.join()
+    assert store.docs["33"]["tender"] == {"id": "33", "dateModified": "2021-01-01"}
+    assert store.docs["33"]["nextTry"] > datetime.utcnow()
+
+    await asyncio.sleep(0.1)
+    await pool.join()
+    await pool.stop()
+
+    assert calls == ["33", "33"]
+    assert store.docs == {}
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.scheduler.LOGGER")
+async def test_worker_pool_restores_deferred_tenders(mocked_logger):
+    processed = []
+
+    async def handler(session, tender):
+        processed.append(tender["id"])
+
+    store = MemoryStore([
+        {"_id": "33", "tender": {"id": "33"}, "nextTry": datetime.utcnow() - timedelta(seconds=1)},
+        {"_id": "44", "tender": {"id": "44"}, "nextTry": datetime.utcnow() + timedelta(seconds=60)},
+    ])
+    pool = WorkerPool(handler, workers_count=1, queue_size=10, defer_interval=60, store=store)
+    pool.start(MagicMock())
+    await pool.restoring
+    await asyncio.sleep(0.01)
+    await pool.join()
+
+    assert processed == ["33"]
+    assert pool.deferred == 1
+    assert list(store.docs) == ["44"]
+
+    await pool.stop()
+    # still stored for the next run, the shutdown is logged
+    assert list(store.docs) == ["44"]
+    assert mocked_logger.warning.call_count == 1
+    assert "44" in mocked_logger.warning.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_coalesces_queued_copies():
+    processed = []
+    release = asyncio.Event()
+
+    async def handler(session, tender):
+        await release.wait()
+        processed.append((tender["id"], tender["dateModified"]))
+
+    pool = WorkerPool(handler, workers_count=1, queue_size=10)
+    pool.start(MagicMock())
+    await pool.put({"id": "busy", "dateModified": "2021-01-01"})
+    await asyncio.sleep(0)
+    await pool.put({"id": "33", "dateModified": "2021-01-01"})
+    await pool.put({"id": "33", "dateModified": "2021-01-03"})
+    await pool.put({"id": "33", "dateModified": "2021-01-02"})
+    assert pool.queue.qsize() == 1
+    release.set()
+    await pool.join()
+    await pool.stop()
+
+    assert processed == [("busy", "2021-01-01"), ("33", "2021-01-03")]
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_reruns_newer_copy_after_running_one():
+    processed = []
+    running = 0
+    max_running = 0
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(session, tender):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        started.set()
+        await release.wait()
+        processed.append(tender["dateModified"])
+        running -= 1
+
+    pool = WorkerPool(handler, workers_count=3, queue_size=10)
+    pool.start(MagicMock())
+    await pool.put({"id": "33", "dateModified": "2021-01-01"})
+    await started.wait()
+    await pool.put({"id": "33", "dateModified": "2021-01-03"})
+    await pool.put({"id": "33", "dateModified": "2021-01-02"})
+    await pool.put({"id": "33", "dateModified": "2021-01-01"})
+    assert pool.queue.qsize() == 0
+    release.set()
+    await pool.join()
+    await pool.stop()
+
+    assert processed == ["2021-01-01", "2021-01-03"]
+    assert max_running == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_memory_budget():
+    release = asyncio.Event()
+
+    async def handler(session, tender):
+        await release.wait()
+
+    tenders = [{"id": str(i), "data": "x" * 1000} for i in range(4)]
+    pool = WorkerPool(handler, workers_count=1, queue_size=10, memory_budget=len(dumps(tenders[0])) * 2)
+    pool.start(MagicMock())
+    await pool.put(tenders[0])
+    await pool.put(tenders[1])
+    blocked = asyncio.ensure_future(pool.put(tenders[2]))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    # copies of held tenders don't wait
+    await pool.put(dict(tenders[1]))
+
+    release.set()
+    await blocked
+    await pool.put(tenders[3])
+    await pool.join()
+    assert pool.held_bytes == 0
+    assert not pool.sizes
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.scheduler.LOGGER")
+async def test_worker_pool_memory_budget_deferred(mocked_logger):
+    calls = []
+
+    async def handler(session, tender):
+        calls.append(tender["id"])
+        if len(calls) == 1:
+            raise RetryExhausted("Gave up after 10 retries")
+
+    pool = WorkerPool(handler, workers_count=1, queue_size=10, defer_interval=0.01, memory_budget=10 ** 6)
+    pool.start(MagicMock())
+    await pool.put({"id": "33"})
+    await pool.join()
+    assert pool.held_bytes > 0
+
+    await asyncio.sleep(0.05)
+    await pool.join()
+    assert calls == ["33", "33"]
+    assert pool.held_bytes == 0
+    await pool.stop()
+
+
+async def peak_memory(memory_budget: int) -> int:
+    async def handler(session, tender):
+        await asyncio.sleep(0.001)
+
+    pool = WorkerPool(handler, workers_count=2, queue_size=100, memory_budget=memory_budget)
+    pool.start(MagicMock())
+    tracemalloc.start()
+    try:
+        for _ in range(100):
+            await pool.put(cfaua_tender(lots=3, items=10, contracts=10))
+        await pool.join()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        await pool.stop()
+    return peak
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_memory_budget_limits_peak():
+    tender_size = len(dumps(cfaua_tender(lots=3, items=10, contracts=10)))
+
+    unlimited_peak = await peak_memory(0)
+    limited_peak = await peak_memory(tender_size * 5)
+
+    assert limited_peak < unlimited_peak / 3
@@ -0,0 +1,23 @@
+import pytest
+
+from prozorro_bridge_frameworkagreement.serializers import SERIALIZERS, get_serializer
+from benchmarks.data import agreement
+
+
+@pytest.mark.parametrize("name", list(SERIALIZERS))
+def test_serializer_round_trip(name):
+    serializer = SERIALIZERS[name]
+    data = {"data": agreement(items=3, contracts=2)}
+
+    body = serializer.dumps(data)
+
+    assert isinstance(body, bytes)
+    assert "Україна".encode() in body
+    assert serializer.loads(body) == data
+
+
+def test_get_serializer():
+    assert get_serializer("json").name == "json"
+    assert get_serializer().name == ("orjson" if "orjson" in SERIALIZERS else "json")
+    with pytest.raises(ValueError):
+        get_serializer("simplejson")
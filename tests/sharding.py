@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from pymongo.errors import AutoReconnect
+
+from prozorro_bridge_frameworkagreement.sharding import HashRing, StaticShards, LeaseShards
+
+
+TENDER_IDS = [f"{i:032x}" for i in range(10000)]
+
+
+def test_hash_ring_distribution():
+    ring = HashRing(["a", "b", "c", "d"], vnodes=64)
+    owners = [ring.owner(tender_id) for tender_id in TENDER_IDS]
+
+    assert owners == [ring.owner(tender_id) for tender_id in TENDER_IDS]
+    for member in ("a", "b", "c", "d"):
+        assert 0.15 < owners.count(member) / len(owners) < 0.35
+
+
+def test_hash_ring_adding_member_moves_its_share_only():
+    ring = HashRing(["a", "b", "c", "d"], vnodes=64)
+    new_ring = HashRing(["a", "b", "c", "d", "e"], vnodes=64)
+
+    moved = [tender_id for tender_id in TENDER_IDS if ring.owner(tender_id) != new_ring.owner(tender_id)]
+
+    assert all(new_ring.owner(tender_id) == "e" for tender_id in moved)
+    assert len(moved) / len(TENDER_IDS) < 0.35
+
+
+def test_hash_ring_empty():
+    assert HashRing([], vnodes=64).owner("33") is None
+
+
+def test_static_shards_own_every_tender_once():
+    shards = [StaticShards(3, index, vnodes=64) for index in range(3)]
+    for tender_id in TENDER_IDS[:1000]:
+        assert sum(shard.owns(tender_id) for shard in shards) == 1
+    with pytest.raises(ValueError):
+        StaticShards(3, 3, vnodes=64)
+
+
+def fake_collection(members):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(side_effect=[[{"_id": member} for member in m] for m in members])
+    collection = MagicMock()
+    collection.find.return_value = cursor
+    for method in ("create_index", "update_one", "delete_one"):
+        setattr(collection, method, AsyncMock())
+    return collection
+
+
+def build_lease_shards(collection, replica_id="a"):
+    return LeaseShards(lambda: collection, replica_id, lease_ttl=30, heartbeat_interval=10, vnodes=64)
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.sharding.LOGGER")
+async def test_lease_shards_follow_members(mocked_logger):
+    collection = fake_collection([["a", "b"], ["a", "b", "c"]])
+    shards = build_lease_shards(collection)
+
+    shards.update_members(await shards.heartbeat())
+    assert shards.ring.members == ["a", "b"]
+    assert collection.update_one.await_args.args[0] == {"_id": "a"}
+    assert collection.update_one.await_args.kwargs == {"upsert": True}
+    owned = {tender_id for tender_id in TENDER_IDS if shards.owns(tender_id)}
+    assert 0.35 < len(owned) / len(TENDER_IDS) < 0.65
+
+    shards.update_members(await shards.heartbeat())
+    assert shards.ring.members == ["a", "b", "c"]
+    assert {tender_id for tender_id in TENDER_IDS if shards.owns(tender_id)} < owned
+    assert mocked_logger.info.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.sharding.LOGGER")
+async def test_lease_shards_start_stop(mocked_logger):
+    collection = fake_collection([["b"]])
+    shards = build_lease_shards(collection)
+
+    await shards.start()
+    await shards.wait_ready()
+    # own lease is counted even if it's not visible yet
+    assert shards.ring.members == ["a", "b"]
+
+    await shards.stop()
+    collection.delete_one.assert_awaited_once_with({"_id": "a"})
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.sharding.LOGGER")
+async def test_lease_shards_storage_error(mocked_logger):
+    collection = fake_collection([])
+    collection.update_one = AsyncMock(side_effect=AutoReconnect("connection refused"))
+    shards = build_lease_shards(collection)
+
+    await shards.start()
+    await asyncio.sleep(0)
+    await shards.stop()
+
+    assert not shards.ready.is_set()
+    assert not shards.owns("33")
+    assert mocked_logger.warning.call_count == 1
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+import json
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_frameworkagreement.bridge import (
+    process_tender,
+    send_outbox_item,
+    OUTBOX_AGREEMENT,
+    OUTBOX_TENDER_STATUS,
+)
+from prozorro_bridge_frameworkagreement.journal_msg_ids import DATABRIDGE_SLA_BREACH
+from prozorro_bridge_frameworkagreement.metrics import FEED_LAG, TENDER_LATENCY
+from prozorro_bridge_frameworkagreement.sla import (
+    parse_timestamp,
+    observe_feed_page,
+    observe_completion,
+    AGREEMENTS_POSTED,
+    STATUS_PATCHED,
+)
+
+
+def ago(seconds: float) -> str:
+    return (datetime.now(timezone(timedelta(hours=2))) - timedelta(seconds=seconds)).isoformat()
+
+
+def test_parse_timestamp():
+    assert parse_timestamp("2021-06-01T12:00:00+03:00") == datetime(2021, 6, 1, 9, tzinfo=timezone.utc).timestamp()
+    assert parse_timestamp("2021-06-01T09:00:00Z") == datetime(2021, 6, 1, 9, tzinfo=timezone.utc).timestamp()
+    assert parse_timestamp("2021-06-01T12:00:00.123456") == datetime(2021, 6, 1, 12, 0, 0, 123456).timestamp()
+    assert parse_timestamp("yesterday") is None
+    assert parse_timestamp(None) is None
+
+
+@patch("prozorro_bridge_frameworkagreement.sla.SLA_THRESHOLD", 60)
+@patch("prozorro_bridge_frameworkagreement.sla.LOGGER")
+def test_observe_feed_page(mocked_logger):
+    lag = observe_feed_page([{"dateModified": ago(100)}, {"dateModified": ago(10)}, {}])
+    assert 10 <= lag < 20
+    assert FEED_LAG.values[()] == lag
+    assert mocked_logger.warning.call_count == 0
+
+    assert observe_feed_page([]) is None
+    assert FEED_LAG.values[()] == lag
+
+    assert observe_feed_page([{"dateModified": ago(120)}]) >= 120
+    assert mocked_logger.warning.call_count == 1
+    assert mocked_logger.warning.call_args.kwargs["extra"]["MESSAGE_ID"] == DATABRIDGE_SLA_BREACH
+
+
+@patch("prozorro_bridge_frameworkagreement.sla.SLA_THRESHOLD", 60)
+@patch("prozorro_bridge_frameworkagreement.sla.LOGGER")
+def test_observe_completion(mocked_logger):
+    count = sum(TENDER_LATENCY.counts.get((STATUS_PATCHED,), []))
+
+    assert observe_completion({"id": "33", "dateModified": ago(5)}, STATUS_PATCHED) < 60
+    assert observe_completion({"id": "33"}, STATUS_PATCHED) is None
+    assert mocked_logger.warning.call_count == 0
+
+    assert observe_completion({"id": "33", "dateModified": ago(3600)}, STATUS_PATCHED) >= 3600
+    assert sum(TENDER_LATENCY.counts[(STATUS_PATCHED,)]) == count + 2
+    extra = mocked_logger.warning.call_args.kwargs["extra"]
+    assert extra["MESSAGE_ID"] == DATABRIDGE_SLA_BREACH
+    assert "33" in extra.values()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.observe_completion")
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_process_tender_observes_completion(mocked_logger, mocked_observe, tender_data):
+    tender_data["procurementMethodType"] = "closeFrameworkAgreementSelectionUA"
+    tender_data["status"] = "draft.pending"
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[MagicMock(status=404), MagicMock(status=404)])
+    session_mock.patch = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+
+    await process_tender(session_mock, tender_data)
+
+    mocked_observe.assert_called_once_with(
+        {"id": tender_data["id"], "dateModified": tender_data["dateModified"]}, STATUS_PATCHED
+    )
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.observe_completion")
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_failed_writes_not_observed(mocked_logger, mocked_observe, agreement_data, credentials):
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
+    ])
+    session_mock.post = AsyncMock(side_effect=[MagicMock(status=422, text=AsyncMock(return_value=""))])
+    session_mock.patch = AsyncMock(side_effect=[MagicMock(status=403, text=AsyncMock(return_value=""))])
+    date_modified = ago(10)
+
+    await send_outbox_item(
+        OUTBOX_AGREEMENT,
+        {"tender_id": "33", "dateModified": date_modified, "agreement": dict(agreement_data, tender_id="33")},
+        session_mock,
+    )
+    await send_outbox_item(
+        OUTBOX_TENDER_STATUS,
+        {"tender_id": "33", "dateModified": date_modified, "agreements_exists": True},
+        session_mock,
+    )
+
+    assert session_mock.post.await_count == 1
+    assert session_mock.patch.await_count == 1
+    assert mocked_observe.call_count == 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.observe_completion")
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_sent_agreement_observed(mocked_logger, mocked_observe, agreement_data, credentials):
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps(credentials).encode())),
+    ])
+    session_mock.post = AsyncMock(side_effect=[MagicMock(status=201)])
+    date_modified = ago(10)
+
+    await send_outbox_item(
+        OUTBOX_AGREEMENT,
+        {"tender_id": "33", "dateModified": date_modified, "agreement": dict(agreement_data, tender_id="33")},
+        session_mock,
+    )
+
+    mocked_observe.assert_called_once_with({"id": "33", "dateModified": date_modified}, AGREEMENTS_POSTED)
@@ -0,0 +1,93 @@
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from pymongo.errors import ServerSelectionTimeoutError
+
+from prozorro_bridge_frameworkagreement.storage import DeferredStore, SyncedIndex, AGREEMENT, TENDER
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def fake_collection(stored_ids):
+    collection = MagicMock()
+    collection.create_index = AsyncMock()
+    collection.bulk_write = AsyncMock()
+    collection.find = MagicMock(
+        side_effect=lambda query, projection: FakeCursor(
+            {"_id": key} for key in query["_id"]["$in"] if key in stored_ids
+        )
+    )
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_synced_index_memory_eviction():
+    index = SyncedIndex(size=2)
+    await index.add(AGREEMENT, "1", "2")
+    assert await index.contains(AGREEMENT, "1")
+    await index.add(TENDER, "1")
+
+    assert await index.filter_synced(AGREEMENT, ["1", "2", "3"]) == {"1"}
+    assert await index.contains(TENDER, "1")
+
+
+@pytest.mark.asyncio
+async def test_synced_index_persistent_lookup():
+    collection = fake_collection({"agreement:2"})
+    index = SyncedIndex(size=10, get_collection=lambda: collection, ttl=60)
+    await index.add(AGREEMENT, "1")
+
+    assert await index.filter_synced(AGREEMENT, ["1", "2", "3"]) == {"1", "2"}
+    assert collection.create_index.await_count == 1
+    assert collection.create_index.await_args.kwargs == {"expireAfterSeconds": 60}
+    assert collection.bulk_write.await_count == 1
+    assert collection.find.call_args.args[0] == {"_id": {"$in": ["agreement:2", "agreement:3"]}}
+
+    # found keys are kept in memory
+    assert await index.filter_synced(AGREEMENT, ["2"]) == {"2"}
+    assert collection.find.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.storage.LOGGER")
+async def test_synced_index_storage_error(mocked_logger):
+    collection = fake_collection(set())
+    collection.find = MagicMock(side_effect=ServerSelectionTimeoutError("no servers"))
+    collection.bulk_write = AsyncMock(side_effect=ServerSelectionTimeoutError("no servers"))
+    index = SyncedIndex(size=10, get_collection=lambda: collection)
+
+    assert await index.contains(TENDER, "1") is False
+    await index.add(TENDER, "1")
+    assert await index.contains(TENDER, "1") is True
+    assert mocked_logger.warning.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.storage.LOGGER")
+async def test_deferred_store(mocked_logger):
+    collection = MagicMock()
+    collection.update_one = AsyncMock()
+    collection.delete_one = AsyncMock(side_effect=ServerSelectionTimeoutError("no servers"))
+    collection.find = MagicMock(return_value=FakeCursor([{"_id": "33", "tender": {"id": "33"}}]))
+    store = DeferredStore(lambda: collection)
+
+    await store.add({"id": "33"}, "2021-01-01")
+    assert collection.update_one.await_args.args == (
+        {"_id": "33"}, {"$set": {"tender": {"id": "33"}, "nextTry": "2021-01-01"}}
+    )
+    assert collection.update_one.await_args.kwargs == {"upsert": True}
+    assert await store.load() == [{"_id": "33", "tender": {"id": "33"}}]
+
+    await store.remove("33")
+    assert mocked_logger.warning.call_count == 1
@@ -0,0 +1,117 @@
+import json
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from prozorro_bridge_frameworkagreement.bridge import get_tender, tracer as bridge_tracer
+from prozorro_bridge_frameworkagreement.tracing import Tracer, FileExporter, add_event, inject
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def build_tracer(sample_rate=1):
+    exporter = ListExporter()
+    return Tracer(sample_rate, lambda: exporter), exporter
+
+
+def test_nested_spans():
+    tracer, exporter = build_tracer()
+
+    with tracer.span("process_tender", tender_id="33") as root:
+        with tracer.span("post", agreement_id="11"):
+            add_event("retry", attempt=1)
+            headers = inject({"Authorization": "Bearer broker"})
+        with pytest.raises(KeyError):
+            with tracer.span("patch"):
+                raise KeyError("status")
+
+    post, patch_span, process = exporter.spans
+    assert process is root
+    assert process.parent_id is None
+    assert post.trace_id == patch_span.trace_id == root.trace_id
+    assert post.parent_id == patch_span.parent_id == root.span_id
+    assert post.attributes == {"agreement_id": "11"}
+    assert post.events[0]["name"] == "retry"
+    assert post.events[0]["attributes"] == {"attempt": 1}
+    assert headers == {"Authorization": "Bearer broker", "traceparent": f"00-{root.trace_id}-{post.span_id}-01"}
+    assert patch_span.status == "error"
+    assert process.status == "ok"
+
+
+def test_unsampled_spans():
+    tracer, exporter = build_tracer(sample_rate=0)
+    headers = {"Authorization": "Bearer broker"}
+
+    with tracer.span("process_tender") as root:
+        with tracer.span("post") as span:
+            add_event("retry", attempt=1)
+            assert inject(headers) is headers
+
+    assert not root.sampled
+    assert span is root
+    assert exporter.spans == []
+
+
+@pytest.mark.asyncio
+async def test_traced():
+    tracer, exporter = build_tracer()
+    attributes = MagicMock(return_value={"tender_id": "33"})
+
+    @tracer.traced("credentials", attributes)
+    async def get_credentials(tender_id, session):
+        return "token"
+
+    assert await get_credentials("33", None) == "token"
+    assert exporter.spans[0].name == "credentials"
+    assert exporter.spans[0].attributes == {"tender_id": "33"}
+
+    tracer.sample_rate = 0
+    assert await get_credentials("33", None) == "token"
+    assert len(exporter.spans) == 1
+    assert attributes.call_count == 1
+
+
+def test_file_exporter(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(1, lambda: FileExporter(str(path)))
+
+    with tracer.span("process_tender", tender_id="33"):
+        pass
+
+    span = json.loads(path.read_text())
+    assert span["name"] == "process_tender"
+    assert span["attributes"] == {"tender_id": "33"}
+    assert span["duration"] >= 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_frameworkagreement.bridge.LOGGER")
+async def test_bridge_spans(mocked_logger, tender_data, error_data, monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(bridge_tracer, "sample_rate", 1)
+    monkeypatch.setattr(bridge_tracer, "exporter", exporter)
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(side_effect=[
+        MagicMock(status=502, text=AsyncMock(return_value=json.dumps(error_data))),
+        MagicMock(status=200, read=AsyncMock(return_value=json.dumps({"data": tender_data}).encode())),
+    ])
+
+    with patch("prozorro_bridge_frameworkagreement.bridge.asyncio.sleep", AsyncMock()):
+        await get_tender(tender_data["id"], session_mock)
+
+    first_request, second_request, stage = exporter.spans
+    assert stage.name == "get_tender"
+    assert stage.attributes == {"tender_id": tender_data["id"]}
+    assert [e["name"] for e in stage.events] == ["retry"]
+    assert stage.events[0]["attributes"]["status"] == 502
+    assert first_request.attributes["status"] == 502
+    assert second_request.attributes["status"] == 200
+    assert second_request.parent_id == stage.span_id
+    headers = session_mock.get.await_args.kwargs["headers"]
+    assert headers["traceparent"] == f"00-{stage.trace_id}-{second_request.span_id}-01"
+    assert headers["Authorization"].startswith("Bearer ")